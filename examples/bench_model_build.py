@@ -0,0 +1,57 @@
+#!/usr/bin/env python -W ignore::FutureWarning -W ignore::UserWarning -W ignore::DeprecationWarning
+"""Benchmark timing model construction for a PTA-sized set of parfiles.
+
+Builds one model per parfile with pint.models.get_model and reports the time
+spent importing the component registry, the time per model and the total.
+If fewer parfiles than --npsr are given, the list is repeated, so the default
+run builds 45 models from the parfiles in the test data directory.
+"""
+from __future__ import division, print_function
+
+import os, sys, glob, time
+import argparse
+
+from astropy import log
+
+if __name__ == '__main__':
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', 'tests', 'datafile')
+    parser = argparse.ArgumentParser(
+        description="Benchmark PINT timing model construction")
+    parser.add_argument("parfiles", nargs='*',
+                        help="par files to build models from "
+                             "(default: the test data parfiles)")
+    parser.add_argument("--npsr", type=int, default=45,
+                        help="Number of models to build (default: 45)")
+    args = parser.parse_args()
+
+    log.setLevel('ERROR')
+    parfiles = args.parfiles
+    if not parfiles:
+        parfiles = sorted(glob.glob(os.path.join(datadir, '*.par')))
+    parfiles = [parfiles[ii % len(parfiles)] for ii in range(args.npsr)]
+
+    t0 = time.time()
+    import pint.models
+    time_import = time.time() - t0
+    print("Imported models and component registry in %.3f sec" % time_import)
+
+    times = []
+    nparams = []
+    for pf in parfiles:
+        t0 = time.time()
+        try:
+            m = pint.models.get_model(pf)
+        except Exception as e:
+            print("%-45s failed: %s" % (os.path.basename(pf), e))
+            continue
+        times.append(time.time() - t0)
+        nparams.append(len(m.params))
+        print("%-45s %5d params %8.3f sec" % (os.path.basename(pf),
+                                              nparams[-1], times[-1]))
+
+    if times:
+        print("Built %d models (%d parameters) in %.3f sec, "
+              "%.3f sec per model, %.1f us per parameter" %
+              (len(times), sum(nparams), sum(times), sum(times) / len(times),
+               1e6 * sum(times) / sum(nparams)))
@@ -101,14 +101,12 @@ def marginalize_over_phase(phases, template, weights=None, resolution=1.0/1024,
 def get_fit_keyvals(model):
     """Read the model to determine fitted keys and their values and errors from the par file
     """
-    fitkeys = [p for p in model.params if not
-        getattr(model,p).frozen]
-    fitvals = []
+    fitkeys = model.get_free_params()
+    fitvals = model.get_param_vector(fitkeys)
     fiterrs = []
     for p in fitkeys:
-        fitvals.append(getattr(model, p).num_value)
-        fiterrs.append(getattr(model, p).num_uncertainty)
-    return fitkeys, np.asarray(fitvals), np.asarray(fiterrs)
+        fiterrs.append(getattr(model, p).uncertainty_value)
+    return fitkeys, fitvals, np.asarray(fiterrs)
 
 class emcee_fitter(fitter.fitter):
 
@@ -125,7 +123,7 @@ class emcee_fitter(fitter.fitter):
         """
         Return pulse phases based on the current model
         """
-        phss = self.model.phase(self.toas.table)[1]
+        phss = self.model_phase()[1]
         # ensure all postive
         return np.where(phss < 0.0, phss + 1.0, phss)
 
@@ -144,7 +142,7 @@ class emcee_fitter(fitter.fitter):
         The log posterior (priors * likelihood)
         """
         global maxpost, numcalls
-        self.set_params(dict(zip(self.fitkeys, theta)))
+        self.model.set_param_vector(theta, self.fitkeys)
 
         numcalls += 1
         if numcalls % (nwalkers * nsteps / 100) == 0:
@@ -175,7 +173,7 @@ class emcee_fitter(fitter.fitter):
         """
         # first scale the params based on the errors
         ntheta = (theta * self.fiterrs) + self.fitvals
-        self.set_params(dict(zip(self.fitkeys, ntheta)))
+        self.model.set_param_vector(ntheta, self.fitkeys)
         if not np.isfinite(self.lnprior(ntheta)):
             return np.inf
         phases = self.get_event_phases()
@@ -8,7 +8,7 @@ import pint.models
 import pint.residuals
 import astropy.units as u
 import matplotlib.pyplot as plt
-from pint.fermi_toas import phaseogram, load_Fermi_TOAs
+from pint.fermi_toas import phaseogram, get_Fermi_TOAs
 import argparse
 from astropy.time import Time
 from pint.eventstats import hmw, hm, h2sig
@@ -31,27 +31,11 @@ if __name__ == '__main__':
 
     pf = psr_par(args.parfile)
 
-    # Read event file and return list of TOA objects
-    tl  = load_Fermi_TOAs(args.eventfile, weightcolumn=args.weightcol,
-                          targetcoord=SkyCoord(pf.RAJ,pf.DECJ,unit=(u.hourangle,u.degree),frame='icrs'))
-
-    # Discard events outside of MJD range    
-    if args.maxMJD is not None:
-        tlnew = []
-        print("pre len : ",len(tl))
-        maxT = Time(float(args.maxMJD),format='mjd')
-        print("maxT : ",maxT)
-        for tt in tl:
-            if tt.mjd < maxT:
-                tlnew.append(tt)
-        tl=tlnew
-        print("post len : ",len(tlnew))
-        
-    # Now convert to TOAs object and compute TDBs and posvels
-    ts = toa.TOAs(toalist=tl)
-    ts.filename = args.eventfile
-    ts.compute_TDBs()
-    ts.compute_posvels(ephem=args.ephem,planets=args.planets)
+    # Read event file into a TOAs object, with TDBs and posvels
+    maxMJD = None if args.maxMJD is None else float(args.maxMJD)
+    ts = get_Fermi_TOAs(args.eventfile, weightcolumn=args.weightcol,
+                        targetcoord=SkyCoord(pf.RAJ,pf.DECJ,unit=(u.hourangle,u.degree),frame='icrs'),
+                        maxmjd=maxMJD, ephem=args.ephem, planets=args.planets)
 
     print(ts.get_summary())
     mjds = ts.get_mjds()
@@ -68,7 +52,7 @@ if __name__ == '__main__':
     # ensure all postive
     phases = np.where(phss < 0.0, phss + 1.0, phss)
     mjds = ts.get_mjds()
-    weights = np.array([w['weight'] for w in ts.table['flags']])
+    weights = np.asarray(ts.table['weight'])
     h = float(hmw(phases,weights))
     print("Htest : {0:.2f} ({1:.2f} sigma)".format(h,h2sig(h)))
     phaseogram(mjds,phases,weights,bins=100,file = args.outfile)
@@ -50,7 +50,7 @@ class emcee_fitter(fitter.fitter):
         """
         Return pulse phases based on the current model
         """
-        phss = self.model.phase(self.toas.table)[1]
+        phss = self.model_phase()[1]
         # ensure all postive
         return np.where(phss < 0.0, phss + 1.0, phss)
 
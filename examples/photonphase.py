@@ -0,0 +1,51 @@
+#!/usr/bin/env python -W ignore::FutureWarning -W ignore::UserWarning -W ignore::DeprecationWarning
+"""Command-line interface to tag the events of a FITS event file with pulse
+phases and barycentric times
+
+The events are processed in chunks of rows, optionally by parallel worker
+processes, and written to a copy of the event file with PULSE_PHASE and
+BARY_TIME columns (see pint.photonphase), so event files of any size are
+processed with bounded memory.  Raw (not barycentered or geocentered) Fermi
+events need the FT2 file, raw NICER or RXTE events the orbit file.
+"""
+from __future__ import division, print_function
+
+import os,sys
+import time
+import pint.models
+import pint.photonphase
+import argparse
+
+from astropy import log
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Compute pulse phases and barycentric times of the events of a FITS event file with PINT")
+    parser.add_argument("eventfile",help="FITS event file name (e.g. a Fermi FT1 file)")
+    parser.add_argument("parfile",help="par file to construct model from")
+    parser.add_argument("--outfile",help="Output event file name (default=<eventfile>_phase.fits)", default=None)
+    parser.add_argument("--columns",help="Columns to compute (default=PULSE_PHASE,BARY_TIME)", default="PULSE_PHASE,BARY_TIME")
+    parser.add_argument("--ft2",help="Fermi FT2 file, for raw event times", default=None)
+    parser.add_argument("--orbfile",help="NICER or RXTE orbit file, for raw event times", default=None)
+    parser.add_argument("--chunk",help="Number of events per chunk (default=100000)", type=int, default=100000)
+    parser.add_argument("--workers",help="Number of worker processes (default=1)", type=int, default=1)
+    parser.add_argument("--planets",help="Use planetary Shapiro delay in calculations (default=False)", default=False, action="store_true")
+    parser.add_argument("--ephem",help="Planetary ephemeris to use (default=DE421)", default="DE421")
+    parser.add_argument("--clobber",help="Overwrite the output file",action="store_true",default=False)
+    args = parser.parse_args()
+
+    outfile = args.outfile
+    if outfile is None:
+        outfile = os.path.splitext(args.eventfile)[0] + "_phase.fits"
+
+    modelin = pint.models.get_model(args.parfile)
+    start = time.time()
+    phaser = pint.photonphase.phase_events(args.eventfile, modelin, outfile,
+                                           ft2name=args.ft2, orbfile=args.orbfile,
+                                           columns=args.columns.split(','),
+                                           chunk_size=args.chunk, workers=args.workers,
+                                           ephem=args.ephem, planets=args.planets,
+                                           clobber=args.clobber)
+    elapsed = time.time() - start
+    print("Wrote {0} events to {1} in {2:.1f} s ({3:.0f} events/s)".format(
+        phaser.nrows, outfile, elapsed, phaser.nrows / elapsed))
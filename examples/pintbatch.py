@@ -0,0 +1,59 @@
+#!/usr/bin/env python -W ignore::FutureWarning -W ignore::UserWarning -W ignore::DeprecationWarning
+"""Command-line interface to time many pulsars with PINT
+
+Like pintempo.py, but for a list of par and tim files, e.g. the pulsars of a
+PTA data release.  The solar system ephemeris, the IERS table and the clock
+corrections are loaded once, and the pulsars are fitted in parallel worker
+processes (see pint.batch).  The post-fit par files and residuals are
+written to the output directory, with a report of the timing of every
+pulsar and the throughput.
+
+The pulsars are given as pairs of par and tim files on the command line, or
+in a file with one "parfile timfile" pair per line (--list).
+"""
+from __future__ import division, print_function
+
+import os,sys
+import time
+import pint.batch
+import argparse
+
+from astropy import log
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Time many pulsars with PINT")
+    parser.add_argument("files",nargs='*',help="par and tim files, in pairs")
+    parser.add_argument("--list",help="File with a par and a tim file name per line", default=None)
+    parser.add_argument("--outdir",help="Output directory (default=pintbatch_out)", default="pintbatch_out")
+    parser.add_argument("--workers",help="Number of worker processes (default=1)", type=int, default=1)
+    parser.add_argument("--ephem",help="Solar system ephemeris (default=DE421)", default="DE421")
+    parser.add_argument("--planets",help="Include the Shapiro delays of the planets",action="store_true",default=False)
+    parser.add_argument("--fitter",help="Fitter: %s (default=wls)" % ", ".join(sorted(pint.batch.fitters)), default="wls")
+    parser.add_argument("--report",help="Report file name (default=<outdir>/report.txt)", default=None)
+    args = parser.parse_args()
+
+    if len(args.files) % 2:
+        parser.error("par and tim files must be given in pairs")
+    pairs = list(zip(args.files[::2], args.files[1::2]))
+    if args.list is not None:
+        with open(args.list) as f:
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    pairs.append(tuple(line.split()[:2]))
+    if not pairs:
+        parser.error("no pulsars given")
+
+    log.info("Timing {0} pulsars with {1} workers".format(len(pairs), args.workers))
+    start = time.time()
+    reports = pint.batch.run_batch(pairs, outdir=args.outdir,
+                                   workers=args.workers, ephem=args.ephem,
+                                   planets=args.planets, fitter=args.fitter)
+    wall_time = time.time() - start
+
+    pint.batch.write_report(reports, sys.stdout, wall_time)
+    report_file = args.report
+    if report_file is None:
+        report_file = os.path.join(args.outdir, "report.txt")
+    with open(report_file, "w") as fout:
+        pint.batch.write_report(reports, fout, wall_time)
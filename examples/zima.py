@@ -63,17 +63,16 @@ if __name__ == '__main__':
         log.info("Computing observatory positions and velocities.")
         ts.compute_posvels(args.ephem, args.planets)
 
-    # This computation should be replaced with a call to d_phase_d_TOA() when that
-    # function works to compute the instantaneous topocentric frequency                 
-    F = m.F0.num_value*m.F0.num_unit    
+    # Convert phase to time with the instantaneous topocentric frequency
+    F = m.d_phase_d_toa(ts.table)*u.Hz
     rs = m.phase(ts.table).frac/F
     
     # Adjust the TOA times to put them where their residuals will be 0.0
     ts.adjust_TOAs(TimeDelta(-1.0*rs))
     rspost = m.phase(ts.table).frac/F
 
-    # Do a second iteration to fix the poor assumption of F = F0 when
-    # converting phase residuals to time residuals
+    # Do a second iteration to remove what is left over from linearizing
+    # the phase around the initial TOAs
     ts.adjust_TOAs(TimeDelta(-1.0*rspost))
 
      # Write TOAs to a file
@@ -0,0 +1,177 @@
+# batch.py
+# Time many pulsars with shared solar system and Earth orientation data
+"""Load and fit the TOAs of many pulsars.
+
+The data that every pulsar needs (the SPICE kernels, the IERS A table, the
+observatory clock corrections) are loaded once in the main process by
+load_shared_data.  The pulsars are then timed by forked worker processes
+(see pint.parallel), which inherit these data; only the SPICE kernels are
+opened again in every worker, so the workers do not share file handles.
+The largest TOA files are started first, which keeps the pool busy until
+the end.
+
+Every pulsar gets a post-fit par file and a residual file in the output
+directory, and run_batch returns a report of the timing of each pulsar,
+which write_report formats with the total throughput.
+"""
+import os
+import time
+import traceback
+import numpy as np
+import astropy.units as u
+from astropy import log
+from . import toa
+from . import fitter as pint_fitter
+from . import parallel
+from .models import get_model
+from .spiceutils import load_ephemeris, reload_kernels
+from .observatories import get_clock_corr_vals
+
+fitters = {'wls': pint_fitter.wls_fitter,
+           'gls': pint_fitter.gls_fitter,
+           'powell': pint_fitter.fitter}
+
+
+def load_shared_data(ephem="DE421", last_mjd=None):
+    """Load the data that the TOAs of all pulsars need: the SPICE kernels
+    with the ephemeris ephem, the IERS A table (covering last_mjd) and the
+    clock corrections of the observatories with a tempo site code.
+    """
+    load_ephemeris(ephem)
+    toa.get_iers_a(last_mjd)
+    for name, obs in toa.observatories.items():
+        if name == 'Geocenter' or \
+                not any(len(alias) == 1 for alias in obs.aliases):
+            continue
+        try:
+            get_clock_corr_vals(name)
+        except (KeyError, IOError):
+            log.warn("Can not read the clock corrections of %s" % name)
+
+
+def time_pulsar(parfile, timfile, outdir=None, ephem="DE421",
+                planets=False, fitter='wls', usepickle=True):
+    """Load the model and the TOAs of one pulsar, fit them and write the
+    post-fit par file and residuals to outdir.
+
+    Returns a dict with the results and the wall clock time of every step.
+    Errors are caught and reported in the dict, so one pulsar does not stop
+    a batch.
+    """
+    report = {'parfile': parfile, 'timfile': timfile,
+              'psr': os.path.splitext(os.path.basename(parfile))[0],
+              'error': None}
+    start = time.time()
+    try:
+        model = get_model(parfile)
+        if model.PSR.value:
+            report['psr'] = model.PSR.value
+        t = toa.get_TOAs(timfile, ephem=ephem, planets=planets,
+                         usepickle=usepickle)
+        report['ntoas'] = t.ntoas
+        report['load_time'] = time.time() - start
+
+        start_fit = time.time()
+        f = fitters[fitter](t, model)
+        report['prefit_chi2'] = f.resids.chi2
+        f.call_minimize()
+        f.update_resids()
+        report['chi2'] = f.resids.chi2
+        report['chi2_reduced'] = f.resids.chi2_reduced
+        report['rms_us'] = f.resids.time_resids.std().to(u.us).value
+        report['fit_time'] = time.time() - start_fit
+
+        if outdir is not None:
+            base = os.path.join(outdir, report['psr'])
+            with open(base + '.par', 'w') as fout:
+                fout.write(f.model.as_parfile() + "\n")
+            np.savetxt(base + '.res', np.column_stack(
+                [t.get_mjds(), f.resids.time_resids.to(u.us).value,
+                 t.get_errors().to(u.us).value]),
+                fmt='%.12f %.4f %.4f', header='MJD resid(us) error(us)')
+    except Exception:
+        report['error'] = traceback.format_exc()
+        log.error("Timing %s failed:\n%s" % (report['psr'],
+                                             report['error']))
+    report['time'] = time.time() - start
+    return report
+
+
+def _time_pulsar(task):
+    ii, parfile, timfile, options = task
+    return ii, time_pulsar(parfile, timfile, **options)
+
+
+def _file_size(filename):
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def _init_worker():
+    reload_kernels()
+
+
+def run_batch(pairs, outdir=None, workers=None, ephem="DE421",
+              planets=False, fitter='wls', usepickle=True):
+    """Time the pulsars of a list of (parfile, timfile) pairs.
+
+    With workers > 1 the pulsars are timed in that many forked processes.
+    Returns the reports of time_pulsar, in the order of pairs.
+    """
+    if outdir is not None and not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    load_shared_data(ephem)
+    options = dict(outdir=outdir, ephem=ephem, planets=planets,
+                   fitter=fitter, usepickle=usepickle)
+    # Start with the largest TOA files
+    tasks = sorted([(ii, par, tim, options) for ii, (par, tim)
+                    in enumerate(pairs)],
+                   key=lambda task: -_file_size(task[2]))
+    reports = [None] * len(pairs)
+    pool = None
+    if workers is not None and workers > 1 and len(pairs) > 1:
+        pool = parallel._fork_pool(workers, initializer=_init_worker)
+        if pool is None:
+            log.warn("Can not fork worker processes, timing serially.")
+    if pool is None:
+        for task in tasks:
+            ii, report = _time_pulsar(task)
+            reports[ii] = report
+        return reports
+    try:
+        for ii, report in pool.imap_unordered(_time_pulsar, tasks):
+            reports[ii] = report
+    finally:
+        pool.close()
+        pool.join()
+    return reports
+
+
+def write_report(reports, fout, wall_time=None):
+    """Write a table of the batch reports to the file object fout, with the
+    total throughput if the wall clock time of the batch is given.
+    """
+    fout.write("%-20s %8s %10s %10s %10s %10s %9s\n" %
+               ("PSR", "NTOA", "chi2_red", "rms(us)", "load(s)", "fit(s)",
+                "status"))
+    ntoas = 0
+    for r in reports:
+        if r['error'] is not None:
+            fout.write("%-20s %8s %10s %10s %10s %10s %9s\n" %
+                       (r['psr'], r.get('ntoas', '-'), '-', '-', '-', '-',
+                        'failed'))
+            continue
+        ntoas += r['ntoas']
+        fout.write("%-20s %8d %10.4f %10.4f %10.2f %10.2f %9s\n" %
+                   (r['psr'], r['ntoas'], r['chi2_reduced'], r['rms_us'],
+                    r['load_time'], r['fit_time'], 'ok'))
+    nfail = sum(r['error'] is not None for r in reports)
+    cpu_time = sum(r['time'] for r in reports)
+    fout.write("\n%d pulsars (%d failed), %d TOAs, %.1f s in the pulsar "
+               "runs\n" % (len(reports), nfail, ntoas, cpu_time))
+    if wall_time:
+        fout.write("Wall clock time %.1f s: %.2f pulsars/min, %.1f TOAs/s\n"
+                   % (wall_time, 60.0 * len(reports) / wall_time,
+                      ntoas / wall_time))
@@ -0,0 +1,317 @@
+# derivatives.py
+# Numerical derivatives of the model phase wrt the model parameters
+"""Finite difference derivatives of the pulse phase wrt timing model parameters.
+
+These are used for the parameters that have no analytic d_phase_d_* or
+d_delay_d_* function.  Every perturbed evaluation works on a clone of the
+model (see TimingModel.clone), with the parameter value changed in its
+ParameterVector, so the model itself is never modified.
+
+The perturbed evaluations of a batch share the work that does not depend on
+the perturbed parameter:
+
+ * the results cached by the components (e.g. the pulsar direction of the
+   astrometry component) are computed once, and handed to every evaluation
+   that perturbs a parameter of another component;
+ * for the parameters of components that only contribute phase (spindown,
+   glitches), the delays are computed once and only the phase functions are
+   evaluated again.
+
+The evaluations can run in forked worker processes (results are written to
+shared memory, as in pint.parallel) or in a thread pool.
+"""
+import numpy as np
+import astropy.units as u
+import astropy.time as time
+from multiprocessing.pool import ThreadPool
+from astropy import log
+from .phase import Phase
+from . import parallel
+from .models.timing_model import Cache, TimingModel
+
+# Finite difference schemes: lists of ((fraction, fraction), weight).  Each
+# pair of evaluations at x + fraction * h gives a central difference, the
+# derivative is the weighted sum of the differences.
+schemes = {'central': [((1.0, -1.0), 1.0)],
+           # Richardson extrapolation of the central differences with
+           # steps h and h/2, error O(h^4)
+           'richardson': [((1.0, -1.0), -1.0 / 3), ((0.5, -0.5), 4.0 / 3)]}
+
+# Component class -> (parameter names, prefixes, mask names, has delays)
+_component_info = {}
+
+# State inherited by the forked worker processes
+_shared = {}
+
+
+def param_unit(par):
+    """Return the astropy unit of the values of a parameter in the
+    ParameterVector (day for epochs).
+    """
+    if isinstance(par.quantity, time.Time):
+        return u.day
+    try:
+        return u.Unit(par.units)
+    except (ValueError, TypeError):
+        return u.dimensionless_unscaled
+
+
+def _uncertainty(par):
+    """Return the uncertainty of a parameter in the units of its value."""
+    unc = par.uncertainty
+    if unc is None:
+        return None
+    if hasattr(unc, 'unit'):
+        try:
+            return float(unc.to(param_unit(par)).value)
+        except (ValueError, TypeError, u.UnitsError):
+            pass
+    return float(par.uncertainty_value)
+
+
+def param_steps(model, params, factor=0.1, rel_step=1e-7, abs_step=1e-10,
+                mjd_step=1e-4):
+    """Return the finite difference step of every parameter.
+
+    The step is factor times the parameter uncertainty, if it is known, so
+    the model is probed on the scale the data constrain.  Otherwise it is
+    rel_step times the absolute value, or abs_step for a zero value.  Epochs
+    use mjd_step days.
+
+    Returns
+    -------
+    numpy.ndarray of longdouble, in the units of the parameter values.
+    """
+    steps = np.zeros(len(params), dtype=np.longdouble)
+    for ii, pn in enumerate(params):
+        par = getattr(model, pn)
+        unc = _uncertainty(par)
+        if unc is not None and np.isfinite(unc) and unc > 0:
+            steps[ii] = factor * unc
+        elif isinstance(par.quantity, time.Time):
+            steps[ii] = mjd_step
+        elif par.value:
+            steps[ii] = rel_step * abs(np.longdouble(par.value))
+        else:
+            steps[ii] = abs_step
+    return steps
+
+
+def _get_component_info(cls):
+    """Return the parameters of a bare instance of a component class."""
+    if cls not in _component_info:
+        try:
+            bare = cls()
+        except Exception:
+            # Can not tell which parameters this class owns
+            _component_info[cls] = None
+            return None
+        pars = [getattr(bare, pn) for pn in bare.params if pn != 'PSR']
+        _component_info[cls] = (
+            set(par.name for par in pars),
+            set(par.prefix for par in pars if par.is_prefix),
+            set(par.origin_name for par in pars
+                if getattr(par, 'is_mask', False)),
+            any(len(fs) for fs in bare.delay_funcs.values()))
+    return _component_info[cls]
+
+
+def _owner(model, param):
+    """Return the component class of the model that defines param, or None."""
+    par = getattr(model, param)
+    for cls in type(model).__mro__:
+        if cls is TimingModel or not issubclass(cls, TimingModel) or \
+                '__init__' not in cls.__dict__:
+            continue
+        info = _get_component_info(cls)
+        if info is None:
+            continue
+        names, prefixes, masks, has_delay = info
+        if param in names or (par.is_prefix and par.prefix in prefixes) or \
+                (getattr(par, 'is_mask', False) and par.origin_name in masks):
+            return cls
+    return None
+
+
+def _defining_class(model, func_name):
+    for cls in type(model).__mro__:
+        if func_name in cls.__dict__:
+            return cls
+    return None
+
+
+def _independent(model, owner, func_name):
+    """Whether the cached result of func_name does not depend on the
+    parameters of the component class owner.
+    """
+    cls = _defining_class(model, func_name)
+    if cls is None or cls is TimingModel:
+        return False
+    return not (issubclass(owner, cls) or issubclass(cls, owner))
+
+
+class _Batch(object):
+    """The shared state of the perturbed evaluations of one model."""
+    def __init__(self, model, toas, params):
+        self.model = model
+        self.toas = toas
+        cache = Cache()
+        saved = model.cache
+        model.cache = cache
+        try:
+            # Also sets the phase reference (TZRMJD) of the model
+            self.delay = model.delay(toas)
+            for pf in model.phase_funcs:
+                pf(toas, self.delay)
+        finally:
+            model.cache = saved
+        cached = dict((k, v) for k, v in vars(cache).items()
+                      if k != 'prefix_values')
+        self.seeds = {}
+        self.phase_only = {}
+        for pn in params:
+            owner = _owner(model, pn)
+            if owner is None:
+                self.seeds[pn] = {}
+                self.phase_only[pn] = False
+                continue
+            self.phase_only[pn] = not _get_component_info(owner)[3]
+            self.seeds[pn] = dict((k, v) for k, v in cached.items()
+                                  if _independent(model, owner, k))
+
+    def phase(self, param, dx):
+        """Return the phase with param changed by dx, and the change of the
+        parameter value actually applied.
+        """
+        m = self.model.clone()
+        vec = m.param_vector
+        slots = vec.get_slots([param])
+        dtype = getattr(m, param).store_dtype
+        x0 = vec.get(slots)
+        vec.set(slots, dtype(x0[0] + dx))
+        applied = np.longdouble(vec.get(slots)[0]) - np.longdouble(x0[0])
+        cache = Cache()
+        for k, v in self.seeds[param].items():
+            setattr(cache, k, v)
+        m.cache = cache
+        try:
+            if self.phase_only[param]:
+                delay = self.delay
+            else:
+                delay = m.delay(self.toas)
+            ph = Phase(np.zeros(len(self.toas)), np.zeros(len(self.toas)))
+            for pf in m.phase_funcs:
+                ph += Phase(pf(self.toas, delay))
+        finally:
+            m.cache = None
+        return ph, applied
+
+
+def _evaluate_shared(task):
+    ii, param, dx = task
+    ph, applied = _shared['batch'].phase(param, dx)
+    _shared['int'][ii] = ph.int
+    _shared['frac'][ii] = ph.frac
+    return applied
+
+
+def d_phase_d_params(model, toas, params, steps=None, method='central',
+                     workers=None, pool='process'):
+    """Return the numerical derivatives of the phase wrt the parameters.
+
+    Parameters
+    ----------
+    model : TimingModel
+    toas : astropy.table.Table
+        The TOA table, e.g. TOAs.table
+    params : list of str
+        Names of numeric parameters.
+    steps : array_like, optional
+        Finite difference step of every parameter, in the units of the
+        parameter values.  By default from param_steps().
+    method : str
+        'central' differences, or 'richardson' extrapolation of central
+        differences with the step and half the step.
+    workers : int, optional
+        Number of concurrent evaluations.
+    pool : str
+        'process' for forked worker processes, 'thread' for a thread pool.
+
+    Returns
+    -------
+    numpy.ndarray of shape (len(params), len(toas)), d phase / d param in
+    cycles per unit of the parameter value (see param_unit).
+    """
+    if method not in schemes:
+        raise ValueError("Unknown method '%s', use one of %s" %
+                         (method, sorted(schemes.keys())))
+    scheme = schemes[method]
+    if steps is None:
+        steps = param_steps(model, params)
+    steps = np.asarray(steps, dtype=np.longdouble)
+    tasks = []
+    for jj, pn in enumerate(params):
+        if getattr(model, pn).store_dtype is None:
+            raise ValueError("Parameter %s is not numeric" % pn)
+        for pair, weight in scheme:
+            for frac in pair:
+                tasks.append((len(tasks), pn, frac * steps[jj]))
+
+    batch = _Batch(model, toas, params)
+    ntoas = len(toas)
+    ph_int = np.zeros((len(tasks), ntoas), dtype=np.longdouble)
+    ph_frac = np.zeros((len(tasks), ntoas), dtype=np.longdouble)
+    applied = None
+    if workers is not None and workers > 1 and len(tasks) > 1:
+        if pool == 'process':
+            ph_int = parallel.shared_array(ph_int.shape, np.longdouble)
+            ph_frac = parallel.shared_array(ph_frac.shape, np.longdouble)
+            # The workers inherit the batch when the pool forks
+            _shared.update(batch=batch, int=ph_int, frac=ph_frac)
+            try:
+                workers_pool = parallel._fork_pool(workers)
+                if workers_pool is None:
+                    log.warn("Can not fork worker processes, using threads.")
+                    pool = 'thread'
+                else:
+                    try:
+                        applied = workers_pool.map(_evaluate_shared, tasks)
+                    finally:
+                        workers_pool.close()
+                        workers_pool.join()
+            finally:
+                _shared.clear()
+        if pool == 'thread':
+            workers_pool = ThreadPool(workers)
+            try:
+                results = workers_pool.map(lambda t: batch.phase(t[1], t[2]),
+                                           tasks)
+            finally:
+                workers_pool.close()
+                workers_pool.join()
+            applied = []
+            for ii, (ph, dx) in enumerate(results):
+                ph_int[ii], ph_frac[ii] = ph.int, ph.frac
+                applied.append(dx)
+        elif pool != 'process':
+            raise ValueError("Unknown pool '%s', use 'process' or 'thread'"
+                             % pool)
+    if applied is None:
+        applied = []
+        for ii, pn, dx in tasks:
+            ph, dx = batch.phase(pn, dx)
+            ph_int[ii], ph_frac[ii] = ph.int, ph.frac
+            applied.append(dx)
+
+    derivs = np.zeros((len(params), ntoas))
+    ii = 0
+    for jj in range(len(params)):
+        for pair, weight in scheme:
+            dph = Phase(ph_int[ii], ph_frac[ii]) - \
+                  Phase(ph_int[ii + 1], ph_frac[ii + 1])
+            # Use the parameter changes actually applied, which differ from
+            # the requested ones by the rounding to the parameter precision
+            h = applied[ii] - applied[ii + 1]
+            derivs[jj] += weight * (dph.int + dph.frac) / h
+            ii += 2
+    return derivs
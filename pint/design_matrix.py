@@ -0,0 +1,114 @@
+# design_matrix.py
+# Design matrices with sparse columns for the piecewise parameters
+"""Block-sparse design matrices.
+
+The columns of piecewise parameters (DMX_ bins, JUMPs, ...) are zero except
+on the TOAs of one window or backend.  A `BlockDesignMatrix` keeps the
+columns of the global parameters in a dense array and those of the piecewise
+parameters in a scipy.sparse matrix, so a model with hundreds of DMX bins
+needs little more memory than its global part.
+
+Timing model components declare which parameters are piecewise by
+registering a function in the model's sparse_deriv_funcs dict, under the
+parameter name, prefix (e.g. 'DMX_') or mask parameter name (e.g. 'JUMP').
+The function is called as f(toas, param) and returns the rows of the TOAs
+where the column is nonzero and the column values there, as a Quantity in
+the units of d_delay / d_param.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+
+def sparse_columns(ntoas, columns):
+    """Return a scipy.sparse CSC matrix with the given columns.
+
+    Parameters
+    ----------
+    ntoas : int
+        Number of rows.
+    columns : list of (rows, values)
+        The row numbers and values of the nonzero entries of every column.
+    """
+    rows = [np.asarray(r, dtype=int) for r, v in columns]
+    values = [np.asarray(v, dtype=np.float64) for r, v in columns]
+    cols = [np.zeros(len(r), dtype=int) + ii for ii, r in enumerate(rows)]
+    if not columns:
+        return sp.csc_matrix((ntoas, 0))
+    return sp.csc_matrix((np.concatenate(values),
+                          (np.concatenate(rows), np.concatenate(cols))),
+                         shape=(ntoas, len(columns)))
+
+
+class BlockDesignMatrix(object):
+    """A design matrix stored as a dense block and a sparse block of
+    columns.
+
+    Parameters
+    ----------
+    dense : numpy.ndarray, (ntoas, ndense)
+        The columns of the global parameters.
+    sparse : scipy.sparse matrix, (ntoas, nsparse)
+        The columns of the piecewise parameters.
+    params : list of str
+        Names of all the columns, as returned by TimingModel.designmatrix.
+    units : list of astropy units
+        Units of all the columns.
+    dense_index, sparse_index : array_like of int
+        The positions in params of the dense and the sparse columns.
+    """
+    def __init__(self, dense, sparse, params, units, dense_index,
+                 sparse_index):
+        self.dense = np.asarray(dense)
+        self.sparse = sp.csc_matrix(sparse)
+        self.params = list(params)
+        self.units = list(units)
+        self.dense_index = np.asarray(dense_index, dtype=int)
+        self.sparse_index = np.asarray(sparse_index, dtype=int)
+
+    @classmethod
+    def from_dense(cls, M, params, units, sparse_params):
+        """Split a dense design matrix, storing the columns of the
+        parameters in sparse_params in the sparse block.
+        """
+        sparse_index = [ii for ii, par in enumerate(params)
+                        if par in sparse_params]
+        dense_index = [ii for ii, par in enumerate(params)
+                       if par not in sparse_params]
+        return cls(M[:,dense_index], sp.csc_matrix(M[:,sparse_index]),
+                   params, units, dense_index, sparse_index)
+
+    @property
+    def shape(self):
+        return (self.dense.shape[0], len(self.params))
+
+    @property
+    def nnz(self):
+        """Number of stored entries."""
+        return self.dense.size + self.sparse.nnz
+
+    def toarray(self):
+        """Return the full design matrix as a dense array."""
+        M = np.zeros(self.shape)
+        M[:,self.dense_index] = self.dense
+        M[:,self.sparse_index] = self.sparse.toarray()
+        return M
+
+    def dot(self, x):
+        """Return M x for a vector of parameter values x."""
+        x = np.asarray(x)
+        return np.dot(self.dense, x[self.dense_index]) + \
+               self.sparse.dot(x[self.sparse_index])
+
+    def tdot(self, y):
+        """Return M^T y for a vector y of length ntoas."""
+        y = np.asarray(y)
+        result = np.zeros(len(self.params))
+        result[self.dense_index] = np.dot(self.dense.T, y)
+        result[self.sparse_index] = self.sparse.T.dot(y)
+        return result
+
+    def take_rows(self, rows):
+        """Return the design matrix of a subset of the rows."""
+        return BlockDesignMatrix(self.dense[rows], self.sparse[rows],
+                                 self.params, self.units, self.dense_index,
+                                 self.sparse_index)
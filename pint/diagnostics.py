@@ -0,0 +1,166 @@
+# diagnostics.py
+# Leave-one-out, jackknife and bootstrap diagnostics of a timing fit
+"""Robustness diagnostics of a weighted least-squares timing fit.
+
+Dropping TOAs and fitting again is the usual check of how much a parameter
+depends on a backend, a year of data or a single TOA.  The refits are not
+needed for the linearized fit: `FitDiagnostics` factors the whitened design
+matrix once (see pint.fitter.WhitenedQR) and computes
+
+* the hat matrix diagonal and the leave-one-out residuals,
+* the parameter shifts when a group of TOAs is dropped, by downdating the
+  solution with the rows of the group (O(k params^2 + k^3) for k TOAs),
+  and the jackknife covariance from them,
+* a bootstrap covariance, by resampling the whitened residuals of the fit.
+
+The groups are dicts of label -> row numbers of the TOAs, as returned by
+group_by_flag, group_by_obs and group_by_time.
+"""
+import numpy as np
+import astropy.units as u
+from .fitter import WhitenedQR
+from .residuals import get_errors_us
+
+
+def group_by_flag(toas, flag):
+    """Group the TOAs by the value of a flag (e.g. 'f' or 'be').
+
+    TOAs without the flag are not in any group.
+    """
+    groups = {}
+    for ii, flags in enumerate(toas['flags']):
+        if flag in flags:
+            groups.setdefault(flags[flag], []).append(ii)
+    return dict((k, np.array(v)) for k, v in groups.items())
+
+
+def group_by_obs(toas):
+    """Group the TOAs by observatory."""
+    obs = np.array(toas['obs'])
+    return dict((k, np.nonzero(obs == k)[0]) for k in np.unique(obs))
+
+
+def group_by_time(toas, window=365.25, start=None):
+    """Group the TOAs by time windows of window days, starting at the MJD
+    start (by default the first TOA).  The labels are the MJDs of the
+    window starts.
+    """
+    mjd = np.array(toas['tdbld'], dtype=np.float64)
+    if start is None:
+        start = mjd.min()
+    bins = np.floor((mjd - start) / window).astype(int)
+    return dict((start + k * window, np.nonzero(bins == k)[0])
+                for k in np.unique(bins))
+
+
+class FitDiagnostics(object):
+    """Diagnostics of the weighted least-squares fit M dpars = r.
+
+    The fit parameter offsets and shifts are in the units of the design
+    matrix columns, as the dpars of wls_fitter (the shift of a parameter
+    value is dpars / units * u.s).
+
+    Parameters
+    ----------
+    M : numpy.ndarray, (ntoas, nparams)
+        The design matrix.
+    r : numpy.ndarray, (ntoas,)
+        The residuals in s, usually of the fitted model.
+    sigma : numpy.ndarray, (ntoas,)
+        The uncertainties of the residuals in s.
+    params, units : list, optional
+        The names and units of the design matrix columns.
+    """
+    def __init__(self, M, r, sigma, params=None, units=None):
+        self.sigma = np.asarray(sigma, dtype=np.float64)
+        self.r = np.asarray(r, dtype=np.float64)
+        self.params = params
+        self.units = units
+        self.qr = WhitenedQR(M, self.sigma**2)
+        self.dpars, self.Sigma = self.qr.solve(self.r)
+        # Whitened residuals of the linear fit
+        self.e = self.r / self.sigma - np.dot(self.qr.Q,
+                                              np.dot(self.qr.Q.T,
+                                                     self.r / self.sigma))
+
+    @classmethod
+    def from_fitter(cls, fitter):
+        """Return the diagnostics of the current model of a fitter, usually
+        after the fit.
+        """
+        M, params, units = fitter.model.designmatrix(toas=fitter.toas.table,
+                incfrozen=False, incoffset=True)
+        r = fitter.resids.time_resids.to(u.s).value
+        sigma = get_errors_us(fitter.toas) * 1e-6
+        return cls(M, r, sigma, params=params, units=units)
+
+    @property
+    def ntoas(self):
+        return len(self.r)
+
+    def hat_diagonal(self):
+        """Return the diagonal of the hat matrix, the leverage of every
+        TOA.
+        """
+        return np.sum(self.qr.Q**2, axis=1)
+
+    def loo_residuals(self):
+        """Return the leave-one-out residuals in s: the residual of every TOA
+        for the fit without it.
+        """
+        h = self.hat_diagonal()
+        with np.errstate(divide='ignore'):
+            return self.e * self.sigma / (1.0 - h)
+
+    def group_shift(self, rows):
+        """Return the change of the fit parameters and of their covariance
+        matrix when the TOAs rows are left out.
+        """
+        rows = np.asarray(rows, dtype=int)
+        Q = self.qr.Q[rows]
+        # (A^T A)^-1 A_g^T for the whitened design matrix A
+        K = (np.dot(self.qr.Rinv, Q.T).T / self.qr.norm).T
+        I_H = np.eye(len(rows)) - np.dot(Q, Q.T)
+        try:
+            X = np.linalg.solve(I_H, np.column_stack([self.e[rows], K.T]))
+        except np.linalg.LinAlgError:
+            raise ValueError("The fit without the TOAs is degenerate")
+        dpars = -np.dot(K, X[:,0])
+        dSigma = np.dot(K, X[:,1:])
+        return dpars, dSigma
+
+    def group_shifts(self, groups):
+        """Return a dict of label -> (parameter shifts, covariance change)
+        for leaving out every group of TOAs.
+        """
+        return dict((label, self.group_shift(rows))
+                    for label, rows in groups.items())
+
+    def jackknife_covariance(self, groups):
+        """Return the delete-a-group jackknife covariance of the fit
+        parameters.
+        """
+        shifts = np.array([self.group_shift(rows)[0]
+                           for rows in groups.values()])
+        n = len(shifts)
+        d = shifts - shifts.mean(axis=0)
+        return (n - 1.0) / n * np.dot(d.T, d)
+
+    def bootstrap_covariance(self, nboot=1000, wild=False, seed=None):
+        """Return the bootstrap covariance of the fit parameters.
+
+        The whitened residuals of the fit are resampled with replacement
+        (or, if wild is True, multiplied by random signs) and fitted again
+        with the same factorization.
+        """
+        rng = np.random.RandomState(seed)
+        n, p = self.qr.Q.shape
+        e = self.e * np.sqrt(n / float(max(n - p, 1)))
+        if wild:
+            samples = e * rng.choice([-1.0, 1.0], size=(nboot, n))
+        else:
+            samples = e[rng.randint(0, n, size=(nboot, n))]
+        dpars = np.dot(np.dot(samples, self.qr.Q), self.qr.Rinv.T) / \
+                self.qr.norm
+        d = dpars - dpars.mean(axis=0)
+        return np.dot(d.T, d) / (nboot - 1.0)
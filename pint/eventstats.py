@@ -100,27 +100,63 @@ def sigma_trials(sigma,trials):
       return (sigma**2 - 2*np.log(trials))**0.5
 
 
-def z2m(phases,m=2):
+def _trig_sums_chunk(args):
+    phases,weights,m = args
+    z1 = np.exp((1j*TWOPI)*phases)
+    zk = z1*weights if weights is not None else z1.copy()
+    sums = np.empty(m,dtype=np.complex128)
+    for k in xrange(m):
+        sums[k] = zk.sum()
+        zk *= z1 # e^{i(k+1)phi} = e^{i phi} e^{ik phi}
+    return sums
+
+def trig_sums(phases,m=2,weights=None,chunk_size=100000,workers=None):
+    """ Return the (weighted) sums of exp(2 pi i k phase), k = 1..m, whose
+        real and imaginary parts are the sums of the cosines and sines of
+        the harmonics.
+
+        The photons are processed in chunks of chunk_size phases, and the
+        harmonics of a chunk are computed in one pass with the recurrence
+        e^{ik phi} = e^{i phi} e^{i(k-1) phi}, so the memory does not depend
+        on the number of photons or harmonics.  The sums agree with direct
+        evaluation of the cosines and sines to rounding (~k*1e-16 relative).
+
+        kwargs
+        ------
+        weights    [None] photon weights
+        chunk_size [100000] number of photons per chunk
+        workers    [None] if > 1, sum the chunks in that many threads
+    """
+    phases = np.asarray(phases,dtype=np.float64).ravel()
+    if weights is not None:
+        weights = np.asarray(weights,dtype=np.float64).ravel()
+    chunks = [(phases[i:i+chunk_size],
+               None if weights is None else weights[i:i+chunk_size],m)
+              for i in xrange(0,len(phases),chunk_size)]
+    if workers is not None and workers > 1 and len(chunks) > 1:
+        # numpy releases the GIL in the array operations
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(_trig_sums_chunk,chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_trig_sums_chunk(c) for c in chunks]
+    return np.sum(results,axis=0) if results else np.zeros(m,dtype=np.complex128)
+
+def z2m(phases,m=2,chunk_size=100000,workers=None):
     """ Return the Z^2_m test for each harmonic up to the specified m.
         See de Jager et al. 1989 for definition.    
     """
 
-    phases = np.asarray(phases)*TWOPI #phase in radians
     n = len(phases)
-
-    if n < 5e3:  #faster for 100s to 1000s of phases, but requires ~20x memory of alternative
-
-        s = (np.cos(np.outer(np.arange(1,m+1),phases))).sum(axis=1)**2 +\
-            (np.sin(np.outer(np.arange(1,m+1),phases))).sum(axis=1)**2
-
-    else:
-
-        s = (np.asarray([(np.cos(k*phases)).sum() for k in xrange(1,m+1)]))**2 +\
-            (np.asarray([(np.sin(k*phases)).sum() for k in xrange(1,m+1)]))**2
+    s = np.abs(trig_sums(phases,m=m,chunk_size=chunk_size,workers=workers))**2
 
     return (2./n)*np.cumsum(s)
 
-def z2mw(phases,weights,m=2):
+def z2mw(phases,weights,m=2,chunk_size=100000,workers=None):
    """ Return the Z^2_m test for each harmonic up to the specified m.
 
        The user provides a list of weights.  In the case that they are
@@ -128,10 +164,9 @@ def z2mw(phases,weights,m=2):
        statistic remains calibrated.  Nice!
     """
 
-   phases = np.asarray(phases)*(2*np.pi) #phase in radians
-
-   s = (np.asarray([(np.cos(k*phases)*weights).sum() for k in xrange(1,m+1)]))**2 +\
-       (np.asarray([(np.sin(k*phases)*weights).sum() for k in xrange(1,m+1)]))**2
+   weights = np.asarray(weights)
+   s = np.abs(trig_sums(phases,m=m,weights=weights,chunk_size=chunk_size,
+                        workers=workers))**2
 
    return np.cumsum(s) * (2./(weights**2).sum())
 
@@ -154,13 +189,11 @@ def em_four(phases,m=2,weights=None):
     """ Return the empirical Fourier coefficients up to the mth harmonic.
         These are derived from the empirical trignometric moments."""
    
-    phases = np.asarray(phases)*TWOPI #phase in radians
-
     n = len(phases) if weights is None else weights.sum()
-    weights = 1. if weights is None else weights
+    sums = trig_sums(phases,m=m,weights=weights)
 
-    aks = (1./n)*np.asarray([(weights*np.cos(k*phases)).sum() for k in xrange(1,m+1)])
-    bks = (1./n)*np.asarray([(weights*np.sin(k*phases)).sum() for k in xrange(1,m+1)])
+    aks = (1./n)*sums.real
+    bks = (1./n)*sums.imag
 
     return aks,bks
 
@@ -176,32 +209,24 @@ def em_lc(coeffs,dom):
         rval += 2*(aks[i-1]*np.cos(i*dom) + bks[i-1]*np.sin(i*dom))
     return rval
 
-def hm(phases,m=20,c=4):
+def hm(phases,m=20,c=4,chunk_size=100000,workers=None):
     """ Calculate the H statistic (de Jager et al. 1989) for given phases.
         H_m = max(Z^2_k - c*(k-1)), 1 <= k <= m
         m == maximum search harmonic
         c == offset for each successive harmonic
     """
-    phases = np.asarray(phases)*(2*np.pi) #phase in radians
-
-    s = (np.asarray([(np.cos(k*phases)).sum() for k in xrange(1,m+1)]))**2 +\
-        (np.asarray([(np.sin(k*phases)).sum() for k in xrange(1,m+1)]))**2
+    return (z2m(phases,m=m,chunk_size=chunk_size,workers=workers)
+            - c*np.arange(0,m)).max()
 
-    return ((2./len(phases))*np.cumsum(s) - c*np.arange(0,m)).max()
 
-
-def hmw(phases,weights,m=20,c=4):
+def hmw(phases,weights,m=20,c=4,chunk_size=100000,workers=None):
     """ Calculate the H statistic (de Jager et al. 1989) and weight each
         sine/cosine with the weights in the argument.  The distribution
         is corrected such that the CLT still applies, i.e., it maintains
         the same calibration as the unweighted version."""
 
-    phases = np.asarray(phases)*(2*np.pi) #phase in radians
-
-    s = (np.asarray([(weights*np.cos(k*phases)).sum() for k in xrange(1,m+1)]))**2 +\
-        (np.asarray([(weights*np.sin(k*phases)).sum() for k in xrange(1,m+1)]))**2
-
-    return ( (2./(weights**2).sum()) * np.cumsum(s) - c*np.arange(0,m) ).max()
+    return (z2mw(phases,weights,m=m,chunk_size=chunk_size,workers=workers)
+            - c*np.arange(0,m)).max()
 
 
 #@vec
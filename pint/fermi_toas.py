@@ -2,13 +2,18 @@
 from __future__ import division, print_function
 
 import os,sys
+import functools
 import numpy as np
 import pint.toa as toa
+import pint.parallel as parallel
+from pint.spacecraft import SpacecraftOrbit, fits_time_reference, \
+    event_observatory
 import pint.models
 import pint.residuals
 import astropy.units as u
 import matplotlib.pyplot as plt
 from astropy.coordinates import SkyCoord
+from astropy.time import Time
 
 from astropy import log
 
@@ -96,6 +101,58 @@ def phaseogram(mjds, phases, weights=None, title=None, bins=100, rotate=0.0, siz
     else:
         plt.show()
 
+def _read_ft1(ft1name,weightcolumn=None,targetcoord=None,logeref=4.1,logesig=0.5,
+              minweight=0.0,minmjd=None,maxmjd=None):
+    """
+    Read the photons of an FT1 file that pass the weight and MJD cuts.
+
+    Only the needed columns are read from the memory mapped file, and the
+    cuts are applied to the column arrays.  Returns
+    (timesys, timeref, mjd_int, mjd_frac, energies, weights), with the
+    MJDs split in an integer and a fractional part to keep the full
+    precision of the event times, the energies in MeV and weights None
+    when weightcolumn is None.
+    """
+    import pyfits
+    hdulist = pyfits.open(ft1name, memmap=True)
+    try:
+        ft1hdr = hdulist[1].header
+        ft1dat = hdulist[1].data
+        timesys = ft1hdr['TIMESYS']
+        timeref = ft1hdr['TIMEREF']
+        MJDREFI, MJDREFF, TIMEZERO = fits_time_reference(ft1hdr)
+        met = np.asarray(ft1dat.field('TIME'), dtype=np.float64)
+        # Whole days since MJDREF and the remaining seconds
+        days = np.floor(met / 86400.0)
+        mjd_int = float(MJDREFI) + days
+        mjd_frac = float(MJDREFF) + \
+            np.asarray((TIMEZERO + met - days * 86400.0) / 86400.0, dtype=np.float64)
+        mask = np.ones(len(met), dtype=bool)
+        if minmjd is not None:
+            mask &= mjd_int + mjd_frac >= minmjd
+        if maxmjd is not None:
+            mask &= mjd_int + mjd_frac <= maxmjd
+        weights = None
+        if weightcolumn is not None:
+            if weightcolumn == 'CALC':
+                photoncoords = SkyCoord(ft1dat.field('RA')[mask]*u.degree,
+                                        ft1dat.field('DEC')[mask]*u.degree,frame='icrs')
+                w = np.zeros(len(met))
+                w[mask] = calc_lat_weights(ft1dat.field('ENERGY')[mask],
+                                           photoncoords.separation(targetcoord),
+                                           logeref=logeref, logesig=logesig)
+            else:
+                w = np.asarray(ft1dat.field(weightcolumn), dtype=np.float64)
+            if minweight > 0.0:
+                mask &= w > minweight
+            weights = w[mask]
+        energies = np.asarray(ft1dat.field('ENERGY')[mask], dtype=np.float64)
+        mjd_int = mjd_int[mask]
+        mjd_frac = mjd_frac[mask]
+    finally:
+        hdulist.close()
+    return timesys, timeref, mjd_int, mjd_frac, energies, weights
+
 def load_Fermi_TOAs(ft1name,ft2name=None,weightcolumn=None,targetcoord=None,logeref=4.1, logesig=0.5,minweight=0.0):
     '''
     TOAlist = load_Fermi_TOAs(ft1name,ft2name=None)
@@ -110,58 +167,23 @@ def load_Fermi_TOAs(ft1name,ft2name=None,weightcolumn=None,targetcoord=None,loge
       logeref and logesig are parameters for the weight computation and are only
       used when weightcolumn='CALC'.
       
-      When weights are loaded, or computed, events are filtered by weight >= minweight
-    '''
-    import pyfits
-    # Load photon times from FT1 file
-    hdulist = pyfits.open(ft1name)
-    ft1hdr=hdulist[1].header
-    ft1dat=hdulist[1].data
+      When weights are loaded, or computed, events are filtered by weight > minweight
 
+      For large event files, get_Fermi_TOAs builds the TOAs table directly
+      and is much faster.
+    '''
+    timesys, timeref, mjd_int, mjd_frac, energies, weights = \
+        _read_ft1(ft1name, weightcolumn=weightcolumn, targetcoord=targetcoord,
+                  logeref=logeref, logesig=logesig, minweight=minweight)
     # TIMESYS will be 'TT' for unmodified Fermi LAT events (or geocentered), and
     #                 'TDB' for events barycentered with gtbary
     # TIMEREF will be 'GEOCENTER' for geocentered events,
     #                 'SOLARSYSTEM' for barycentered,
     #             and 'LOCAL' for unmodified events
-
-    timesys = ft1hdr['TIMESYS']
     log.info("TIMESYS {0}".format(timesys))
-    timeref = ft1hdr['TIMEREF']
     log.info("TIMEREF {0}".format(timeref))
-
-    # Collect TIMEZERO and MJDREF
-    try:
-        TIMEZERO = np.longdouble(ft1hdr['TIMEZERO'])
-    except KeyError:
-        TIMEZERO = np.longdouble(ft1hdr['TIMEZERI']) + np.longdouble(ft1hdr['TIMEZERF'])
-    #print >>outfile, "# TIMEZERO = ",TIMEZERO
-    log.info("TIMEZERO = {0}".format(TIMEZERO))
-    try:
-        MJDREF = np.longdouble(ft1hdr['MJDREF'])
-    except KeyError:
-        # Here I have to work around an issue where the MJDREFF key is stored
-        # as a string in the header and uses the "1.234D-5" syntax for floats, which
-        # is not supported by Python
-        if isinstance(ft1hdr['MJDREFF'],basestring):
-            MJDREF = np.longdouble(ft1hdr['MJDREFI']) + \
-            np.longdouble(ft1hdr['MJDREFF'].replace('D','E'))
-        else:
-            MJDREF = np.longdouble(ft1hdr['MJDREFI']) + np.longdouble(ft1hdr['MJDREFF'])
-    #print >>outfile, "# MJDREF = ",MJDREF
-    log.info("MJDREF = {0}".format(MJDREF))
-    mjds = np.array(ft1dat.field('TIME'),dtype=np.longdouble)/86400.0 + MJDREF + TIMEZERO
-    energies = ft1dat.field('ENERGY')*u.MeV
-    if weightcolumn is not None:
-        if weightcolumn == 'CALC':
-            photoncoords = SkyCoord(ft1dat.field('RA')*u.degree,ft1dat.field('DEC')*u.degree,frame='icrs')
-            weights = calc_lat_weights(ft1dat.field('ENERGY'), photoncoords.separation(targetcoord), logeref=4.1, logesig=0.5)
-        else:
-            weights = ft1dat.field(weightcolumn)
-        if minweight > 0.0:
-            idx = np.where(weights>minweight)[0]
-            mjds = mjds[idx]
-            energies = energies[idx]
-            weights = weights[idx]
+    mjds = np.longdouble(mjd_int) + np.longdouble(mjd_frac)
+    energies = energies*u.MeV
 
     if timesys == 'TDB':
         log.info("Building barycentered TOAs")
@@ -171,7 +193,7 @@ def load_Fermi_TOAs(ft1name,ft2name=None,weightcolumn=None,targetcoord=None,loge
             toalist=[toa.TOA(m,obs='Barycenter',scale='tdb',energy=e,weight=w) for m,e,w in zip(mjds,energies,weights)]
     else:
         if timeref == 'LOCAL':
-            log.info('LOCAL TOAs not implemented yet')
+            log.info('Use get_Fermi_TOAs with the FT2 file for LOCAL TOAs')
             if ft2name is None:
                 log.error('FT2 file required to process raw Fermi times.')
             if weightcolumn is None:
@@ -187,6 +209,71 @@ def load_Fermi_TOAs(ft1name,ft2name=None,weightcolumn=None,targetcoord=None,loge
 
     return toalist
 
+def get_Fermi_TOAs(ft1names,ft2name=None,weightcolumn=None,targetcoord=None,
+                   logeref=4.1,logesig=0.5,minweight=0.0,minmjd=None,maxmjd=None,
+                   ephem="DE421",planets=False,workers=None):
+    """
+    Read the photons of one or more Fermi FT1 files (e.g. the weekly files)
+    into a TOAs object, without making a TOA object for every photon.
+
+    The weight and MJD cuts are applied to the column arrays of every file
+    (see load_Fermi_TOAs for the weight options), and the TOA table, with
+    'energy' (MeV) and, if weightcolumn is given, 'weight' columns, is built
+    from the concatenated arrays in one step (see TOAs.from_times).  The TDBs
+    and the positions and velocities are computed; for raw (LOCAL) event
+    times, the position of Fermi is interpolated from the FT2 file ft2name
+    (see pint.spacecraft).  With workers > 1, the
+    files are read by that many forked processes.
+    """
+    if isinstance(ft1names, basestring):
+        ft1names = [ft1names]
+    read = functools.partial(_read_ft1, weightcolumn=weightcolumn,
+                             targetcoord=targetcoord, logeref=logeref,
+                             logesig=logesig, minweight=minweight,
+                             minmjd=minmjd, maxmjd=maxmjd)
+    pool = None
+    if workers is not None and workers > 1 and len(ft1names) > 1:
+        pool = parallel._fork_pool(min(workers, len(ft1names)))
+        if pool is None:
+            log.warn("Can not fork worker processes, reading serially.")
+    if pool is None:
+        results = [read(name) for name in ft1names]
+    else:
+        try:
+            results = pool.map(read, ft1names)
+        finally:
+            pool.close()
+            pool.join()
+
+    timesys, timeref = results[0][:2]
+    for name, res in zip(ft1names, results):
+        if res[:2] != (timesys, timeref):
+            raise ValueError("%s has TIMESYS %s and TIMEREF %s, expected %s and %s"
+                             % ((name,) + tuple(res[:2]) + (timesys, timeref)))
+    log.info("TIMESYS {0}".format(timesys))
+    log.info("TIMEREF {0}".format(timeref))
+    mjd_int = np.concatenate([res[2] for res in results])
+    mjd_frac = np.concatenate([res[3] for res in results])
+    columns = {'energy': np.concatenate([res[4] for res in results])}
+    if weightcolumn is not None:
+        columns['weight'] = np.concatenate([res[5] for res in results])
+
+    obs, scale = event_observatory(timesys, timeref)
+    log.info("Building {0} TOAs".format(obs))
+    if obs == 'Spacecraft' and ft2name is None:
+        log.error('FT2 file required to process raw Fermi times.')
+    mjds = Time(mjd_int, mjd_frac, format='mjd', scale=scale, precision=9)
+    ts = toa.TOAs.from_times(mjds, obs, columns=columns,
+                             filename=ft1names[0] if len(ft1names) == 1 else None)
+    ts.table['energy'].unit = u.MeV
+    orbit = None
+    if obs == 'Spacecraft' and ft2name is not None:
+        mjd = mjd_int + mjd_frac
+        orbit = SpacecraftOrbit.from_FT2(ft2name, minmjd=mjd.min(),
+                                         maxmjd=mjd.max())
+    ts.compute_posvels(ephem=ephem, planets=planets, orbit=orbit)
+    return ts
+
 if __name__ == '__main__':
     ephem = 'DE421'
     planets = True
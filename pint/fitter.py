@@ -2,10 +2,24 @@
 # Defines the basic TOA fitter class
 import copy, numpy, numbers
 import astropy.units as u
+from astropy import log
 import astropy.coordinates.angles as ang
 import scipy.optimize as opt, scipy.linalg as sl
+import scipy.sparse as sp, scipy.sparse.linalg as spl
 from utils import has_astropy_unit
-from .residuals import resids
+from .residuals import resids, get_errors_us
+from .design_matrix import BlockDesignMatrix
+from .linearized import LinearizedModel
+from .models.parameter import AngleParameter
+from . import derivatives
+
+# scipy.optimize.minimize methods that use the gradient and the Hessian
+gradient_methods = ('cg', 'bfgs', 'newton-cg', 'l-bfgs-b', 'tnc', 'slsqp',
+                    'dogleg', 'trust-ncg', 'trust-exact', 'trust-krylov',
+                    'trust-constr')
+hessian_methods = ('newton-cg', 'dogleg', 'trust-ncg', 'trust-exact',
+                   'trust-krylov', 'trust-constr')
+
 
 class fitter(object):
     """fitter(toas=None, model=None)"""
@@ -18,13 +32,48 @@ class fitter(object):
 
     def reset_model(self):
         """Reset the current model to the initial model."""
-        self.model = copy.deepcopy(self.model_init)
+        self.model = self.model_init.clone()
+        self.linearized = None
         self.update_resids()
         self.fitresult = []
 
-    def update_resids(self):
-        """Update the residuals. Run after updating a model parameter."""
-        self.resids = resids(toas=self.toas, model=self.model)
+    def update_resids(self, free_params=None):
+        """Update the residuals. Run after updating a model parameter.
+
+        The residuals are computed when they are first accessed.
+        free_params, the names of the free parameters, saves looking them up
+        for the dof.
+        """
+        self.resids = resids(toas=self.toas, model=self.model,
+                             free_params=free_params,
+                             linearized=self.linearized)
+
+    def set_linearized(self, trust_radius=1.0, params=None, scales=None):
+        """Compute the residuals from the model linearized in params (by
+        default the free parameters), see pint.linearized.
+
+        The residuals for parameters within trust_radius times their scales
+        (by default their uncertainties) of the point of linearization are
+        r0 - M dp; a larger step evaluates the model exactly and linearizes it
+        again.  Only the parameters params may change while linearized.
+        trust_radius=None switches back to exact residuals.
+        """
+        if trust_radius is None:
+            self.linearized = None
+        else:
+            self.linearized = LinearizedModel(self.model, self.toas.table,
+                                              params=params,
+                                              trust_radius=trust_radius,
+                                              scales=scales)
+        self.update_resids()
+
+    def model_phase(self):
+        """Return the model phase of the TOAs, from the linearized model if
+        set_linearized() is used.
+        """
+        if getattr(self, 'linearized', None) is not None:
+            return self.linearized.phase()
+        return self.model.phase(self.toas.table)
 
     def set_fitparams(self, *params):
         """Update the "frozen" attribute of model parameters.
@@ -54,8 +103,43 @@ class fitter(object):
 
         Ex. fitter.set_params({'F0':60.1,'F1':-1.3e-15})
         """
+        names = [k for k, v in fitp.items()
+                 if isinstance(v, (numbers.Number, numpy.number))]
+        # Plain numbers go straight into the parameter value vector
+        self.model.set_param_vector([fitp[k] for k in names], names)
         for k, v in fitp.items():
-            getattr(self.model, k).value = v
+            if k not in names:
+                getattr(self.model, k).value = v
+
+    def apply_offsets(self, names, dpars, params, units):
+        """Add the fitted offsets dpars of the design matrix columns params
+        (with units) to the parameters names.
+        """
+        values = self.model.get_param_vector(names)
+        for ii, pn in enumerate(names):
+            uind = params.index(pn)             # Index of designmatrix
+            un = 1.0 /  (units[uind]/u.s)       # Unit in designmatrix
+            dpv = dpars[uind] * un
+            values[ii] += dpv.to(
+                derivatives.param_unit(getattr(self.model, pn))).value
+        return self.minimize_func(values, *names)
+
+    def set_uncertainties(self, names, Sigma, params, units):
+        """Set the uncertainties of the parameters names from the covariance
+        matrix Sigma of the design matrix columns params (with units).
+        """
+        errs = numpy.sqrt(numpy.diag(Sigma))
+        for pn in names:
+            uind = params.index(pn)
+            un = 1.0 /  (units[uind]/u.s)
+            par = getattr(self.model, pn)
+            err = (errs[uind] * un).to(derivatives.param_unit(par))
+            if isinstance(par, AngleParameter):
+                # Bare numbers are read as seconds of hour angle or
+                # arcseconds, so give the angle with its unit
+                par.uncertainty = err
+            else:
+                par.uncertainty_value = float(err.value)
 
     def minimize_func(self, x, *args):
         """Wrapper function for the residual class, meant to be passed to
@@ -63,25 +147,436 @@ class fitter(object):
         values, x, and a second optional tuple of input arguments.  It returns
         a quantity to be minimized (in this case chi^2).
         """
-        self.set_params({k: v for k, v in zip(args, x)})
-        # Get new residuals
-        self.update_resids()
+        self.model.set_param_vector(x, args)
+        # Get new residuals, args are the free parameters
+        self.update_resids(free_params=args)
         # Return chi^2
         return self.resids.chi2
 
-    def call_minimize(self, method='Powell', maxiter=20):
+    def residual_jacobian(self, names):
+        """Return -d r / d p for the time residuals r (s) and the parameters
+        names, from the design matrix of the current model.
+
+        The columns are in s per unit of the parameter values (see
+        pint.derivatives.param_unit).  Their means are removed, as they are
+        from the residuals.
+        """
+        M, params, units = self.model.designmatrix(toas=self.toas.table,
+                incfrozen=False, incoffset=False)
+        J = numpy.empty((M.shape[0], len(names)))
+        for jj, pn in enumerate(names):
+            ii = params.index(pn)
+            unit = u.s / derivatives.param_unit(getattr(self.model, pn))
+            J[:,jj] = M[:,ii] * (1.0 * units[ii]).to(unit).value
+        return J - J.mean(axis=0)
+
+    def chi2_gradient(self, names, J=None):
+        """Return chi^2 and its gradient -2 J^T W r wrt the values of the
+        parameters names, for the current model.
+        """
+        self.update_resids(free_params=names)
+        r = self.resids.time_resids.to(u.s).value
+        W = (get_errors_us(self.toas) * 1e-6)**-2
+        if J is None:
+            J = self.residual_jacobian(names)
+        return self.resids.chi2, -2.0 * numpy.dot(J.T, W * r)
+
+    def chi2_hessian(self, names, J=None):
+        """Return the Gauss-Newton approximation 2 J^T W J of the Hessian of
+        chi^2 wrt the values of the parameters names.
+        """
+        W = (get_errors_us(self.toas) * 1e-6)**-2
+        if J is None:
+            J = self.residual_jacobian(names)
+        return 2.0 * numpy.dot(J.T * W, J)
+
+    def call_minimize(self, method='Powell', maxiter=20, jac=None, hess=None):
         """Wrapper to scipy.optimize.minimize function.
         Ex. fitter.call_minimize(method='Powell',maxiter=20)
+
+        For the methods that use derivatives (e.g. 'BFGS', 'L-BFGS-B',
+        'Newton-CG', 'trust-ncg'), the analytic gradient of chi^2 from the
+        design matrix is passed to scipy (jac), and for the methods that use
+        it also the Gauss-Newton Hessian (hess); jac and hess can be set
+        explicitly too.  The minimization is then done in the offsets of the
+        parameters from their starting values, scaled by the inverse square
+        root of the diagonal of the Hessian, which keeps the variables of
+        order one and the full precision of the parameter values.
         """
         # Initial guesses are model params
         fitp = self.get_fitparams_num()
-        self.fitresult=opt.minimize(self.minimize_func, fitp.values(),
-                                    args=tuple(fitp.keys()),
-                                    options={'maxiter':maxiter},
-                                    method=method)
-        # Update model and resids, as the last iteration of minimize is not
-        # necessarily the one that yields the best fit
-        self.minimize_func(numpy.atleast_1d(self.fitresult.x), *fitp.keys())
+        names = tuple(fitp.keys())
+        if jac is None:
+            jac = method.lower() in gradient_methods
+        if hess is None:
+            hess = method.lower() in hessian_methods
+        if not (jac or hess):
+            self.fitresult=opt.minimize(self.minimize_func, fitp.values(),
+                                        args=names,
+                                        options={'maxiter':maxiter},
+                                        method=method)
+            # Update model and resids, as the last iteration of minimize is
+            # not necessarily the one that yields the best fit
+            self.minimize_func(numpy.atleast_1d(self.fitresult.x), *names)
+            return
+
+        x0 = self.model.get_param_vector(names)
+        z0 = numpy.zeros(len(names))
+        J0 = self.residual_jacobian(names)
+        scale = 1.0 / numpy.sqrt(numpy.diag(self.chi2_hessian(names, J0)))
+        scale[~numpy.isfinite(scale)] = 1.0
+        # Design matrix at the last point, the Hessian is evaluated where
+        # the gradient was
+        last = {z0.tobytes(): J0}
+
+        def jacobian(z):
+            key = numpy.asarray(z, dtype=numpy.float64).tobytes()
+            if key not in last:
+                self.model.set_param_vector(x0 + z * scale, names)
+                last.clear()
+                last[key] = self.residual_jacobian(names)
+            return last[key]
+
+        def fun(z):
+            self.model.set_param_vector(x0 + z * scale, names)
+            if not jac:
+                self.update_resids(free_params=names)
+                return self.resids.chi2
+            chi2, grad = self.chi2_gradient(names, jacobian(z))
+            return chi2, grad * scale
+
+        def hess_fun(z):
+            H = self.chi2_hessian(names, jacobian(z))
+            return H * numpy.outer(scale, scale)
+
+        kwargs = {}
+        if hess:
+            kwargs['hess'] = hess_fun
+        self.fitresult = opt.minimize(fun, z0,
+                                      jac=bool(jac),
+                                      options={'maxiter':maxiter},
+                                      method=method, **kwargs)
+        self.model.set_param_vector(
+            x0 + numpy.atleast_1d(self.fitresult.x) * scale, names)
+        self.update_resids(free_params=names)
+
+
+class ScaledCholesky(object):
+    """Cholesky factorization of a symmetric positive definite matrix, with
+    its rows and columns scaled to a unit diagonal.
+
+    The scaling removes the spread of the parameter units from the
+    condition number.  If the matrix is singular (degenerate parameters), a
+    pseudo-inverse of the scaled matrix is used instead.
+    """
+    def __init__(self, A):
+        A = numpy.asarray(A)
+        self.norm = numpy.sqrt(numpy.abs(numpy.diag(A)))
+        self.norm[self.norm == 0] = 1.0
+        As = A / numpy.outer(self.norm, self.norm)
+        try:
+            self.factor = sl.cho_factor(As)
+            self.pinv = None
+        except sl.LinAlgError:
+            log.warning("Normal matrix is not positive definite, the fit "
+                        "parameters are degenerate. Using a pseudo-inverse.")
+            self.factor = None
+            self.pinv = numpy.linalg.pinv(As)
+
+    def solve(self, b):
+        """Return A^-1 b, for a vector or a matrix b."""
+        b = (numpy.asarray(b, dtype=numpy.float64).T / self.norm).T
+        if self.factor is not None:
+            x = sl.cho_solve(self.factor, b)
+        else:
+            x = numpy.dot(self.pinv, b)
+        return (x.T / self.norm).T
+
+    def inverse(self):
+        """Return A^-1."""
+        return self.solve(numpy.eye(len(self.norm)))
+
+    def logdet(self):
+        """Return the log determinant of A."""
+        if self.factor is not None:
+            logdet = 2 * numpy.sum(numpy.log(numpy.diag(self.factor[0])))
+        else:
+            logdet = -numpy.linalg.slogdet(self.pinv)[1]
+        return logdet + 2 * numpy.sum(numpy.log(self.norm))
+
+
+class WhitenedQR(object):
+    """QR factorization of a whitened, column-scaled design matrix.
+
+    The rows of M are divided by the TOA errors and its columns by their
+    norms, so the least-squares problem M dpars = r is solved without
+    forming the normal matrix, which would square the condition number.
+    solve() can be called for new residuals with the same factorization.
+
+    Parameters
+    ----------
+    M : numpy.ndarray, (ntoas, nparams)
+        The design matrix.
+    Nvec : numpy.ndarray, (ntoas,)
+        Variances of the residuals.
+    """
+    def __init__(self, M, Nvec):
+        self.sigma = numpy.sqrt(Nvec)
+        Mw = M / self.sigma[:,None]
+        self.norm = numpy.sqrt(numpy.sum(Mw**2, axis=0))
+        self.norm[self.norm == 0] = 1.0
+        self.Q, R = sl.qr(Mw / self.norm, mode='economic')
+        d = numpy.abs(numpy.diag(R))
+        if d.min() > d.max() * numpy.finfo(numpy.float64).eps * len(d):
+            self.Rinv = sl.solve_triangular(R, numpy.eye(len(d)))
+        else:
+            log.warning("Design matrix is rank deficient, the fit "
+                        "parameters are degenerate. Using a pseudo-inverse.")
+            self.Rinv = numpy.linalg.pinv(R)
+        self.Sigma = numpy.dot(self.Rinv, self.Rinv.T) / \
+                     numpy.outer(self.norm, self.norm)
+
+    def solve(self, r):
+        """Return the parameter offsets that fit the residuals r best, and
+        their covariance matrix.
+        """
+        x = numpy.dot(self.Rinv, numpy.dot(self.Q.T, r / self.sigma))
+        return x / self.norm, self.Sigma
+
+
+class NormalEquations(object):
+    """Weighted least-squares normal equations, accumulated over blocks of
+    rows of the design matrix.
+
+    For the linear model M dpars = r with weights W = 1/sigma^2, add() sums
+    M^T W M, M^T W r and r^T W r over the blocks, so only
+    (nparams x nparams) arrays are kept.
+    """
+    # Rows whitened at a time by add()
+    block_rows = 10000
+
+    def __init__(self, nparams):
+        self.MtWM = numpy.zeros((nparams, nparams))
+        self.MtWr = numpy.zeros(nparams)
+        self.rtWr = 0.0
+        self.nrows = 0
+        self._factor = None
+
+    def add(self, M, r, Nvec):
+        """Add a block of rows.
+
+        Parameters
+        ----------
+        M : numpy.ndarray, (nrows, nparams)
+            Design matrix rows.
+        r : numpy.ndarray, (nrows,)
+            Residuals.
+        Nvec : numpy.ndarray, (nrows,)
+            Variances of the residuals.
+
+        The rows are whitened in sub-blocks of block_rows rows, so no
+        weighted copy of the whole block is made.
+        """
+        for lo in range(0, len(r), self.block_rows):
+            hi = lo + self.block_rows
+            isig = 1.0 / numpy.sqrt(Nvec[lo:hi])
+            A = M[lo:hi] * isig[:,None]
+            rw = r[lo:hi] * isig
+            self.MtWM += numpy.dot(A.T, A)
+            self.MtWr += numpy.dot(A.T, rw)
+            self.rtWr += numpy.dot(rw, rw)
+        self.nrows += len(r)
+        self._factor = None
+
+    def solve(self, MtWr=None):
+        """Return the parameter offsets and their covariance matrix.
+
+        The factorization of M^T W M is kept, so the offsets for other
+        residuals can be computed by passing their M^T W r.
+        """
+        if self._factor is None:
+            factor = ScaledCholesky(self.MtWM)
+            self._factor = factor, factor.inverse()
+        factor, Sigma = self._factor
+        if MtWr is None:
+            MtWr = self.MtWr
+        return factor.solve(MtWr), Sigma
+
+
+class BlockNormalEquations(object):
+    """Weighted least-squares normal equations of a BlockDesignMatrix,
+    accumulated over blocks of rows.
+
+    With the dense columns D and the sparse columns S of the design matrix,
+    the normal matrix is [[A, B], [B^T, C]] with A = D^T W D, B = D^T W S and
+    the sparse C = S^T W S.  solve() eliminates the piecewise parameters
+    through the Schur complement A - B C^-1 B^T, so the dense linear algebra
+    is only done on the (ndense x ndense) block; C is diagonal unless the
+    windows of the piecewise parameters overlap.
+    """
+    def __init__(self, dense_index, sparse_index):
+        self.dense_index = numpy.asarray(dense_index, dtype=int)
+        self.sparse_index = numpy.asarray(sparse_index, dtype=int)
+        nd, ns = len(self.dense_index), len(self.sparse_index)
+        self.A = numpy.zeros((nd, nd))
+        self.B = numpy.zeros((nd, ns))
+        self.C = sp.csc_matrix((ns, ns))
+        self.bd = numpy.zeros(nd)
+        self.bs = numpy.zeros(ns)
+        self.rtWr = 0.0
+        self.nrows = 0
+        self._factor = None
+
+    @property
+    def MtWr(self):
+        """M^T W r in the order of the design matrix columns."""
+        b = numpy.zeros(len(self.dense_index) + len(self.sparse_index))
+        b[self.dense_index] = self.bd
+        b[self.sparse_index] = self.bs
+        return b
+
+    def add(self, M, r, Nvec):
+        """Add a block of rows of a BlockDesignMatrix M, see
+        NormalEquations.add.
+        """
+        w = 1.0 / Nvec
+        Dw = M.dense * w[:,None]
+        Sw = sp.diags(w, 0).dot(M.sparse)
+        self.A += numpy.dot(Dw.T, M.dense)
+        self.B += numpy.asarray(Sw.T.dot(M.dense)).T
+        self.C = (self.C + M.sparse.T.dot(Sw)).tocsc()
+        self.bd += numpy.dot(Dw.T, r)
+        self.bs += Sw.T.dot(r)
+        self.rtWr += numpy.dot(r * w, r)
+        self.nrows += len(r)
+        self._factor = None
+
+    def _factorize(self):
+        diag = self.C.diagonal()
+        fit = diag > 0
+        C = self.C[fit][:,fit]
+        B = self.B[:,fit]
+        offdiag = sp.csc_matrix(C - sp.diags(diag[fit], 0))
+        if not numpy.any(offdiag.data):
+            d = diag[fit]
+            solve_C = lambda X: (X.T / d).T
+        else:
+            solve_C = spl.splu(sp.csc_matrix(C)).solve
+        Y = solve_C(B.T)
+        schur = ScaledCholesky(self.A - numpy.dot(B, Y))
+        Sinv = schur.inverse()
+
+        nd = len(self.dense_index)
+        n = nd + len(self.sparse_index)
+        di, si = self.dense_index, self.sparse_index[fit]
+        Sigma = numpy.zeros((n, n)) + numpy.nan
+        Ssd = -numpy.dot(Y, Sinv)
+        Sigma[numpy.ix_(di, di)] = Sinv
+        Sigma[numpy.ix_(si, di)] = Ssd
+        Sigma[numpy.ix_(di, si)] = Ssd.T
+        Sigma[numpy.ix_(si, si)] = solve_C(numpy.eye(len(si))) - \
+                                   numpy.dot(Ssd, Y.T)
+        self._factor = fit, B, Y, solve_C, schur, Sigma
+
+    def solve(self, MtWr=None):
+        """Return the parameter offsets and their covariance matrix, in the
+        order of the design matrix columns.
+
+        Piecewise parameters without any TOAs are not constrained; their
+        offsets are zero and their covariances NaN.  As in
+        NormalEquations.solve, the offsets for other residuals can be
+        computed by passing their M^T W r.
+        """
+        if self._factor is None:
+            self._factorize()
+        fit, B, Y, solve_C, schur, Sigma = self._factor
+        if MtWr is None:
+            bd, bs = self.bd, self.bs
+        else:
+            bd, bs = MtWr[self.dense_index], MtWr[self.sparse_index]
+        z = solve_C(bs[fit])
+        xd = schur.solve(bd - numpy.dot(B, z))
+        xs = z - numpy.dot(Y, xd)
+        dpars = numpy.zeros(len(self.dense_index) + len(self.sparse_index))
+        dpars[self.dense_index] = xd
+        dpars[self.sparse_index[fit]] = xs
+        return dpars, Sigma
+
+
+def normal_equations_for(M):
+    """Return empty normal equations for design matrices shaped like M."""
+    if isinstance(M, BlockDesignMatrix):
+        return BlockNormalEquations(M.dense_index, M.sparse_index)
+    return NormalEquations(M.shape[1])
+
+
+class SquareRootInformation(object):
+    """Square root information form of a weighted least-squares problem,
+    updated with blocks of rows.
+
+    The whitened, column-scaled design matrix and residuals of all the rows
+    added so far are kept as the triangular factor of their QR
+    factorization, [[R, z], [0, rho]], where R^T R is the (scaled)
+    information matrix, R dpars = z the solution and rho^2 the chi^2 of the
+    linear fit.  Adding k rows is a QR factorization of a
+    (nparams + 1 + k) x (nparams + 1) matrix, O(k nparams^2).
+
+    Parameters
+    ----------
+    norm : numpy.ndarray, (nparams,)
+        Scale of the design matrix columns, e.g. their whitened norms.
+    """
+    def __init__(self, norm):
+        self.norm = numpy.asarray(norm, dtype=numpy.float64)
+        self.norm[self.norm == 0] = 1.0
+        n = len(self.norm)
+        self.R = numpy.zeros((n + 1, n + 1))
+        self.nrows = 0
+
+    @property
+    def chi2(self):
+        """chi^2 of the linear fit to the rows added so far."""
+        return self.R[-1,-1]**2
+
+    def add(self, M, r, sigma):
+        """Add a block of rows.
+
+        Parameters
+        ----------
+        M : numpy.ndarray, (nrows, nparams)
+            Design matrix rows.
+        r : numpy.ndarray, (nrows,)
+            Residuals.
+        sigma : numpy.ndarray, (nrows,)
+            Uncertainties of the residuals.
+        """
+        A = numpy.hstack([M / sigma[:,None] / self.norm,
+                          (r / sigma)[:,None]])
+        R = sl.qr(numpy.vstack([self.R, A]), mode='r')[0]
+        self.R = R[:len(self.R)]
+        self.nrows += len(r)
+
+    def shift(self, dpars):
+        """Move the reference of the residuals by dpars, as if the fit
+        offsets dpars had been subtracted from all the residuals.
+        """
+        n = len(self.norm)
+        self.R[:n,n] -= numpy.dot(self.R[:n,:n], dpars * self.norm)
+
+    def solve(self):
+        """Return the parameter offsets and their covariance matrix."""
+        n = len(self.norm)
+        R = self.R[:n,:n]
+        d = numpy.abs(numpy.diag(R))
+        if d.min() > d.max() * numpy.finfo(numpy.float64).eps * n:
+            Rinv = sl.solve_triangular(R, numpy.eye(n))
+        else:
+            log.warning("Information matrix is singular, the fit "
+                        "parameters are degenerate. Using a pseudo-inverse.")
+            Rinv = numpy.linalg.pinv(R)
+        Sigma = numpy.dot(Rinv, Rinv.T) / numpy.outer(self.norm, self.norm)
+        return numpy.dot(Rinv, self.R[:n,n]) / self.norm, Sigma
+
 
 class wls_fitter(fitter):
     """fitter(toas=None, model=None)"""
@@ -89,46 +584,350 @@ class wls_fitter(fitter):
     def __init__(self, toas=None, model=None):
         super(wls_fitter, self).__init__(toas=toas, model=model)
 
-    def call_minimize(self, method='weighted', maxiter=20):
-        """Run a linear weighted least-squared fitting method"""
-        fitp = self.get_fitparams()
+    def linear_solver(self, Nvec, chunk_size=None, sparse=True):
+        """Compute and factor the design matrix of the current model.
 
-        # Input variables must be unitless
-        for k, v in zip(fitp.keys(), fitp.values()):
-            if has_astropy_unit(v):
-                fitp[k] = v.value
+        Returns (solve, params, units, reusable): solve(r) returns the
+        parameter offsets that best fit the residuals r (in s) and their
+        covariance matrix, params and units describe the design matrix
+        columns.  If reusable is True, solve can be called again for new
+        residuals without recomputing the factorization; this is not
+        possible when the design matrix is computed in chunks, since it is
+        not kept.
+        """
+        if chunk_size is not None:
+            residuals = self.resids.time_resids.to(u.s).value
+            normal = None
+            for rows, M, params, units in self.model.designmatrix_chunks(
+                    self.toas.table, chunk_size=chunk_size,
+                    incfrozen=False, incoffset=True, sparse=sparse):
+                if normal is None:
+                    normal = normal_equations_for(M)
+                normal.add(M, residuals[rows], Nvec[rows])
+            return lambda r: normal.solve(), params, units, False
 
-        # Define the linear system
         M, params, units = self.model.designmatrix(toas=self.toas.table,
-                incfrozen=False, incoffset=True)
-        Nvec = numpy.array(self.toas.get_errors().to(u.s))**2
+                incfrozen=False, incoffset=True, sparse=sparse)
+        if isinstance(M, BlockDesignMatrix) and M.sparse.shape[1] == 0:
+            # No piecewise parameters, the dense block is the whole matrix
+            M = M.dense
+        if isinstance(M, BlockDesignMatrix):
+            normal = normal_equations_for(M)
+            normal.add(M, numpy.zeros(len(Nvec)), Nvec)
+            solve = lambda r: normal.solve(M.tdot(r / Nvec))
+        else:
+            solve = WhitenedQR(M, Nvec).solve
+        return solve, params, units, True
+
+    def call_minimize(self, method='weighted', maxiter=20, chunk_size=None,
+                      sparse=True, threshold=1e-3, refactor=False):
+        """Run a linear weighted least-squared fitting method
+
+        The rows of the design matrix and the residuals are whitened by the
+        TOA errors and the columns scaled to unit norm, and the fit is
+        solved with a QR factorization of the design matrix.  The linear
+        fit is iterated until chi^2 changes by less than threshold, at most
+        maxiter times.  The factorization is only computed once and reused
+        for the new residuals of every iteration, unless refactor is True.
+        A step that increases chi^2 is undone; it is tried again with a new
+        factorization if the old one was reused, otherwise the fit stops.
+
+        If chunk_size is given, the design matrix is computed for blocks of
+        chunk_size TOAs and only the normal equations are accumulated, so the
+        full design matrix is never held in memory.  These are solved by a
+        Cholesky factorization with scaled columns, and recomputed at every
+        iteration.
+
+        Unless sparse is False, the columns of the piecewise parameters (DMX,
+        JUMP) are kept sparse and eliminated before the dense part of the
+        solve (see BlockNormalEquations).
+
+        The parameter uncertainties are set from the covariance matrix of
+        the last iteration.  Returns the chi^2 of the fit.
+        """
+        names = self.model.get_free_params()
+
+        Nvec = (get_errors_us(self.toas) * 1e-6)**2
         self.update_resids()
-        residuals = self.resids.time_resids.to(u.s)
+        chi2 = self.resids.chi2
 
-        # Weighted linear fit
-        Sigma_inv = numpy.dot(M.T / Nvec, M)
-        U, s, Vt = sl.svd(Sigma_inv)
-        Sigma = numpy.dot(Vt.T / s, U.T)
-        dpars = numpy.dot(Sigma, numpy.dot(M.T, residuals.value / Nvec))
+        solve = None
+        for ii in range(maxiter):
+            residuals = self.resids.time_resids.to(u.s).value
+            fresh = solve is None
+            if fresh:
+                solve, params, units, reusable = self.linear_solver(Nvec,
+                        chunk_size=chunk_size, sparse=sparse)
+            # Weighted linear fit
+            dpars, Sigma = solve(residuals)
+            if refactor or not reusable:
+                solve = None
 
-        # Uncertainties
-        errs = numpy.sqrt(numpy.diag(Sigma))
+            values = self.model.get_param_vector(names)
+            new_chi2 = self.apply_offsets(names, dpars, params, units)
+            if new_chi2 > chi2:
+                # Undo the step
+                self.minimize_func(values, *names)
+                if fresh:
+                    # No better point along the linearized model
+                    break
+                # The reused linearization is off, compute a new one
+                solve = None
+                continue
+            converged = chi2 - new_chi2 < threshold
+            chi2 = new_chi2
+            if converged:
+                break
 
-        # Set the new parameter values
-        # TODO: Now have to do the units manually, because not all parameters
-        #       have units everywhere in the code yet. Eventually, this can be
-        #       removed
-        conv = {'F0': u.Hz, 'F1': u.Hz/u.s, 'RAJ':u.hourangle,
-                'DECJ':u.degree, 'PMRA':u.mas/u.yr, 'PMDEC':u.mas/u.yr,
-                'PX':u.mas, 'DM':u.s/u.s}
+        self.set_uncertainties(names, Sigma, params, units)
+        return chi2
 
-        # TODO: units and fitp have a different ordering. That is confusing
-        for ii, pn in enumerate(fitp.keys()):
-            uind = params.index(pn)             # Index of designmatrix
-            un = 1.0 /  (units[uind]/u.s)       # Unit in designmatrix
-            pv, dpv = fitp[pn] * conv[pn], dpars[uind] * un
-            fitp[pn] = float( (pv+dpv) / conv[pn] )
 
-        # TODO: Also record the uncertainties in minimize_func
+class NoiseCovariance(object):
+    """Covariance matrix of the TOA noise, C = N + U_e J U_e^T + F phi F^T.
+
+    N is the diagonal white noise, U_e J U_e^T the ECORR noise (one fully
+    correlated block per epoch) and F phi F^T the low-rank red noise.  The
+    N x N matrix is never formed: N + U_e J U_e^T is inverted block by block
+    with the Sherman-Morrison formula, and the red noise is added with the
+    Woodbury identity, so solve() costs O(ntoas) per column.
+
+    Parameters
+    ----------
+    Nvec : numpy.ndarray, (ntoas,)
+        White noise variances.
+    epochs : numpy.ndarray of int, optional
+        ECORR epoch of every TOA, -1 for none (see NoiseModel.ecorr_epochs).
+    ecorr : numpy.ndarray, optional
+        ECORR variance of every epoch.
+    F : numpy.ndarray, (ntoas, nbasis), optional
+        Red noise basis.
+    phi : numpy.ndarray, (nbasis,), optional
+        Variances of the red noise basis coefficients.
+    """
+    def __init__(self, Nvec, epochs=None, ecorr=None, F=None, phi=None):
+        self.Nvec = numpy.asarray(Nvec, dtype=numpy.float64)
+        ntoas = len(self.Nvec)
+        self.U = None
+        if epochs is not None and len(ecorr):
+            rows = numpy.nonzero(epochs >= 0)[0]
+            self.U = sp.csr_matrix((numpy.ones(len(rows)),
+                                    (rows, epochs[rows])),
+                                   shape=(ntoas, len(ecorr)))
+            # Sherman-Morrison coefficient of every epoch
+            s = self.U.T.dot(1.0 / self.Nvec)
+            self.alpha = ecorr / (1.0 + ecorr * s)
+            self._logdet = numpy.sum(numpy.log(self.Nvec)) + \
+                           numpy.sum(numpy.log(1.0 + ecorr * s))
+        else:
+            self._logdet = numpy.sum(numpy.log(self.Nvec))
+        self.F = F
+        if F is not None:
+            NiF = self.white_solve(F)
+            self.Sigma = ScaledCholesky(numpy.diag(1.0 / phi) +
+                                        numpy.dot(F.T, NiF))
+            self.NiF = NiF
+            self._logdet += numpy.sum(numpy.log(phi)) + self.Sigma.logdet()
+
+    def white_solve(self, X):
+        """Return (N + U_e J U_e^T)^-1 X, for a vector or a matrix X."""
+        X = numpy.asarray(X, dtype=numpy.float64)
+        NiX = (X.T / self.Nvec).T
+        if self.U is None:
+            return NiX
+        sums = self.U.T.dot(NiX)
+        return NiX - (self.U.dot((sums.T * self.alpha).T).T / self.Nvec).T
+
+    def solve(self, X):
+        """Return C^-1 X, for a vector or a matrix X."""
+        NiX = self.white_solve(X)
+        if self.F is None:
+            return NiX
+        return NiX - numpy.dot(self.NiF,
+                               self.Sigma.solve(numpy.dot(self.F.T, NiX)))
+
+    def logdet(self):
+        """Return the log determinant of C."""
+        return self._logdet
+
+
+class gls_fitter(fitter):
+    """Generalized least-squares fitter for TOAs with correlated noise.
+
+    The noise is taken from the NoiseModel component of the model, if it
+    has one: the TOA errors scaled by EFAC and EQUAD, ECORR and power-law
+    red noise.  Without it, this is the same fit as wls_fitter.
+    """
+
+    def __init__(self, toas=None, model=None):
+        super(gls_fitter, self).__init__(toas=toas, model=model)
+
+    def noise_covariance(self, red_noise_modes=30):
+        """Return the NoiseCovariance of the TOAs for the current model."""
+        table = self.toas.table
+        if not hasattr(self.model, 'scaled_sigma'):
+            errors = get_errors_us(self.toas) * 1e-6
+            return NoiseCovariance(errors**2)
+        sigma = self.model.scaled_sigma(table).to(u.s).value
+        epochs, ecorr = self.model.ecorr_epochs(table)
+        F, phi = self.model.red_noise_basis_weights(table,
+                                                    nmodes=red_noise_modes)
+        return NoiseCovariance(sigma**2, epochs, ecorr, F, phi)
+
+    def call_minimize(self, method='generalized', maxiter=20, threshold=1e-3,
+                      red_noise_modes=30):
+        """Run a generalized least-squares fit.
+
+        The design matrix is weighted with the noise covariance through
+        NoiseCovariance.solve, which costs O(ntoas) per column.  As in
+        wls_fitter, the linear fit is iterated until chi^2 changes by less
+        than threshold, reusing the factorization of the normal equations,
+        and a step that increases chi^2 is undone.
+        The DMX and JUMP columns are stored dense here, since the ECORR
+        blocks couple the rows.
+
+        The parameter uncertainties are set from the covariance matrix.
+        Returns the generalized chi^2, r^T C^-1 r.
+        """
+        names = self.model.get_free_params()
+        cov = self.noise_covariance(red_noise_modes=red_noise_modes)
+        self.update_resids()
+        residuals = self.resids.time_resids.to(u.s).value
+        chi2 = numpy.dot(residuals, cov.solve(residuals))
+
+        CiM = None
+        for ii in range(maxiter):
+            fresh = CiM is None
+            if fresh:
+                M, params, units = self.model.designmatrix(
+                        toas=self.toas.table, incfrozen=False,
+                        incoffset=True)
+                CiM = cov.solve(M)
+                normal = ScaledCholesky(numpy.dot(M.T, CiM))
+                Sigma = normal.inverse()
+                del M
+            dpars = normal.solve(numpy.dot(CiM.T, residuals))
+            values = self.model.get_param_vector(names)
+            self.apply_offsets(names, dpars, params, units)
+            new_residuals = self.resids.time_resids.to(u.s).value
+            new_chi2 = numpy.dot(new_residuals, cov.solve(new_residuals))
+            if new_chi2 > chi2:
+                # Undo the step
+                self.minimize_func(values, *names)
+                if fresh:
+                    # No better point along the linearized model
+                    break
+                # The reused linearization is off, compute a new one
+                CiM = None
+                continue
+            residuals = new_residuals
+            converged = chi2 - new_chi2 < threshold
+            chi2 = new_chi2
+            if converged:
+                break
+
+        self.set_uncertainties(names, Sigma, params, units)
+        return chi2
+
+
+class online_fitter(fitter):
+    """online_fitter(model=None, threshold=1.0)
+
+    A weighted least-squares fit updated with new TOAs as they arrive.
+
+    add_toas() adds the whitened design matrix and residuals of a batch of
+    TOAs to a SquareRootInformation factor and updates the model parameters
+    and uncertainties, at a cost of O(new TOAs x params^2); the earlier TOAs
+    are not evaluated again.  The design matrix rows are computed at the
+    parameters of the time they are added.  Once the parameters have moved
+    by more than threshold times their uncertainties since the last
+    linearization, the model is evaluated again for all the TOAs and the
+    factor rebuilt.
+
+    The free parameters of the model are fitted; they must not change
+    between the batches.
+    """
+
+    def __init__(self, model=None, threshold=1.0):
+        super(online_fitter, self).__init__(toas=None, model=model)
+        self.threshold = threshold
+        self.batches = []
+        self.sqrt_info = None
+        self.nrelinearize = 0
+
+    def linearize_batch(self, toas):
+        """Return the design matrix, the residuals (s, not mean subtracted)
+        and their uncertainties (s) of a TOA table for the current model.
+        """
+        M, params, units = self.model.designmatrix(toas, incfrozen=False,
+                                                   incoffset=True)
+        F0 = self.model.F0.quantity.to(u.Hz).value
+        r = numpy.asarray(self.model.phase(toas).frac, dtype=numpy.float64)
+        sigma = get_errors_us(toas) * 1e-6
+        if self.sqrt_info is None:
+            self.params, self.units = params, units
+            self.names = params[1:]
+            self.factors = numpy.array([(1.0 / (un / u.s)).to(
+                derivatives.param_unit(getattr(self.model, pn))).value
+                for pn, un in zip(params[1:], units[1:])])
+        elif params != self.params:
+            raise ValueError("The free parameters changed since the first "
+                             "TOAs were added")
+        return M, r / F0, sigma
+
+    def add_toas(self, toas):
+        """Add a batch of TOAs (a TOAs object or a TOA table) to the fit.
+
+        Returns the chi^2 of all the TOAs added so far.
+        """
+        table = getattr(toas, 'table', toas)
+        M, r, sigma = self.linearize_batch(table)
+        if self.sqrt_info is None:
+            self.sqrt_info = SquareRootInformation(
+                    numpy.sqrt(numpy.sum((M / sigma[:,None])**2, axis=0)))
+            self.offset = 0.0
+            self.drift = numpy.zeros(len(self.params))
+        self.sqrt_info.add(M, r - self.offset, sigma)
+        self.batches.append(table)
+        self.update_solution()
+        errs = numpy.sqrt(numpy.diag(self.Sigma))
+        if numpy.any(numpy.abs(self.drift) > self.threshold * errs):
+            self.relinearize()
+        return self.sqrt_info.chi2
+
+    def update_solution(self):
+        """Apply the solution of the linear fit to the model parameters and
+        make it the reference of the residuals.
+        """
+        dpars, self.Sigma = self.sqrt_info.solve()
+        self.sqrt_info.shift(dpars)
+        self.offset += dpars[0]
+        self.drift += dpars
+        values = self.model.get_param_vector(self.names)
+        self.model.set_param_vector(values + dpars[1:] * self.factors,
+                                    self.names)
+        self.set_uncertainties(self.names, self.Sigma, self.params,
+                               self.units)
+
+    def relinearize(self):
+        """Evaluate the design matrix and residuals of all the TOAs for the
+        current model and rebuild the factor, scaled by the column norms of
+        the new design matrix.
+        """
+        rows = [self.linearize_batch(table) for table in self.batches]
+        norm2 = sum(numpy.sum((M / sigma[:,None])**2, axis=0)
+                    for M, r, sigma in rows)
+        self.sqrt_info = SquareRootInformation(numpy.sqrt(norm2))
+        for M, r, sigma in rows:
+            self.sqrt_info.add(M, r, sigma)
+        self.offset = 0.0
+        self.drift = numpy.zeros(len(self.params))
+        self.nrelinearize += 1
+        self.update_solution()
 
-        chi2 = self.minimize_func(list(fitp.values()), *fitp.keys())
+    @property
+    def chi2(self):
+        """chi^2 of the fit to all the TOAs added so far."""
+        if self.sqrt_info is None:
+            return None
+        return self.sqrt_info.chi2
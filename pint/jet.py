@@ -0,0 +1,261 @@
+# jet.py
+# First order jets (dual numbers) for forward-mode differentiation
+"""Arrays that carry their first derivatives wrt a set of variables.
+
+A `Jet` holds a value array and the derivatives of that value wrt nvars
+variables, an array of shape (nvars,) + value.shape.  Arithmetic on jets
+(and on mixtures of jets and plain numbers or arrays) applies the chain rule,
+so a delay or phase function written with these operations returns the value
+and all first derivatives in a single pass over the TOAs.
+
+Timing model components opt in by registering a jet version of a delay,
+phase or DM function in the model's jet_funcs dict, under the name of the
+plain function.  A jet function gets the parameter values from a
+`JetVariables` instance, which returns a jet for the parameters being
+differentiated and the plain value for all the others.
+
+The values keep their dtype (long double for the phases), the derivatives
+are computed in float64.
+"""
+import numpy as np
+
+
+def _expand(derivs, ndim):
+    """Reshape derivatives so they broadcast against a value of ndim
+    dimensions.
+    """
+    missing = ndim - (derivs.ndim - 1)
+    if missing <= 0:
+        return derivs
+    return derivs.reshape((derivs.shape[0],) + (1,) * missing +
+                          derivs.shape[1:])
+
+
+def _combine(value, terms):
+    """Return a Jet of value, with derivatives sum(coef * derivs) over the
+    (coef, derivs) terms.  derivs is None for the constant operands, coef None
+    for a unit coefficient.
+    """
+    ndim = np.ndim(value)
+    result = None
+    for coef, derivs in terms:
+        if derivs is None:
+            continue
+        derivs = _expand(derivs, ndim)
+        if coef is not None:
+            derivs = derivs * np.asarray(coef, dtype=np.float64)
+        result = derivs if result is None else result + derivs
+    if result is None:
+        return value
+    shape = (result.shape[0],) + np.shape(value)
+    if result.shape != shape:
+        result = result + np.zeros(shape)
+    return Jet(value, result)
+
+
+def _parts(x):
+    if isinstance(x, Jet):
+        return x.value, x.derivs
+    return x, None
+
+
+def value(x):
+    """Return the value of a jet, or x itself if it is not a jet."""
+    if isinstance(x, Jet):
+        return x.value
+    return x
+
+
+def derivatives(x, nvars):
+    """Return the derivatives of x, which are zero if x is not a jet."""
+    if isinstance(x, Jet):
+        return x.derivs
+    return np.zeros((nvars,) + np.shape(x))
+
+
+class Jet(object):
+    """A value array and its first derivatives.
+
+    Parameters
+    ----------
+    value : array_like
+    derivs : array_like, shape (nvars,) + value.shape
+    """
+    # Make numpy arrays and scalars defer to the jet operators
+    __array_priority__ = 100
+    __array_ufunc__ = None
+
+    def __init__(self, value, derivs):
+        self.value = value
+        self.derivs = np.asarray(derivs, dtype=np.float64)
+
+    @classmethod
+    def variable(cls, value, index, nvars):
+        """Return the jet of variable number index out of nvars."""
+        derivs = np.zeros((nvars,) + np.shape(value))
+        derivs[index] = 1.0
+        return cls(value, derivs)
+
+    @property
+    def nvars(self):
+        return self.derivs.shape[0]
+
+    @property
+    def shape(self):
+        return np.shape(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __getitem__(self, item):
+        if not isinstance(item, tuple):
+            item = (item,)
+        return Jet(self.value[item], self.derivs[(slice(None),) + item])
+
+    def __repr__(self):
+        return "Jet(%r, %r)" % (self.value, self.derivs)
+
+    def __neg__(self):
+        return Jet(-self.value, -self.derivs)
+
+    def __pos__(self):
+        return self
+
+    def __add__(self, other):
+        ov, od = _parts(other)
+        return _combine(self.value + ov, [(None, self.derivs), (None, od)])
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        ov, od = _parts(other)
+        return _combine(self.value - ov, [(None, self.derivs), (-1.0, od)])
+
+    def __rsub__(self, other):
+        ov, od = _parts(other)
+        return _combine(ov - self.value, [(-1.0, self.derivs), (None, od)])
+
+    def __mul__(self, other):
+        ov, od = _parts(other)
+        return _combine(self.value * ov,
+                        [(ov, self.derivs), (self.value, od)])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        ov, od = _parts(other)
+        return _combine(self.value / ov,
+                        [(1.0 / ov, self.derivs),
+                         (-self.value / ov**2, od)])
+
+    def __rtruediv__(self, other):
+        ov, od = _parts(other)
+        return _combine(ov / self.value,
+                        [(-ov / self.value**2, self.derivs),
+                         (1.0 / self.value, od)])
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __pow__(self, power):
+        if isinstance(power, Jet):
+            return exp(power * log(self))
+        return _combine(self.value**power,
+                        [(power * self.value**(power - 1), self.derivs)])
+
+
+def sin(x):
+    v, d = _parts(x)
+    return _combine(np.sin(v), [(np.cos(v), d)])
+
+
+def cos(x):
+    v, d = _parts(x)
+    return _combine(np.cos(v), [(-np.sin(v), d)])
+
+
+def tan(x):
+    v, d = _parts(x)
+    return _combine(np.tan(v), [(1.0 / np.cos(v)**2, d)])
+
+
+def arctan(x):
+    v, d = _parts(x)
+    return _combine(np.arctan(v), [(1.0 / (1.0 + v**2), d)])
+
+
+def arctan2(y, x):
+    yv, yd = _parts(y)
+    xv, xd = _parts(x)
+    r2 = xv**2 + yv**2
+    return _combine(np.arctan2(yv, xv), [(xv / r2, yd), (-yv / r2, xd)])
+
+
+def exp(x):
+    v, d = _parts(x)
+    ev = np.exp(v)
+    return _combine(ev, [(ev, d)])
+
+
+def log(x):
+    v, d = _parts(x)
+    return _combine(np.log(v), [(1.0 / v, d)])
+
+
+def sqrt(x):
+    v, d = _parts(x)
+    sv = np.sqrt(v)
+    return _combine(sv, [(0.5 / sv, d)])
+
+
+def where(condition, x, y):
+    """Element-wise choice between x and y, like numpy.where."""
+    xv, xd = _parts(x)
+    yv, yd = _parts(y)
+    result = np.where(condition, xv, yv)
+    cond = np.asarray(condition, dtype=np.float64)
+    return _combine(result, [(cond, xd), (1.0 - cond, yd)])
+
+
+class JetVariables(object):
+    """Parameter values of a timing model, as jets for the differentiated
+    parameters.
+
+    Calling the instance with a parameter name returns its value (.value, in
+    the parameter units, MJD for epochs); for the parameters in params this is
+    a Jet with a unit derivative in the column of the parameter.  The names
+    of the parameters that were requested as jets are collected in .used, so
+    the columns no jet function contributed to can be told apart from zero
+    derivatives.
+
+    Parameters
+    ----------
+    model : TimingModel
+    params : list of str
+        The parameters to differentiate.
+    """
+    def __init__(self, model, params):
+        self.model = model
+        self.params = list(params)
+        self.index = dict((pn, ii) for ii, pn in enumerate(self.params))
+        self.used = set()
+
+    @property
+    def nvars(self):
+        return len(self.params)
+
+    def column(self, name):
+        """Return the derivative column of a parameter, or None if it is not
+        differentiated.
+        """
+        if name not in self.index:
+            return None
+        self.used.add(name)
+        return self.index[name]
+
+    def __call__(self, name):
+        val = getattr(self.model, name).value
+        col = self.column(name)
+        if col is None or val is None:
+            return val
+        return Jet.variable(val, col, self.nvars)
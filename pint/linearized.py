@@ -0,0 +1,97 @@
+# linearized.py
+# Timing model phases linearized around a reference parameter vector
+"""Fast approximate phases for small parameter changes.
+
+Optimizers and samplers mostly propose parameter vectors that differ from
+the previous ones by much less than the parameter uncertainties.  For those,
+the model phase is well approximated by the first order expansion
+
+    phase(p) = phase(p0) + D (p - p0),
+
+where D = d phase / d p is computed once from the design matrix.  A
+`LinearizedModel` keeps the reference phase and D.  When a parameter moves
+by more than trust_radius times its scale from the reference, the model is
+evaluated exactly and linearized again at the new parameters.
+"""
+import numpy as np
+import astropy.units as u
+from .phase import Phase
+from . import derivatives
+
+
+class LinearizedModel(object):
+    """The phases of a timing model, linearized in some of its parameters.
+
+    The parameter values are read from the model itself, so the model
+    parameters are set as usual (e.g. with set_param_vector) and phase()
+    returns the phase for the current values.
+
+    Parameters
+    ----------
+    model : TimingModel
+    toas : astropy.table.Table
+        The TOA table, e.g. TOAs.table
+    params : list of str, optional
+        The parameters that are varied, by default the free parameters.
+    trust_radius : float
+        Largest change of a parameter, in units of its scale, for which the
+        linear approximation is used.
+    scales : array_like, optional
+        Scale of every parameter, in the units of the parameter values.  By
+        default the uncertainties, if known (see
+        pint.derivatives.param_steps).
+    """
+    def __init__(self, model, toas, params=None, trust_radius=1.0,
+                 scales=None):
+        self.model = model
+        self.toas = toas
+        if params is None:
+            params = model.get_free_params()
+        self.params = list(params)
+        self.trust_radius = trust_radius
+        if scales is None:
+            scales = derivatives.param_steps(model, self.params, factor=1.0)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        # Number of exact and of linearized evaluations
+        self.nexact = 0
+        self.nlinear = 0
+        self.linearize()
+
+    def linearize(self):
+        """Evaluate the model exactly at the current parameters and use them
+        as the new reference.
+        """
+        self.x0 = self.model.get_param_vector(self.params)
+        self.phase0 = self.model.phase(self.toas)
+        self.F0 = self.model.F0.quantity.to(u.Hz).value
+        M, params, units = self.model.designmatrix(self.toas, incoffset=False,
+                                                   params=self.params)
+        self.D = np.empty((len(self.toas), len(self.params)))
+        for jj, pn in enumerate(self.params):
+            unit = u.s / derivatives.param_unit(getattr(self.model, pn))
+            # The residuals change by -M dp, the phase by -F0 M dp
+            self.D[:,jj] = -self.F0 * M[:,jj] * (1.0 * units[jj]).to(unit).value
+        self.nexact += 1
+
+    def offsets(self):
+        """Return the offsets of the parameters from the reference, in units
+        of their scales.
+        """
+        dx = self.model.get_param_vector(self.params) - self.x0
+        return np.asarray(dx, dtype=np.float64) / self.scales
+
+    def in_trust_region(self):
+        """Whether the current parameters are within the trust radius of the
+        reference.
+        """
+        return np.all(np.abs(self.offsets()) <= self.trust_radius)
+
+    def phase(self):
+        """Return the model phase for the current parameters, as a Phase."""
+        if not self.in_trust_region():
+            self.linearize()
+            return self.phase0
+        self.nlinear += 1
+        dphase = np.dot(self.D, self.offsets() * self.scales)
+        # Carry whole turns of dphase into the integer part
+        return self.phase0 + Phase(dphase)
@@ -10,6 +10,7 @@ from .timing_model import TimingModel, MissingParameter, Cache
 from ..utils import time_from_mjd_string, time_to_longdouble, str2longdouble
 from pint import ls
 from pint import utils
+import pint.jet as jet
 import time
 
 mas_yr = (u.mas / u.yr)
@@ -36,6 +37,7 @@ class Astrometry(TimingModel):
 
         self.add_param(p.MJDParameter(name="POSEPOCH",
             description="Reference epoch for position"))
+        self.nondiff_params.add('POSEPOCH')
 
         self.add_param(p.floatParameter(name="PMRA",
             units="mas/year", value=0.0,
@@ -50,6 +52,8 @@ class Astrometry(TimingModel):
             description="Parallax"))
 
         self.delay_funcs['L1'] += [self.solar_system_geometric_delay,]
+        self.jet_funcs['solar_system_geometric_delay'] = \
+            self.solar_system_geometric_delay_jet
 
     def setup(self):
         super(Astrometry, self).setup()
@@ -114,6 +118,38 @@ class Astrometry(TimingModel):
             delay += (0.5 * (re_sqr / L) * (1.0 - re_dot_L**2 / re_sqr)).to(ls).value
         return delay
 
+    def solar_system_geometric_delay_jet(self, toas, jv):
+        """Jet version of solar_system_geometric_delay, see pint.jet.
+
+        The proper motion is always applied, so the derivatives wrt PMRA and
+        PMDEC are also available when they are zero.
+        """
+        epoch = numpy.asarray(toas['tdbld'], dtype=numpy.float64)
+        ra = jv('RAJ') * (1.0 * self.RAJ.units).to(u.rad).value
+        dec = jv('DECJ') * (1.0 * self.DECJ.units).to(u.rad).value
+        posepoch = 'POSEPOCH' if self.POSEPOCH.value is not None else 'PEPOCH'
+        if getattr(self, posepoch, None) is not None and \
+                getattr(self, posepoch).value is not None:
+            dt = epoch - jv(posepoch)
+            pm_scale = (1.0 * self.PMRA.units * u.day).to(u.rad).value
+            ra = ra + dt * jv('PMRA') * pm_scale / numpy.cos(jet.value(dec))
+            dec = dec + dt * jv('PMDEC') * pm_scale
+
+        ssb_obs = numpy.asarray(toas['ssb_obs_pos'].quantity.to(u.km).value)
+        cos_dec = jet.cos(dec)
+        re_dot_L = ssb_obs[:,0] * cos_dec * jet.cos(ra) + \
+                   ssb_obs[:,1] * cos_dec * jet.sin(ra) + \
+                   ssb_obs[:,2] * jet.sin(dec)
+        km_per_ls = (1.0 * ls).to(u.km).value
+        delay = -re_dot_L / km_per_ls
+        # Parallax, with the distance 1/PX kpc
+        re_sqr = numpy.sum(ssb_obs**2, axis=1)
+        px_per_km = (1.0 * self.PX.units).to(u.rad).value / \
+                    (1.0 * u.au).to(u.km).value
+        delay = delay + 0.5 * (re_sqr * jv('PX') * px_per_km) * \
+                (1.0 - re_dot_L**2 / re_sqr) / km_per_ls
+        return delay
+
     @Cache.use_cache
     def get_d_delay_quantities(self, toas):
         """Calculate values needed for many d_delay_d_param functions """
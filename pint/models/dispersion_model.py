@@ -8,6 +8,7 @@ from .timing_model import TimingModel, Cache
 import astropy.units as u
 import numpy as np
 import pint.utils as ut
+import pint.jet as jet
 import astropy.time as time
 # The units on this are not completely correct
 # as we don't really use the "pc cm^3" units on DM.
@@ -27,6 +28,8 @@ class Dispersion(TimingModel):
                        description="Dispersion measure"))
         self.dm_value_funcs = [self.constant_dm,]
         self.delay_funcs['L1'] += [self.dispersion_delay,]
+        self.jet_funcs['constant_dm'] = self.constant_dm_jet
+        self.jet_funcs['dispersion_delay'] = self.dispersion_delay_jet
 
     def setup(self):
         super(Dispersion, self).setup()
@@ -36,6 +39,10 @@ class Dispersion(TimingModel):
         cdm.fill(self.DM.quantity)
         return cdm * self.DM.units
 
+    def constant_dm_jet(self, toas, jv):
+        """Jet version of constant_dm, see pint.jet."""
+        return jv('DM') * np.ones(len(toas))
+
     def dispersion_time_delay(self, DM, freq):
         """Return the dispersion time delay for a set of frequency.
         This equation if cited from Duncan Lorimer, Michael Kramer, Handbook of Pulsar
@@ -60,6 +67,30 @@ class Dispersion(TimingModel):
 
         return self.dispersion_time_delay(dm, bfreq)
 
+    def dispersion_delay_jet(self, toas, jv):
+        """Jet version of dispersion_delay, see pint.jet.
+
+        The DM functions without a jet version contribute their value only.
+        """
+        try:
+            bfreq = self.barycentric_radio_freq(toas)
+        except AttributeError:
+            warn("Using topocentric frequency for dedispersion!")
+            bfreq = toas['freq']
+        if hasattr(bfreq, 'unit'):
+            bfreq = bfreq.to(u.MHz).value
+        bfreq = np.asarray(bfreq)
+
+        dm = np.zeros(len(toas))
+        for dm_f in self.dm_value_funcs:
+            jf = self.jet_funcs.get(dm_f.__name__)
+            if jf is not None:
+                dm = dm + jf(toas, jv)
+            else:
+                dm = dm + dm_f(toas).to(self.DM.units).value
+        dm_scale = (1.0 * self.DM.units * DMconst / u.MHz**2).to(u.s).value
+        return dm * dm_scale / bfreq**2
+
 
 class DispersionDMX(Dispersion):
     """This class provides a DMX model based on the class of Dispersion.
@@ -91,6 +122,11 @@ class DispersionDMX(Dispersion):
                        descriptionTplt=lambda x: 'End of DMX interval',
                        type_match='MJD', time_scale='utc'))
         self.dm_value_funcs += [self.dmx_dm,]
+        self.jet_funcs['dmx_dm'] = self.dmx_dm_jet
+        self.sparse_deriv_funcs['DMX_'] = self.d_delay_d_DMX_rows
+        # The DMX windows are selected once and kept in the TOA table, DMX
+        # itself is not used
+        self.nondiff_params.update(['DMX', 'DMXR1_', 'DMXR2_'])
         self.model_special_params = ['DMX_0001', 'DMXR1_0001','DMXR2_0001']
     def setup(self):
         super(Dispersion, self).setup()
@@ -110,29 +146,56 @@ class DispersionDMX(Dispersion):
             errorMsg += 'Please check your prefixed parameters.'
             raise AttributeError(errorMsg)
 
-    def dmx_dm(self, toas):
+    def dmx_section(self, toas):
+        """Return the DMX section of every TOA, 0 outside of all DMX ranges.
+        """
         # Set toas to the right DMX peiod.
-        DMX_mapping = self.get_prefix_mapping('DMX_')
-        DMXR1_mapping = self.get_prefix_mapping('DMXR1_')
-        DMXR2_mapping = self.get_prefix_mapping('DMXR2_')
         if 'DMX_section' not in toas.keys():
-            toas['DMX_section'] = np.zeros_like(toas['index'])
+            DMXR1_mapping = self.get_prefix_mapping('DMXR1_')
+            DMXR2_mapping = self.get_prefix_mapping('DMXR2_')
+            toas['DMX_section'] = np.zeros(len(toas), dtype=int)
             epoch_ind = 1
-            while epoch_ind in DMX_mapping:
+            while epoch_ind in DMXR1_mapping:
                 # Get the parameters
                 r1 = getattr(self, DMXR1_mapping[epoch_ind]).quantity
                 r2 = getattr(self, DMXR2_mapping[epoch_ind]).quantity
                 msk = np.logical_and(toas['mjd'] >= r1, toas['mjd'] <= r2)
                 toas['DMX_section'][msk] = epoch_ind
                 epoch_ind = epoch_ind + 1
+        return np.asarray(toas['DMX_section'])
 
-        # Get DMX delays
-        dm = np.zeros(len(toas)) * self.DM.units
-        DMX_group = toas.group_by('DMX_section')
-        for ii, key in enumerate(DMX_group.groups.keys):
-            keyval = key.as_void()[0]
-            if keyval != 0:
-                dmx = getattr(self, DMX_mapping[keyval]).quantity
-                ind = DMX_group.groups[ii]['index']
-                dm[ind] = dmx
-        return dm
+    def dmx_dm(self, toas):
+        section = self.dmx_section(toas)
+        # Get DMX delays, section 0 is outside of all DMX ranges
+        indices, values = self.get_prefix_values('DMX_')
+        dmx_table = np.zeros(max(indices.max() if len(indices) else 0,
+                                 section.max()) + 1)
+        dmx_table[indices] = values
+        return dmx_table[section] * self.DM.units
+
+    def dmx_dm_jet(self, toas, jv):
+        """Jet version of dmx_dm, see pint.jet."""
+        dm = self.dmx_dm(toas).to(self.DM.units).value
+        section = self.dmx_section(toas)
+        derivs = np.zeros((jv.nvars, len(toas)))
+        for idx, name in self.get_prefix_mapping('DMX_').items():
+            col = jv.column(name)
+            if col is not None:
+                derivs[col] = section == idx
+        return jet.Jet(dm, derivs)
+
+    def d_delay_d_DMX_rows(self, toas, param):
+        """Return the TOAs in the range of a DMX_ parameter and the
+        derivative of the delay wrt it there, see pint.design_matrix.
+        """
+        index = getattr(self, param).index
+        rows = np.nonzero(self.dmx_section(toas) == index)[0]
+        try:
+            bfreq = self.barycentric_radio_freq(toas)
+        except AttributeError:
+            warn("Using topocentric frequency for dedispersion!")
+            bfreq = toas['freq']
+        bfreq = u.Quantity(bfreq, u.MHz)[rows]
+        return rows, self.dispersion_time_delay(np.ones(len(rows)) *
+                                                self.DM.units, bfreq) / \
+                     self.DM.units
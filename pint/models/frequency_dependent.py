@@ -20,6 +20,7 @@ class FD(TimingModel):
                        type_match='float'))
 
         self.delay_funcs['L1'] += [self.FD_delay]
+        self.jet_funcs['FD_delay'] = self.FD_delay_jet
 
     def setup(self):
         super(FD, self).setup()
@@ -41,28 +42,30 @@ class FD(TimingModel):
         Eq.(2):
         FDdelay = sum(c_i * (log(obs_freq/1GHz))^i)
         """
-        FD_mapping = self.get_prefix_mapping('FD')
         log_freq = np.log(toas['freq'] / (1 * u.GHz))
-        FD_coeff = [getattr(self, FD_mapping[ii]).value \
-                   for ii in range(self.num_FD_terms,0,-1)]
+        # Highest order first, plus the zeroth order term
+        FD_coeff = list(self.get_prefix_values('FD')[1][::-1])
         FD_coeff += [0.0]
 
         FD_delay = np.polyval(FD_coeff, log_freq)
 
         return FD_delay * self.FD1.units
 
+    def FD_delay_jet(self, toas, jv):
+        """Jet version of FD_delay, see pint.jet."""
+        log_freq = np.log(np.asarray((toas['freq'] / (1 * u.GHz)).decompose()))
+        FD_mapping = self.get_prefix_mapping('FD')
+        FD_delay = np.zeros(len(toas))
+        for ii in sorted(FD_mapping.keys()):
+            FD_delay = FD_delay + jv(FD_mapping[ii]) * log_freq ** ii
+        return FD_delay * (1.0 * self.FD1.units).to(u.s).value
+
     def d_delay_d_FD(self, toas, FD_term=1):
         """This is a derivative function for FD parameter
         """
-        FD_mapping = self.get_prefix_mapping('FD')
         if FD_term > self.num_FD_terms:
             raise ValueError('FD model has no FD%d term' % FD_term)
 
-        d_delay_d_FD = np.zeros_like(toas, dtype=np.longdouble)
-        for ii in range(1,self.num_FD_terms+1):
-            FD_coef = getattr(self, FD_mapping[ii])
-            if ii == FD_term:
-                FD_coef.value = 1.0
-            log_freq = np.log(toas['freq'] / (1 * u.GHz))
-            d_delay_d_FD += FD_coef.value * (log_freq) ** ii
+        log_freq = np.log(toas['freq'] / (1 * u.GHz))
+        d_delay_d_FD = np.asarray(log_freq, dtype=np.longdouble) ** FD_term
         return d_delay_d_FD
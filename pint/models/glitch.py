@@ -61,7 +61,7 @@ class Glitch(TimingModel):
         super(Glitch, self).setup()
         # Check for required params, Check for Glitch numbers
         self.num_glitches = len(self.get_prefix_mapping('GLPH_'))
-        glphparams = [x for x in self.params if x.startswith('GLPH_')]
+        glphparams = self.get_prefix_mapping('GLPH_').values()
         # check if glitch phase matches GLEP, GLF0, GLF1
         for glphnm in glphparams:
             glphpar = getattr(self, glphnm)
@@ -79,7 +79,7 @@ class Glitch(TimingModel):
                     getattr(self, plf + "%d" % idx).value = 0.0
 
         # Check the Decay Term.
-        glf0dparams = [x for x in self.params if x.startswith('GLF0D_')]
+        glf0dparams = self.get_prefix_mapping('GLF0D_').values()
         for glf0d in glf0dparams:
             df0d = getattr(self, glf0d)
             idx = df0d.index
@@ -102,11 +102,8 @@ class Glitch(TimingModel):
         returns an array of phases in long double
         """
         phs = numpy.zeros_like(toas, dtype=numpy.longdouble)
-        glphnames = [x for x in self.params if x.startswith('GLPH_')]
-        for glphnm in glphnames:
-            glph = getattr(self, glphnm)
-            dphs = glph.value
-            idx = glph.index
+        glph_indices, glph_values = self.get_prefix_values('GLPH_')
+        for idx, dphs in zip(glph_indices, glph_values):
             dF0 = getattr(self, "GLF0_%d" % idx).quantity
             dF1 = getattr(self, "GLF1_%d" % idx).quantity
             eph = time_to_longdouble(getattr(self, "GLEP_%d" % idx).value)
@@ -138,8 +135,3 @@ class Glitch(TimingModel):
     def d_phase_d_GLPH_1(self, toas):
         """Calculate the derivative wrt GLPH_1"""
         return numpy.zeros_like(toas['tdbld'])
-
-    def d_phase_d_GLEP_1(self, toas):
-        """Calculate the derivative wrt GLEP_1"""
-        # ToDo
-        return numpy.zeros_like(toas['tdbld'])
@@ -16,6 +16,8 @@ class JumpDelay(TimingModel):
         # TODO: In the future we should have phase jump as well.
         self.add_param(p.maskParameter(name = 'JUMP', units='second'))
         self.delay_funcs['L1'] += [self.jump_delay,]
+        self.jet_funcs['jump_delay'] = self.jump_delay_jet
+        self.sparse_deriv_funcs['JUMP'] = self.d_delay_d_JUMP_rows
     def setup(self):
         super(JumpDelay, self).setup()
         self.jumps = []
@@ -36,3 +38,22 @@ class JumpDelay(TimingModel):
             # delay calculation.
             jdelay[mask] += -jump_par.value
         return jdelay
+
+    def jump_delay_jet(self, toas, jv):
+        """Jet version of jump_delay, see pint.jet."""
+        jdelay = numpy.zeros(len(toas))
+        for jump in self.jumps:
+            mask = getattr(self, jump).select_toa_mask(toas)
+            selected = numpy.zeros(len(toas))
+            selected[mask] = 1.0
+            jdelay = jdelay - jv(jump) * selected
+        return jdelay
+
+    def d_delay_d_JUMP_rows(self, toas, param):
+        """Return the TOAs a jump applies to and the derivative of the delay
+        wrt the jump there, see pint.design_matrix.
+        """
+        # Rows as used by jump_delay
+        rows = numpy.asarray(getattr(self, param).select_toa_mask(toas),
+                             dtype=int)
+        return rows, -numpy.ones(len(rows)) * u.s / u.s
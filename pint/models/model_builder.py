@@ -6,34 +6,52 @@ import os
 from .timing_model import generate_timing_model, TimingModel
 from pint.utils import split_prefixed_name
 from .parameter import prefixParameter
-import os, inspect, fnmatch
-import glob
-import sys
+import inspect
+import importlib
 
-def get_componets():
+# Modules of pint.models that define timing model components.  A new
+# component module has to be added here to be picked up by the model builder.
+component_modules = ('astrometry', 'bt', 'dispersion_model',
+                     'frequency_dependent', 'glitch', 'jump', 'noise_model',
+                     'pint_dd_model', 'pint_pulsar_binary',
+                     'solar_system_shapiro', 'spindown')
+
+_components_cache = {}
+
+def get_componets(modules=component_modules):
+    """Return a dictionary with the module name as key and the set of timing
+    model component classes in that module as value.
+
+    The result is cached, so the component modules are only inspected once.
+    """
+    modules = tuple(modules)
+    if modules in _components_cache:
+        return _components_cache[modules]
+    package = __name__.rpartition('.')[0]
     timing_comps = {}
-    path = os.path.dirname(os.path.abspath(__file__))
-    for root, dirnames, filenames in os.walk(path):
-        for filename in fnmatch.filter(filenames, '*.py'):
-            if filename == '__init__.py':
-                continue
-            mod_root_start = root.find('pint/models')
-            if mod_root_start + len('pint/models') > len(root):
-                mod_root = ''
-            else:
-                mod_root = root[mod_root_start + len('pint/models/'):]
-            mod = os.path.join(mod_root, filename).replace("/", ".")[:-3]
-            exec('import %s as tmp' % mod)
-            s = set()
-            for k, v in tmp.__dict__.items():
-                if inspect.isclass(v) and issubclass(v, TimingModel):
-                    if k == 'TimingModel':
-                        continue
-                    s.add(v)
-                if s != set():
-                    timing_comps[tmp.__name__] = s
+    for mod in modules:
+        tmp = importlib.import_module(package + '.' + mod)
+        s = set()
+        for k, v in tmp.__dict__.items():
+            if inspect.isclass(v) and issubclass(v, TimingModel):
+                if v is TimingModel:
+                    continue
+                s.add(v)
+        if s != set():
+            timing_comps[tmp.__name__] = s
+    _components_cache[modules] = timing_comps
     return timing_comps
 
+# One instance of each component class, used to probe parfiles.  They are
+# never returned to the user.
+_component_probes = {}
+
+def get_component_probe(comp):
+    """Return the cached probe instance of a component class."""
+    if comp not in _component_probes:
+        _component_probes[comp] = comp()
+    return _component_probes[comp]
+
 ComponentsList = get_componets()
 
 default_models = ["StandardTimingModel",]
@@ -115,7 +133,7 @@ class model_builder(object):
             if l.startswith('#') or l[:2]=="C ":
                 continue
             k = l.split()
-            if k[0] in param.keys(): # repeat parameter TODO: add JUMP1 even there is only one
+            if k[0] in param: # repeat parameter TODO: add JUMP1 even there is only one
                 if k[0] in repeat_par.keys():
                     repeat_par[k[0]] += 1
                 else:
@@ -138,7 +156,7 @@ class model_builder(object):
         for module in self.comps.keys():
             selected_c = None
             for c in self.comps[module]:
-                cclass = c()
+                cclass = get_component_probe(c)
                 #Check is this components a subclass of other components
                 if TimingModel not in c.__bases__:
                     if hasattr(cclass,'model_special_params'):
@@ -209,17 +227,16 @@ class model_builder(object):
         # Find unrecognised parameters in par file.
 
         if self.param_inparF is not None:
-            parName = []
+            parName = set(self.param_inModel)
             for p in self.param_inModel:
-                parName+= getattr(self.model_instance,p).aliases
-
-            parName += self.param_inModel
+                parName.update(getattr(self.model_instance,p).aliases)
 
             for pp in self.param_inparF.keys():
                 if pp not in parName:
                     self.param_unrecognized[pp] = self.param_inparF[pp]
 
-            for ptype in ['prefixParameter', 'maskParameter']:
+            self.add_mask_params()
+            for ptype in ['prefixParameter',]:
                 prefix_in_model = self.model_instance.get_params_of_type(ptype)
                 prefix_param = self.search_prefix_param(self.param_unrecognized.keys(),
                                                         prefix_in_model)
@@ -237,6 +254,30 @@ class model_builder(object):
         if parfile is not None:
             self.model_instance.read_parfile(parfile)
 
+    def add_mask_params(self):
+        """Add a mask parameter for every mask parameter line (JUMP, EFAC,
+        ...) in the parfile.  The lines can use any alias of the parameter,
+        e.g. T2EFAC for EFAC, and are numbered together, as read_parfile
+        does.
+        """
+        model = self.model_instance
+        first = {}
+        for pn in model.get_params_of_type('maskParameter'):
+            par = getattr(model, pn)
+            first.setdefault(par.origin_name, par)
+        for origin, exm_par in first.items():
+            names = [origin] + exm_par.origin_aliases
+            nlines = 0
+            for pp in self.param_inparF.keys():
+                for name in names:
+                    idx = pp[len(name):]
+                    if pp.startswith(name) and (idx == '' or idx.isdigit()):
+                        nlines += 1
+                        break
+            for idx in range(1, nlines + 1):
+                if origin + str(idx) not in model.params:
+                    model.add_param(exm_par.new_param(idx))
+
 def get_model(parfile):
     """A one step function to build model from a parfile
         Parameters
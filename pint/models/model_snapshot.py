@@ -0,0 +1,223 @@
+# model_snapshot.py
+# Compact, picklable representation of a timing model
+"""A snapshot stores the state of a timing model as plain data.
+
+A timing model built by `generate_timing_model` is an instance of a class
+that only exists in the process that created it, and every parameter holds
+astropy Quantity/Angle/Time values.  Pickling it is slow and, for the
+dynamically generated class, fragile.  A `ModelSnapshot` instead keeps the
+component class names and the parameters as arrays, so it is cheap to send
+to a worker process, where `restore()` rebuilds an equivalent model without
+reading a parfile.
+"""
+import importlib
+import numpy as np
+import astropy.units as u
+import astropy.time as time
+from astropy.coordinates.angles import Angle
+from .timing_model import generate_timing_model
+
+# Model classes generated in this process, keyed by name and components, so
+# restoring many snapshots of the same model does not create new types.
+_model_classes = {}
+
+
+def _class_path(cls):
+    return (cls.__module__, cls.__name__)
+
+
+def _import_class(path):
+    return getattr(importlib.import_module(path[0]), path[1])
+
+
+def _is_importable(cls):
+    try:
+        return _import_class(_class_path(cls)) is cls
+    except (ImportError, AttributeError):
+        return False
+
+
+def _param_kind(par):
+    """Classify a parameter by the type of its quantity."""
+    q = par.quantity
+    if q is None:
+        return 'none'
+    if isinstance(q, bool):
+        return 'bool'
+    if isinstance(q, str):
+        return 'str'
+    if isinstance(q, time.Time):
+        return 'mjd'
+    if isinstance(q, Angle):
+        return 'angle'
+    if isinstance(q, u.Quantity):
+        if isinstance(par.value, np.longdouble):
+            return 'longdouble'
+        return 'float'
+    return 'object'
+
+
+class ModelSnapshot(object):
+    """Plain-array state of a timing model.
+
+    Attributes
+    ----------
+    name : str
+        Name of the model class.
+    components : tuple
+        (module, class name) of every component, or of the model class itself
+        if it can be imported.
+    generated : bool
+        Whether the model class has to be generated from the components.
+    names : tuple
+        Parameter names, in the order of model.params.
+    kinds : tuple
+        Kind of every parameter value, one of 'float', 'longdouble', 'angle',
+        'mjd', 'str', 'bool', 'object' or 'none' (unset).
+    values : numpy.ndarray of longdouble
+        Numeric parameter values in the parameter units (MJD for epochs),
+        NaN for the non-numeric and unset parameters.
+    uncertainties : numpy.ndarray of float64
+        Uncertainties in the parameter units, NaN when not set.
+    frozen : numpy.ndarray of bool
+    layout : dict
+        For the prefix and mask parameters, name -> (type, prefix, index),
+        which is used to create the parameters the bare model does not have.
+    extras : dict
+        Everything that is not a plain number: string and boolean values,
+        exact (jd1, jd2, scale) epochs and the TOA selection of mask
+        parameters.
+    """
+    def __init__(self, model):
+        cls = type(model)
+        self.name = cls.__name__
+        if _is_importable(cls):
+            self.generated = False
+            self.components = (_class_path(cls),)
+        else:
+            self.generated = True
+            self.components = tuple(_class_path(c) for c in cls.__bases__)
+        self.names = tuple(model.params)
+        nparams = len(self.names)
+        self.values = np.empty(nparams, dtype=np.longdouble)
+        self.values.fill(np.nan)
+        self.uncertainties = np.empty(nparams)
+        self.uncertainties.fill(np.nan)
+        self.frozen = np.ones(nparams, dtype=bool)
+        self.layout = {}
+        self.extras = {}
+        kinds = []
+        for ii, pn in enumerate(self.names):
+            par = getattr(model, pn)
+            kind = _param_kind(par)
+            kinds.append(kind)
+            self.frozen[ii] = par.frozen
+            if getattr(par, 'is_mask', False):
+                self.layout[pn] = ('mask', par.origin_name, par.index)
+                self.extras[pn + ':key'] = (par.key, list(par.key_value))
+            elif par.is_prefix:
+                self.layout[pn] = ('prefix', par.prefix, par.index)
+
+            if kind in ('float', 'longdouble', 'angle', 'mjd'):
+                self.values[ii] = par.value
+            elif kind != 'none':
+                self.extras[pn] = par.quantity
+            if kind == 'mjd':
+                q = par.quantity
+                self.extras[pn] = (q.jd1, q.jd2, q.scale)
+
+            if par.uncertainty is not None and kind != 'object':
+                if kind == 'angle':
+                    self.uncertainties[ii] = par.uncertainty.to(par.units).value
+                else:
+                    self.uncertainties[ii] = par.uncertainty_value
+        self.kinds = tuple(kinds)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_model_class(self):
+        """Return the timing model class of the snapshot."""
+        key = (self.name, self.components)
+        if key not in _model_classes:
+            comps = tuple(_import_class(c) for c in self.components)
+            if self.generated:
+                _model_classes[key] = generate_timing_model(self.name, comps)
+            else:
+                _model_classes[key] = comps[0]
+        return _model_classes[key]
+
+    def _add_missing_param(self, model, name):
+        ptype, prefix, index = self.layout[name]
+        if ptype == 'mask':
+            examples = [p for p in model.get_params_of_type('maskParameter')
+                        if getattr(model, p).origin_name == prefix]
+        else:
+            examples = model.get_prefix_mapping(prefix).values()
+        if not examples:
+            raise ValueError("Can not create parameter %s, the model has no "
+                             "%s parameter to use as template." % (name, prefix))
+        model.add_param(getattr(model, list(examples)[0]).new_param(index))
+
+    def restore(self, values=None):
+        """Return a new timing model instance in the state of the snapshot.
+
+        Parameters
+        ----------
+        values : array_like, optional
+            Numeric parameter values that replace self.values, e.g. a sample
+            proposed by a sampler.
+        """
+        if values is None:
+            values = self.values
+        model = self.get_model_class()()
+        for pn in self.names:
+            if not hasattr(model, pn):
+                self._add_missing_param(model, pn)
+        # Keep the parameter (and so design matrix column) order
+        in_snapshot = set(self.names)
+        model.params = list(self.names) + [p for p in model.params
+                                           if p not in in_snapshot]
+
+        for ii, pn in enumerate(self.names):
+            par = getattr(model, pn)
+            kind = self.kinds[ii]
+            par.frozen = bool(self.frozen[ii])
+            if pn + ':key' in self.extras:
+                key, key_value = self.extras[pn + ':key']
+                par.key = key
+                par.key_value = list(key_value)
+
+            if kind == 'longdouble':
+                par.value = np.longdouble(values[ii])
+            elif kind in ('float', 'angle'):
+                par.value = float(values[ii])
+            elif kind == 'mjd':
+                if values[ii] != self.values[ii]:
+                    # A new epoch value was given
+                    par.value = np.longdouble(values[ii])
+                else:
+                    # Restore the exact two-part epoch
+                    jd1, jd2, scale = self.extras[pn]
+                    t = time.Time(jd1, jd2, format='jd', scale=scale)
+                    t.format = 'mjd'
+                    par.quantity = t
+            elif kind in ('str', 'bool', 'object'):
+                par.quantity = self.extras[pn]
+
+            unc = self.uncertainties[ii]
+            if not np.isnan(unc):
+                if kind == 'angle':
+                    par.uncertainty = Angle(unc, par.units)
+                else:
+                    par.uncertainty_value = unc
+        model.setup()
+        return model
+
+
+def restore_model(snapshot, values=None):
+    """Rebuild a timing model from a ModelSnapshot.
+
+    A module level function, so it can be handed to a process pool.
+    """
+    return snapshot.restore(values=values)
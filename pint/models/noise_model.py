@@ -0,0 +1,149 @@
+"""This module implements the white and red noise of the TOAs.
+"""
+# noise_model.py
+# Defines the NoiseModel timing model class
+import numpy
+import astropy.units as u
+try:
+    from astropy.erfa import DAYSEC as SECS_PER_DAY
+except ImportError:
+    from astropy._erfa import DAYSEC as SECS_PER_DAY
+import parameter as p
+from .timing_model import TimingModel
+
+SECS_PER_YEAR = 365.25 * SECS_PER_DAY
+
+
+def powerlaw(f, A, gamma):
+    """Return the power spectral density (s^3) of power-law red noise with
+    amplitude A (at a frequency of 1/yr) and spectral index gamma, at the
+    frequencies f (Hz).
+    """
+    fyr = 1.0 / SECS_PER_YEAR
+    return A**2 / (12.0 * numpy.pi**2) * fyr**(gamma - 3) * f**(-gamma)
+
+
+class NoiseModel(TimingModel):
+    """This class provides the noise of the TOAs: EFAC, EQUAD and ECORR white
+    noise for subsets of the TOAs and power-law red noise.
+
+    The noise does not change the model phase; the GLS fitter uses the TOA
+    errors scaled by EFAC and EQUAD, the ECORR epochs and the Fourier basis
+    of the red noise.
+    """
+    def __init__(self):
+        super(NoiseModel, self).__init__()
+        self.add_param(p.maskParameter(name='EFAC', units='',
+                       aliases=['T2EFAC'],
+                       description="Scale factor of the TOA errors"))
+        self.add_param(p.maskParameter(name='EQUAD', units='us',
+                       aliases=['T2EQUAD'],
+                       description="Error added in quadrature to the TOA "
+                                   "errors"))
+        self.add_param(p.maskParameter(name='ECORR', units='us',
+                       aliases=['TNECORR'],
+                       description="Error correlated between the TOAs of an "
+                                   "epoch"))
+        self.add_param(p.floatParameter(name='RNAMP', units='',
+                       description="Amplitude of the power-law red noise, in "
+                                   "tempo units"))
+        self.add_param(p.floatParameter(name='RNIDX', units='',
+                       description="Spectral index of the power-law red "
+                                   "noise"))
+        # The noise does not change the phase
+        self.nondiff_params.update(['EFAC', 'EQUAD', 'ECORR', 'RNAMP',
+                                    'RNIDX'])
+
+    def setup(self):
+        super(NoiseModel, self).setup()
+
+    def get_noise_masks(self, origin_name):
+        """Return the mask parameters named origin_name (e.g. 'EFAC') that
+        select TOAs.
+        """
+        result = []
+        for mask_par in self.get_params_of_type('maskParameter'):
+            par = getattr(self, mask_par)
+            if par.origin_name == origin_name and par.key is not None and \
+                    par.value is not None:
+                result.append(par)
+        return result
+
+    def scaled_sigma(self, toas):
+        """Return the TOA errors with EQUAD added in quadrature and scaled by
+        EFAC (the tempo2 convention), in us.
+        """
+        sigma = numpy.array(toas['error'], dtype=numpy.float64)
+        equad = numpy.zeros(len(toas))
+        for par in self.get_noise_masks('EQUAD'):
+            equad[par.select_toa_mask(toas)] = par.quantity.to(u.us).value
+        efac = numpy.ones(len(toas))
+        for par in self.get_noise_masks('EFAC'):
+            efac[par.select_toa_mask(toas)] = par.value
+        return efac * numpy.sqrt(sigma**2 + equad**2) * u.us
+
+    def ecorr_epochs(self, toas, dt=1.0):
+        """Return the ECORR epoch of every TOA and the ECORR variance of the
+        epochs.
+
+        An epoch is a group of at least 2 TOAs selected by one ECORR
+        parameter that are less than dt seconds apart, e.g. the sub-band TOAs
+        of one observation.  Single TOAs get no ECORR, it would only add to
+        their white noise.
+
+        Returns
+        -------
+        epochs : numpy.ndarray of int
+            The epoch number of every TOA, -1 for the TOAs without ECORR.
+        variances : numpy.ndarray
+            The ECORR variance of every epoch, in s^2.
+        """
+        epochs = numpy.zeros(len(toas), dtype=int) - 1
+        variances = []
+        t = numpy.array(toas['tdbld'], dtype=numpy.float64) * SECS_PER_DAY
+        for par in self.get_noise_masks('ECORR'):
+            rows = numpy.asarray(par.select_toa_mask(toas), dtype=int)
+            if len(rows) == 0:
+                continue
+            rows = rows[numpy.argsort(t[rows])]
+            new_epoch = numpy.concatenate(([True], numpy.diff(t[rows]) > dt))
+            labels = numpy.cumsum(new_epoch) - 1
+            # Renumber the epochs of 2 or more TOAs
+            keep = numpy.bincount(labels) > 1
+            rows = rows[keep[labels]]
+            if len(rows) == 0:
+                continue
+            labels = (numpy.cumsum(keep) - 1)[labels[keep[labels]]]
+            epochs[rows] = len(variances) + labels
+            variances += [par.quantity.to(u.s).value**2] * int(keep.sum())
+        return epochs, numpy.array(variances)
+
+    def red_noise_basis_weights(self, toas, nmodes=30):
+        """Return the Fourier basis of the red noise and the prior variances
+        of its coefficients.
+
+        The basis has sine and cosine columns for the frequencies
+        1/T ... nmodes/T, where T is the time span of the TOAs.
+
+        Returns
+        -------
+        F : numpy.ndarray, (ntoas, 2 * nmodes)
+            The basis, None without red noise.
+        phi : numpy.ndarray, (2 * nmodes,)
+            The variances of the coefficients in s^2.
+        """
+        if not self.RNAMP.value or self.RNIDX.value is None:
+            return None, None
+        # Convert from the tempo units
+        fac = SECS_PER_YEAR * 1e6 / (2.0 * numpy.pi * numpy.sqrt(3.0))
+        A = self.RNAMP.value / fac
+        gamma = -self.RNIDX.value
+        t = numpy.array(toas['tdbld'], dtype=numpy.float64) * SECS_PER_DAY
+        T = t.max() - t.min()
+        f = numpy.arange(1, nmodes + 1) / T
+        F = numpy.zeros((len(toas), 2 * nmodes))
+        arg = 2.0 * numpy.pi * numpy.outer(t - t.min(), f)
+        F[:,::2] = numpy.sin(arg)
+        F[:,1::2] = numpy.cos(arg)
+        phi = numpy.repeat(powerlaw(f, A, gamma) / T, 2)
+        return F, phi
@@ -2,7 +2,7 @@
 # Defines Parameter class for timing model parameters
 from ..utils import fortran_float, time_from_mjd_string, time_to_mjd_string,\
     time_to_longdouble, is_number, time_from_longdouble, str2longdouble, \
-    longdouble2string, data2longdouble
+    longdouble2string, data2longdouble, rebind_callable
 import numpy
 import astropy.units as u
 import astropy.time as time
@@ -17,6 +17,89 @@ import priors
 from ..toa_select import TOASelect
 
 
+class ParameterVector(object):
+    """Contiguous storage for the numeric values of timing model parameters.
+
+    All numeric parameter values of a model live in one long double array,
+    .values, in the parameter default units (MJD for epochs).  A `Parameter`
+    bound to the vector reads its .value from it, and rebuilds its .quantity
+    from it when the vector was changed directly.  Fitters and samplers can
+    therefore read and write parameter values as an array, without going
+    through the unit conversion of the parameter setters.
+
+    Attributes
+    ----------
+    values : numpy array of longdouble
+        The parameter values. Only the first len(self) elements are in use.
+    isset : numpy array of bool
+        False for the parameters whose value is None.
+    names : list
+        Parameter name of each slot.
+    slots : dict
+        Parameter name -> slot in the arrays.
+    """
+    def __init__(self, capacity=32):
+        self.values = numpy.zeros(capacity, dtype=numpy.longdouble)
+        self.isset = numpy.zeros(capacity, dtype=bool)
+        self.names = []
+        self.slots = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def _grow(self):
+        capacity = 2 * len(self.values)
+        values = numpy.zeros(capacity, dtype=numpy.longdouble)
+        isset = numpy.zeros(capacity, dtype=bool)
+        values[:len(self)] = self.values[:len(self)]
+        isset[:len(self)] = self.isset[:len(self)]
+        self.values = values
+        self.isset = isset
+
+    def bind(self, param):
+        """Store the value of param in the vector. Returns False if the
+        parameter is not numeric.
+        """
+        if param.store_dtype is None:
+            return False
+        if param.name in self.slots:
+            slot = self.slots[param.name]
+        else:
+            slot = len(self.names)
+            if slot == len(self.values):
+                self._grow()
+            self.names.append(param.name)
+            self.slots[param.name] = slot
+        param._store = self
+        param._slot = slot
+        param._sync_store()
+        return True
+
+    def copy(self):
+        """Return an independent copy of the vector (not bound to any
+        parameter).
+        """
+        new = ParameterVector.__new__(ParameterVector)
+        new.values = self.values.copy()
+        new.isset = self.isset.copy()
+        new.names = list(self.names)
+        new.slots = dict(self.slots)
+        return new
+
+    def get_slots(self, names):
+        """Return the slots of the named parameters as an index array."""
+        return numpy.array([self.slots[n] for n in names], dtype=int)
+
+    def get(self, slots):
+        """Return the values in slots (a copy)."""
+        return self.values[slots]
+
+    def set(self, slots, values):
+        """Set the values in slots. The bound parameters pick up the change."""
+        self.values[slots] = values
+        self.isset[slots] = True
+
+
 class Parameter(object):
     """A base PINT class describing a single timing model parameter.
     PINT Parameter class will have
@@ -73,6 +156,12 @@ class Parameter(object):
     quantity: Type depends on the parameter subclass, it can be anything
         An internal storage for parameter value and units
     """
+    # numpy type of .value for numeric parameters, None for the others
+    store_dtype = None
+    # The ParameterVector holding the value, set by ParameterVector.bind()
+    _store = None
+    _slot = None
+    _synced = None
 
     def __init__(self, name=None, value=None, units=None, description=None,
                  uncertainty=None, frozen=True, aliases=None, continuous=True,
@@ -163,6 +252,12 @@ class Parameter(object):
     def quantity(self):
         """Return the internal stored parameter value and units.
         """
+        if self._store is not None and self._store.isset[self._slot]:
+            val = self._store.values[self._slot]
+            if val != self._synced:
+                # The value vector was changed directly
+                self._quantity = self.set_quantity(self.store_dtype(val))
+                self._synced = val
         return self._quantity
 
     @quantity.setter
@@ -176,8 +271,22 @@ class Parameter(object):
                                  ' allowed.')
             else:
                 self._quantity = val
+                self._sync_store()
                 return
         self._quantity = self.set_quantity(val)
+        self._sync_store()
+
+    def _sync_store(self):
+        """Copy the value to the ParameterVector the parameter is bound to."""
+        if self._store is None:
+            return
+        if self._quantity is None:
+            self._store.isset[self._slot] = False
+            self._synced = None
+        else:
+            self._store.values[self._slot] = self.get_value(self._quantity)
+            self._store.isset[self._slot] = True
+            self._synced = self._store.values[self._slot]
 
     def prior_pdf(self,value=None, logpdf=False):
         """Return the prior probability, evaluated at the current value of
@@ -202,6 +311,10 @@ class Parameter(object):
         """Return the pure value of a parameter. This value will associate with
         parameter default value, which is .units attribute.
         """
+        if self._store is not None:
+            if not self._store.isset[self._slot]:
+                return None
+            return self.store_dtype(self._store.values[self._slot])
         if self._quantity is None:
             return None
         else:
@@ -221,6 +334,7 @@ class Parameter(object):
             else:
                 self.value = val
         self._quantity = self.set_quantity(val)
+        self._sync_store()
 
     @property
     def uncertainty(self):
@@ -276,6 +390,25 @@ class Parameter(object):
             out += " +/- " + str(self.uncertainty.to(self.units))
         return out
 
+    def clone(self):
+        """Return a shallow copy of the parameter.
+
+        The value, uncertainty and other immutable attributes are shared with
+        the original, lists and dicts are copied, and the stored methods and
+        templates are rebound to the copy.  The copy stays bound to the same
+        ParameterVector; TimingModel.clone() rebinds it.
+        """
+        new = object.__new__(type(self))
+        for k, v in self.__dict__.items():
+            if isinstance(v, list):
+                v = list(v)
+            elif isinstance(v, dict):
+                v = dict(v)
+            else:
+                v = rebind_callable(v, self, new)
+            new.__dict__[k] = v
+        return new
+
     def set(self, value):
         """Parses a string 'value' into the appropriate internal representation
         of the parameter.
@@ -388,6 +521,7 @@ class floatParameter(Parameter):
                  uncertainty=None, frozen=True, aliases=[], continuous=True,
                  long_double=False):
         self.is_long_double = long_double
+        self.store_dtype = numpy.longdouble if long_double else numpy.float64
         if self.is_long_double:
             set_quantity = self.set_quantity_longdouble
             print_quantity = lambda x: longdouble2string(x.to(self.units).value)
@@ -581,6 +715,7 @@ class MJDParameter(Parameter):
                  uncertainty=None, frozen=True, continuous=True, aliases=[],
                  time_scale='utc'):
         self.time_scale = time_scale
+        self.store_dtype = numpy.longdouble
         set_quantity = self.set_quantity_mjd
         print_quantity = time_to_mjd_string
         get_value = time_to_longdouble
@@ -670,6 +805,7 @@ class AngleParameter(Parameter):
             raise ValueError('Unidentified unit ' + units)
 
         self.unitsuffix = self.unit_identifier[units.lower()][1]
+        self.store_dtype = numpy.float64
         set_quantity = self.set_quantity_angle
         print_quantity = lambda x: x.to_string(sep=':', precision=8) \
                         if x.unit != u.rad else x.to_string(decimal = True,
@@ -877,6 +1013,13 @@ class prefixParameter(Parameter):
         set_uncertainty = self.set_uncertainty_prefix
         self.time_scale = time_scale
         self.long_double = long_double
+        if self.type_match == 'float':
+            self.store_dtype = numpy.longdouble if long_double \
+                               else numpy.float64
+        elif self.type_match == 'mjd':
+            self.store_dtype = numpy.longdouble
+        elif self.type_match == 'angle':
+            self.store_dtype = numpy.float64
         super(prefixParameter, self).__init__(name=name, value=value,
                                               units=units,
                                               description=description,
@@ -1015,6 +1158,7 @@ class maskParameter(Parameter):
         self.key = key
         self.key_value = key_value
         self.long_double = long_double
+        self.store_dtype = numpy.longdouble if long_double else numpy.float64
         set_quantity = self.set_quantity_mask
         get_value = self.get_value_mask
         print_quantity = self.print_quantity_mask
@@ -1022,13 +1166,18 @@ class maskParameter(Parameter):
         self.index = index
         name_param = name + str(index)
         self.origin_name = name
+        # Aliases get the index too, e.g. T2EFAC2 for EFAC2
+        self.origin_aliases = list(aliases)
+        index_aliases = [al + str(index) for al in aliases]
+        if index == 1:
+            index_aliases += aliases
         super(maskParameter, self).__init__(name=name_param, value=value,
                                               units=units,
                                               description=description,
                                               uncertainty=uncertainty,
                                               frozen=frozen,
                                               continuous=continuous,
-                                              aliases=aliases,
+                                              aliases=index_aliases,
                                               print_quantity=print_quantity,
                                               set_quantity=set_quantity,
                                               get_value=get_value,
@@ -1121,7 +1270,9 @@ class maskParameter(Parameter):
         """
         new_mask_param = maskParameter(name=self.origin_name, index=index,
                                        long_double=self.long_double,
-                                       units= self.units, aliases=[])
+                                       units= self.units,
+                                       description=self.description,
+                                       aliases=self.origin_aliases)
         return new_mask_param
 
     def select_toa_mask(self, toas):
@@ -1131,7 +1282,7 @@ class maskParameter(Parameter):
         toas : toas table
         Return
         ----------
-        A mask array. the select toas are masked as True.
+        The row numbers of the selected toas in the table.
         """
         self.toa_select = TOASelect(self.key, self.key_value)
         return self.toa_select.get_toa_key_mask(toas)
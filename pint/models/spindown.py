@@ -13,6 +13,7 @@ from .timing_model import TimingModel, MissingParameter
 from ..phase import *
 from ..utils import time_from_mjd_string, time_to_longdouble, str2longdouble, taylor_horner,\
                     time_from_longdouble
+import pint.jet as jet
 
 
 class Spindown(TimingModel):
@@ -41,7 +42,9 @@ class Spindown(TimingModel):
                        time_scale='tdb'))
 
 
+        self.nondiff_params.update(['TZRMJD', 'PEPOCH'])
         self.phase_funcs += [self.spindown_phase,]
+        self.jet_funcs['spindown_phase'] = self.spindown_phase_jet
 
     def setup(self):
         super(Spindown, self).setup()
@@ -82,7 +85,7 @@ class Spindown(TimingModel):
     def get_spin_terms(self):
         """Return a list of the spin term values in the model: [F0, F1, ..., FN]
         """
-        return [getattr(self, "F%d"%ii).value for ii in range(self.num_spin_terms)]
+        return [self.F0.value] + list(self.get_prefix_values('F')[1])
 
     def spindown_phase(self, toas, delay):
         """Spindown phase function.
@@ -117,6 +120,28 @@ class Spindown(TimingModel):
         phs_pepoch = taylor_horner(-dt_pepoch, fterms)
         return phs_tzrmjd - phs_pepoch
 
+    def spindown_phase_jet(self, toas, delay, jv):
+        """Jet version of spindown_phase, see pint.jet.
+
+        delay is a jet (or array) of the delays in seconds.
+        """
+        if self.TZRMJD.value is None:
+            self.TZRMJD.value = toas['tdb'][0] - jet.value(delay)[0]*u.s
+        if not hasattr(self, "TZRMJDld"):
+            self.TZRMJDld = time_to_longdouble(self.TZRMJD.value)
+
+        F_mapping = self.get_prefix_mapping('F')
+        fterms = [0.0, jv('F0')] + [jv(F_mapping[ii])
+                                    for ii in sorted(F_mapping.keys())]
+
+        tdbld = numpy.asarray(toas['tdbld'], dtype=numpy.longdouble)
+        dt_tzrmjd = (tdbld - self.TZRMJDld) * SECS_PER_DAY - delay
+        dt_pepoch = (jv('PEPOCH') - self.TZRMJDld) * SECS_PER_DAY
+
+        phs_tzrmjd = taylor_horner(dt_tzrmjd-dt_pepoch, fterms)
+        phs_pepoch = taylor_horner(-dt_pepoch, fterms)
+        return phs_tzrmjd - phs_pepoch
+
     def d_phase_d_F0(self, toas):
         """Calculate the derivative wrt F0"""
         # NOTE: Should we be using barycentric arrival times, instead of TDB?
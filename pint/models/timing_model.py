@@ -1,13 +1,20 @@
 # timing_model.py
 # Defines the basic timing model interface classes
 import functools
-from .parameter import strParameter
+from .parameter import strParameter, ParameterVector
 from ..phase import Phase
 from astropy import log
 import numpy as np
 import pint.toa as toa
 import pint.utils as utils
+import pint.parallel as parallel
+import pint.jet as jet
+import pint.design_matrix as design_matrix
 import astropy.units as u
+try:
+    from astropy.erfa import DAYSEC as SECS_PER_DAY
+except ImportError:
+    from astropy._erfa import DAYSEC as SECS_PER_DAY
 
 # parameters or lines in parfiles to ignore (for now?), or at
 # least not to complain about
@@ -135,7 +142,21 @@ class TimingModel(object):
         # L2 is the second level of delays. L2 delay need barycentric toas
 
         self.phase_funcs = [] # List of phase component functions
+        # Jet versions of delay, phase and DM functions, by function name
+        self.jet_funcs = {}
+        # Functions giving the nonzero rows of the design matrix columns of
+        # piecewise parameters, by parameter name, prefix or mask name
+        self.sparse_deriv_funcs = {}
+        # Parameters, prefixes or mask names without a design matrix column:
+        # reference epochs, window bounds and noise parameters
+        self.nondiff_params = set()
         self.cache = None
+        # Parameter name or alias -> names of the parameters it matches
+        self._param_index = {}
+        # Prefix -> {index: name} for the prefix parameters
+        self._prefix_index = {}
+        # Values of all numeric parameters
+        self.param_vector = ParameterVector()
         self.add_param(strParameter(name="PSR",
             description="Source name",
             aliases=["PSRJ", "PSRB"]))
@@ -152,11 +173,97 @@ class TimingModel(object):
         """
         setattr(self, param.name, param)
         self.params += [param.name,]
+        self._index_param(param)
+        if param.is_prefix:
+            self._prefix_index.setdefault(param.prefix, {})[param.index] = \
+                param.name
+        self.param_vector.bind(param)
 
         if binary_param is True:
             self.binary_params +=[param.name,]
 
 
+    def _index_param(self, param):
+        """Add the name and aliases of a parameter to the name index."""
+        for key in [param.name,] + list(param.aliases):
+            names = self._param_index.setdefault(key, [])
+            if param.name not in names:
+                names.append(param.name)
+
+    def match_param_name(self, name):
+        """Return the names of the parameters whose name or alias is name."""
+        return self._param_index.get(name, [])
+
+    def get_free_params(self):
+        """Return the names of the parameters that are not frozen."""
+        return [p for p in self.params if not getattr(self, p).frozen]
+
+    def get_param_vector(self, names=None):
+        """Return the values of the named numeric parameters as a long double
+        array, read from the parameter value vector. By default the free
+        parameters are returned.
+        """
+        if names is None:
+            names = self.get_free_params()
+        return self.param_vector.get(self.param_vector.get_slots(names))
+
+    def set_param_vector(self, values, names=None):
+        """Set the values of the named numeric parameters from an array, in
+        the parameter default units. By default the free parameters are set.
+
+        The values are written to the parameter value vector directly, the
+        parameter quantities are only rebuilt when they are accessed.
+        """
+        if names is None:
+            names = self.get_free_params()
+        self.param_vector.set(self.param_vector.get_slots(names), values)
+
+    def clone(self):
+        """Return a copy of the model that can be modified independently.
+
+        This is much cheaper than copy.deepcopy(): the parameter value vector
+        is copied, and every parameter object is copied shallowly (their
+        values, units and other immutable attributes are shared).  The lists
+        and dicts of the model (parameter names, delay and phase functions,
+        indices) are copied with their methods rebound to the copy.  Any other
+        attribute, e.g. arrays that only depend on the parameters, is shared
+        until it is reassigned.
+        """
+        new = object.__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new.cache = None
+        new.param_vector = self.param_vector.copy()
+        params = set(self.params)
+        for pn in self.params:
+            par = getattr(self, pn).clone()
+            if par._store is self.param_vector:
+                par._store = new.param_vector
+            setattr(new, pn, par)
+        for k, v in self.__dict__.items():
+            if k in params or k in ('cache', 'param_vector'):
+                continue
+            new.__dict__[k] = self._clone_attribute(v, new)
+        return new
+
+    def _clone_attribute(self, value, new):
+        if isinstance(value, list):
+            return [self._clone_attribute(x, new) for x in value]
+        if isinstance(value, dict):
+            return dict((k, self._clone_attribute(v, new))
+                        for k, v in value.items())
+        return utils.rebind_callable(value, self, new)
+
+    def snapshot(self):
+        """Return a compact, picklable ModelSnapshot of the model.
+
+        The snapshot holds the component class names and the parameter values
+        as arrays; snapshot.restore() rebuilds an equivalent model, e.g. in a
+        worker process, without reading a parfile.
+        """
+        # Imported here, model_snapshot depends on this module
+        from .model_snapshot import ModelSnapshot
+        return ModelSnapshot(self)
+
     def param_help(self):
         """Print help lines for all available parameters in model.
         """
@@ -178,7 +285,6 @@ class TimingModel(object):
                 result.append(par.name)
         return result
 
-    @Cache.use_cache
     def get_prefix_mapping(self,prefix):
         """Get the index mapping for the prefix parameters.
            Parameter
@@ -190,17 +296,45 @@ class TimingModel(object):
            A dictionary with prefix pararameter real index as key and parameter
            name as value.
         """
-        parnames = [x for x in self.params if x.startswith(prefix)]
-        mapping = dict()
-        for parname in parnames:
-            par = getattr(self, parname)
-            if par.is_prefix == True and par.prefix == prefix:
-                mapping[par.index] = parname
-        return mapping
+        return dict(self._prefix_index.get(prefix, {}))
+
+    def get_prefix_values(self, prefix):
+        """Get the values of a prefix parameter family as dense arrays.
+           Parameter
+           ----------
+           prefix : str
+               Name of prefix.
+           Return
+           ----------
+           indices : numpy array of int
+               Sorted prefix parameter indices.
+           values : numpy array
+               The parameter values (.value) in the order of indices. If
+               caching is enabled, the arrays are only built once per cached
+               computation, so they must not be modified.
+        """
+        cache = getattr(self, Cache.the_cache, None)
+        if isinstance(cache, Cache):
+            if not hasattr(cache, 'prefix_values'):
+                cache.prefix_values = {}
+            if prefix in cache.prefix_values:
+                return cache.prefix_values[prefix]
+        mapping = self._prefix_index.get(prefix, {})
+        indices = np.array(sorted(mapping.keys()), dtype=int)
+        values = np.array([getattr(self, mapping[ii]).value for ii in indices])
+        if isinstance(cache, Cache):
+            cache.prefix_values[prefix] = (indices, values)
+        return indices, values
 
     @Cache.use_cache
-    def phase(self, toas):
-        """Return the model-predicted pulse phase for the given TOAs."""
+    def phase(self, toas, workers=None):
+        """Return the model-predicted pulse phase for the given TOAs.
+
+        If workers is larger than one, contiguous chunks of the TOAs are
+        evaluated in that many worker processes (see pint.parallel).
+        """
+        if workers is not None and workers > 1 and len(toas) > 1:
+            return parallel.parallel_phase(self, toas, workers)
         # First compute the delays to "pulsar time"
         delay = self.delay(toas)
         phase = Phase(np.zeros(len(toas)), np.zeros(len(toas)))
@@ -223,6 +357,41 @@ class TimingModel(object):
 
         return delay
 
+    def delay_jet(self, toas, jv):
+        """Total delay for the TOAs, in seconds, as a jet of the parameters of
+        the JetVariables jv.
+
+        The delay functions without a jet version contribute their value
+        only.
+        """
+        delay = np.zeros(len(toas))
+        for dlevel in self.delay_funcs.keys():
+            for df in self.delay_funcs[dlevel]:
+                jf = self.jet_funcs.get(df.__name__)
+                if jf is not None:
+                    delay = delay + jf(toas, jv)
+                else:
+                    d = df(toas)
+                    if hasattr(d, 'unit'):
+                        d = d.to(u.s).value
+                    delay = delay + np.asarray(d)
+        return delay
+
+    def phase_jet(self, toas, jv):
+        """Model phase for the TOAs as a jet of the parameters of the
+        JetVariables jv, with the long double value of the phase.
+        """
+        delay = self.delay_jet(toas, jv)
+        phase = np.zeros(len(toas), dtype=np.longdouble)
+        for pf in self.phase_funcs:
+            jf = self.jet_funcs.get(pf.__name__)
+            if jf is not None:
+                phase = phase + jf(toas, delay, jv)
+            else:
+                ph = Phase(pf(toas, jet.value(delay)))
+                phase = phase + (ph.int + ph.frac)
+        return phase
+
     @Cache.use_cache
     def get_barycentric_toas(self,toas):
         toasObs = toas['tdbld']
@@ -232,24 +401,86 @@ class TimingModel(object):
         toasBary = toasObs*u.day - delay*u.second
         return toasBary
 
-    def d_phase_d_tpulsar(self, toas):
-        """Return the derivative of phase wrt time at the pulsar.
+    def d_phase_d_tpulsar(self, toas, sample_step=1.0):
+        """Return the derivative of phase wrt time at the pulsar, in Hz.
 
-        NOT implemented yet.
+        The phase functions are evaluated with the model delays shifted by
+        -/+ sample_step seconds and differenced, so any phase component
+        (spindown, glitches) is included.  The delays are computed once.
         """
-        pass
-
-    def d_phase_d_toa(self, toas, time_intval = 60 ,method = None,
-                      num_sample = 20, order = 11):
-        """Return the derivative of phase wrt TOA
-            time_intval: is in seconds
-            method: with finite difference and chebyshev interpolation
-
-
+        delay = self.delay(toas)
+        # Make sure the phase reference is set from the unshifted delays
+        for pf in self.phase_funcs:
+            pf(toas, delay)
+        ph_plus = Phase(np.zeros(len(toas)), np.zeros(len(toas)))
+        ph_minus = Phase(np.zeros(len(toas)), np.zeros(len(toas)))
+        for pf in self.phase_funcs:
+            # Emission time t - delay moves by -/+ sample_step
+            ph_plus += Phase(pf(toas, delay - sample_step))
+            ph_minus += Phase(pf(toas, delay + sample_step))
+        dph = ph_plus - ph_minus
+        return np.array((dph.int + dph.frac) / (2.0 * sample_step),
+                        dtype=np.float64)
+
+    def d_delay_d_toa(self, toas, sample_step=1.0):
+        """Return the derivative of the total delay wrt the (TDB) TOA.
+
+        The delays are evaluated for all TOAs at once with the times shifted
+        by -/+ sample_step seconds.  The observatory positions are moved
+        along the stored ssb_obs_vel, and the positions relative to the Sun
+        and the planets by the observatory motion only, i.e. the velocities
+        of the Sun and the planets wrt the SSB are neglected.  The columns of
+        toas are modified during the evaluation and restored afterwards.
         """
+        pos_cols = [c for c in toas.colnames
+                    if c.startswith('obs_') and c.endswith('_pos')]
+        has_posvel = 'ssb_obs_pos' in toas.colnames and \
+                     'ssb_obs_vel' in toas.colnames
+        shift_cols = ['tdbld']
+        if has_posvel:
+            shift_cols += ['ssb_obs_pos'] + pos_cols
+            vel = np.array(toas['ssb_obs_vel'])
+        saved = dict((c, np.array(toas[c])) for c in shift_cols)
+        cache = self.cache
+        delays = []
+        try:
+            for dt in (sample_step, -sample_step):
+                toas['tdbld'][:] = saved['tdbld'] + \
+                                   np.longdouble(dt) / SECS_PER_DAY
+                if has_posvel:
+                    toas['ssb_obs_pos'][:] = saved['ssb_obs_pos'] + vel * dt
+                    for c in pos_cols:
+                        toas[c][:] = saved[c] - vel * dt
+                # The cached delays belong to the unshifted TOAs
+                self.cache = None
+                delays.append(self.delay(toas))
+        finally:
+            for c in shift_cols:
+                toas[c][:] = saved[c]
+            self.cache = cache
+        return (delays[0] - delays[1]) / (2.0 * sample_step)
+
+    def d_phase_d_toa(self, toas, sample_step=1.0, time_intval=60,
+                      method=None, num_sample=20, order=11):
+        """Return the derivative of phase wrt TOA, i.e. the apparent
+        (topocentric) pulse frequency in Hz at every TOA.
+
+        By default this is computed for all TOAs in one pass as
+        d_phase_d_tpulsar * (1 - d_delay_d_toa), from the stored TDB times
+        and observatory positions and velocities of the table.  The rate of
+        TDB wrt the observatory clock (< 1e-8) is neglected.
+
+        method: 'FDM' (finite difference) or 'chebyshev' use the old,
+            slow scheme that builds num_sample new TOAs over time_intval
+            seconds around every TOA and differentiates their phases.
+        """
+        if method is None:
+            freq = self.d_phase_d_tpulsar(toas, sample_step)
+            return freq * (1.0 - self.d_delay_d_toa(toas, sample_step))
+
         d_phase_d_toa = np.zeros(len(toas))
 
-        if method is None or "FDM":
+        if method == "FDM":
         # Using finite difference to calculate the derivitve
             dt = np.longdouble(time_intval)/np.longdouble(num_sample)
             num_sample = int(num_sample)/2*2+1
@@ -276,7 +507,7 @@ class TimingModel(object):
                 dp = np.gradient(p-p.mean(),dx)
                 d_phase_d_toa[i] = dp[num_sample/2]
 
-        if method is "chebyshev":
+        if method == "chebyshev":
         # Using chebyshev interpolation to calculate the
 
             for i,singal_toa in enumerate(toas):
@@ -306,7 +537,6 @@ class TimingModel(object):
         return d_phase_d_toa
 
 
-    @Cache.use_cache
     def d_phase_d_param(self, toas, param):
         """ Return the derivative of phase with respect to the parameter.
 
@@ -323,18 +553,20 @@ class TimingModel(object):
 
         return result
 
-    @Cache.use_cache
-    def d_phase_d_param_num(self, toas, param):
-        """ Return the derivative of phase with respect to the parameter.
+    def d_phase_d_param_num(self, toas, param, method='central',
+                            workers=None):
+        """ Return the derivative of phase with respect to the parameter,
+        computed with finite differences (see pint.derivatives).
 
-        NOT implemented yet.
+        Like the analytic d_phase_d_* functions, this is the derivative of
+        minus the phase, so the design matrix column is the result / F0.
         """
-        result = 0.0
-
-        # TODO need to do correct chain rule stuff wrt delay derivs, etc
-        # Is it safe to assume that any param affecting delay only affects
-        # phase indirectly (and vice-versa)??
-        return result
+        # Imported here, derivatives depends on this module
+        from .. import derivatives
+        deriv = derivatives.d_phase_d_params(self, toas, [param],
+                                             method=method, workers=workers)
+        unit = derivatives.param_unit(getattr(self, param))
+        return -deriv[0] / unit
 
     def d_delay_d_param(self, toas, param):
         """
@@ -345,46 +577,224 @@ class TimingModel(object):
             result += f(toas)
         return result
 
+    def get_sparse_deriv_func(self, param):
+        """Return the function giving the nonzero rows of the design matrix
+        column of a piecewise parameter, or None for the other parameters.
+        See pint.design_matrix.
+        """
+        par = getattr(self, param)
+        keys = [param]
+        if par.is_prefix:
+            keys.append(par.prefix)
+        if getattr(par, 'is_mask', False):
+            keys.append(par.origin_name)
+        for key in keys:
+            if key in self.sparse_deriv_funcs:
+                return self.sparse_deriv_funcs[key]
+        return None
+
+    def is_differentiable(self, param):
+        """Whether the design matrix can have a column for param, see
+        nondiff_params.
+        """
+        par = getattr(self, param)
+        keys = [param]
+        if par.is_prefix:
+            keys.append(par.prefix)
+        if getattr(par, 'is_mask', False):
+            keys.append(par.origin_name)
+        return not any(key in self.nondiff_params for key in keys)
+
+    def designmatrix_params(self, incfrozen=False, params=None):
+        """Return the parameters of the design matrix columns, without the
+        offset: params if given, else the free parameters and, if incfrozen,
+        the frozen numeric parameters that have a derivative.
+
+        Raises ValueError for a free or requested parameter that has no
+        derivative (see nondiff_params), rather than giving it a column of
+        zeros.
+        """
+        if params is None:
+            params = [par for par in self.params
+                      if not getattr(self, par).frozen or
+                      (incfrozen and getattr(self, par).store_dtype is not None
+                       and self.is_differentiable(par))]
+        bad = [par for par in params if not self.is_differentiable(par)]
+        if bad:
+            raise ValueError("The design matrix has no column for %s" %
+                             ", ".join(bad))
+        return list(params)
+
     @Cache.use_cache
-    def designmatrix(self, toas, incfrozen=False, incoffset=True):
+    def designmatrix(self, toas, incfrozen=False, incoffset=True,
+                     workers=None, method=None, sparse=False, params=None):
         """
         Return the design matrix: the matrix with columns of d_phase_d_param/F0
         or d_toa_d_param
+
+        The columns are those of the free parameters (and the frozen ones
+        if incfrozen), or of the parameters params if given, see
+        designmatrix_params.
+
+        If workers is larger than one, the rows are computed for contiguous
+        chunks of the TOAs in that many worker processes.
+
+        With method='jet', the columns of all parameters handled by the jet
+        functions of the components come from one evaluation of the model
+        phase (see pint.jet); the other columns are computed as usual.
+
+        With sparse=True, the matrix is returned as a
+        pint.design_matrix.BlockDesignMatrix, which stores the columns of the
+        piecewise parameters (DMX, JUMP) in a sparse block.
         """
-        params = ['Offset',] if incoffset else []
-        params += [par for par in self.params if incfrozen or
-                not getattr(self, par).frozen]
+        if workers is not None and workers > 1 and len(toas) > 1:
+            M, params, units = parallel.parallel_designmatrix(self, toas,
+                    workers, incfrozen=incfrozen, incoffset=incoffset,
+                    method=method, params=params)
+            if sparse:
+                piecewise = [par for par in params if par != 'Offset' and
+                             self.get_sparse_deriv_func(par) is not None]
+                M = design_matrix.BlockDesignMatrix.from_dense(M, params,
+                        units, piecewise)
+            return M, params, units
+        params = (['Offset',] if incoffset else []) + \
+            self.designmatrix_params(incfrozen, params)
 
         F0 = self.F0.value / u.s        # 1/sec
         ntoas = len(toas)
         nparams = len(params)
         delay = self.delay(toas)
-        units = []
+        units = [None] * nparams
+
+        # The columns of the piecewise parameters are zero outside of a
+        # window or backend, only their nonzero rows are computed
+        piecewise = {}
+        for par in params:
+            if par == 'Offset':
+                continue
+            sparse_func = self.get_sparse_deriv_func(par)
+            if sparse_func is not None:
+                piecewise[par] = sparse_func(toas, par)
 
         # Apply all delays ?
         #tt = toas['tdbld']
         #for df in self.delay_funcs:
         #    tt -= df(toas)
 
-        M = np.zeros((ntoas, nparams))
-        for ii, param in enumerate(params):
+        jet_columns = {}
+        if method == 'jet':
+            jet_columns = self.designmatrix_jet_columns(toas,
+                    [par for par in params if par not in piecewise])
+        elif method is not None:
+            raise ValueError("Unknown design matrix method '%s'" % method)
+
+        # Parameters without analytic derivatives are differentiated
+        # numerically, all in one batch
+        num_params = [par for par in params if par != 'Offset' and
+                      par not in jet_columns and par not in piecewise and
+                      not hasattr(self, "d_phase_d_" + par) and
+                      not hasattr(self, "d_delay_d_" + par) and
+                      getattr(self, par).store_dtype is not None]
+        num_derivs = {}
+        if num_params:
+            from .. import derivatives
+            num_derivs = dict(zip(num_params,
+                    derivatives.d_phase_d_params(self, toas, num_params)))
+
+        dense_index = [ii for ii, par in enumerate(params)
+                       if not (sparse and par in piecewise)]
+        M = np.zeros((ntoas, len(dense_index)))
+        for jj, ii in enumerate(dense_index):
+            param = params[ii]
             dpdp = "d_phase_d_" + param
             dddp = "d_delay_d_" + param
             if param == 'Offset':
-                M[:,ii] = 1.0
-                units.append(u.s/u.s)
+                M[:,jj] = 1.0
+                units[ii] = u.s/u.s
+            elif param in piecewise:
+                rows, q = piecewise[param]
+                M[rows,jj] = q.value
+                units[ii] = q.unit
+            elif param in jet_columns:
+                M[:,jj], units[ii] = jet_columns[param]
             elif hasattr(self, dpdp):
                 q = getattr(self, dpdp)(toas) / F0
                 #q = self.d_phase_d_param(toas, param) / F0
-                M[:,ii] = q
-                units.append(q.unit)
+                M[:,jj] = q
+                units[ii] = q.unit
             elif hasattr(self, dddp):
                 q = getattr(self, dddp)(toas)
-                M[:,ii] = q
-                units.append(q.unit)
-
+                M[:,jj] = q
+                units[ii] = q.unit
+            elif param in num_derivs:
+                unit = derivatives.param_unit(getattr(self, param))
+                q = -num_derivs[param] / unit / F0
+                M[:,jj] = q
+                units[ii] = q.unit
+
+        if sparse:
+            sparse_index = [ii for ii, par in enumerate(params)
+                            if par in piecewise]
+            columns = []
+            for ii in sparse_index:
+                rows, q = piecewise[params[ii]]
+                columns.append((rows, q.value))
+                units[ii] = q.unit
+            M = design_matrix.BlockDesignMatrix(M,
+                    design_matrix.sparse_columns(ntoas, columns),
+                    params, units, dense_index, sparse_index)
         return M, params, units
 
+    def designmatrix_chunks(self, toas, chunk_size=10000, incfrozen=False,
+                            incoffset=True, method=None, sparse=False):
+        """Compute the design matrix in blocks of TOAs.
+
+        A generator that yields (rows, M, params, units) for consecutive
+        blocks of at most chunk_size TOAs, where rows are the row numbers of
+        the block in toas and M, params, units are as returned by
+        designmatrix() for the block.  Only one block of the matrix is in
+        memory at a time, so e.g. the normal equations of a fit can be
+        accumulated for data sets whose full design matrix does not fit.
+        """
+        # Use the phase reference of the full table for every block
+        model = parallel._prepare_model(self, toas)
+        nchunks = int(np.ceil(float(len(toas)) / chunk_size))
+        for start, stop in parallel.chunk_bounds(len(toas), nchunks):
+            chunk, rows = parallel.toa_chunk(toas, start, stop)
+            # Do not reuse results cached for another block
+            cache = model.cache
+            model.cache = None
+            try:
+                M, params, units = model.designmatrix(chunk,
+                        incfrozen=incfrozen, incoffset=incoffset,
+                        method=method, sparse=sparse)
+            finally:
+                model.cache = cache
+            yield rows, M, params, units
+
+    def designmatrix_jet_columns(self, toas, params):
+        """Return the design matrix columns that the jet functions provide,
+        as a dict of parameter name -> (column, unit).
+
+        The phase is evaluated once as a jet of all numeric params; only the
+        parameters some jet function asked for get a column.  Dependencies
+        through the delay and phase functions without a jet version are not
+        included, just as in the analytic derivatives.
+        """
+        # Imported here, derivatives depends on this module
+        from .. import derivatives
+        numeric = [par for par in params if par != 'Offset' and
+                   getattr(self, par).store_dtype is not None]
+        jv = jet.JetVariables(self, numeric)
+        phase = self.phase_jet(toas, jv)
+        F0 = self.F0.value
+        columns = {}
+        for par in jv.used:
+            unit = u.s / derivatives.param_unit(getattr(self, par))
+            columns[par] = (-jet.derivatives(phase, jv.nvars)[jv.index[par]]
+                            / F0, unit)
+        return columns
+
     def __str__(self):
         result = ""
         for par in self.params:
@@ -404,8 +814,18 @@ class TimingModel(object):
 
     def read_parfile(self, filename):
         """Read values from the specified parfile into the model parameters."""
-        checked_param = []
+        checked_param = set()
         repeat_param = {}
+        # Aliases can be added to a parameter after add_param
+        for par in self.params:
+            self._index_param(getattr(self, par))
+        # The repeated lines of a mask parameter are numbered together,
+        # whatever alias they use (e.g. EFAC and T2EFAC)
+        mask_origin = {}
+        for pn in self.get_params_of_type('maskParameter'):
+            par = getattr(self, pn)
+            for al in [par.origin_name] + par.origin_aliases:
+                mask_origin[al.upper()] = par.origin_name
         pfile = open(filename, 'r')
         for l in [pl.strip() for pl in pfile.readlines()]:
             # Skip blank lines
@@ -417,6 +837,10 @@ class TimingModel(object):
 
             k = l.split()
             name = k[0].upper()
+            if name in mask_origin:
+                name = mask_origin[name]
+                k[0] = name
+                l = ' '.join(k)
 
             if name in checked_param:
                 if name in repeat_param.keys():
@@ -427,7 +851,7 @@ class TimingModel(object):
                 l = ' '.join(k)
 
             parsed = False
-            for par in self.params:
+            for par in self.match_param_name(k[0].upper()):
                 if getattr(self, par).from_parfile_line(l):
                     parsed = True
             if not parsed:
@@ -439,7 +863,7 @@ class TimingModel(object):
                     if l.split()[0] not in ignore_params:
                         log.warn("Unrecognized parfile line '%s'" % l)
 
-            checked_param.append(name)
+            checked_param.add(name)
         # The "setup" functions contain tests for required parameters or
         # combinations of parameters, etc, that can only be done
         # after the entire parfile is read
@@ -5,6 +5,9 @@ from astropy.coordinates import EarthLocation
 from astropy import log
 from .config import datapath
 
+# Clock corrections already read, obsname -> (mjds, corrections)
+_clock_corr_cache = {}
+
 class observatory(object):
     pass
 
@@ -90,6 +93,8 @@ def get_clock_corr_vals(obsname, **kwargs):
     # Also, a routine should probably be provided to actually use the corrections, with
     # proper interpolation, instead of the current manual calculation that toa.py does
     """
+    if obsname in _clock_corr_cache:
+        return _clock_corr_cache[obsname]
     # The following works for simple linear interpolation
     # of normal TEMPO-style clock correction files
     # Find the 1-character tempo code, this is necessary for properly
@@ -102,7 +107,8 @@ def get_clock_corr_vals(obsname, **kwargs):
         return (numpy.array([0.0, 100000.0]), numpy.array([0.0, 0.0]))
     filenm = os.path.join(os.environ["TEMPO"], "clock/time.dat")
     mjds, ccorr = load_tempo1_clock_file(filenm,site=site)
-    return numpy.array(mjds), numpy.array(ccorr)
+    _clock_corr_cache[obsname] = numpy.array(mjds), numpy.array(ccorr)
+    return _clock_corr_cache[obsname]
 
 def read_observatories():
     """Load observatory data files and return them.
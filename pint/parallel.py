@@ -0,0 +1,188 @@
+# parallel.py
+# Process-parallel evaluation of timing model quantities over TOA chunks
+"""Evaluate a timing model over contiguous TOA chunks in worker processes.
+
+The TOA table and the model are handed to the workers through module level
+state that is inherited when the pool forks, so neither of them is pickled.
+The numeric column buffers of the table are shared copy-on-write with the
+parent process and are never written to by the workers.  Results are written
+directly by the workers into shared memory buffers (long double for phases,
+float64 for the design matrix), so only the chunk bounds travel through the
+pool.  The long double precision of the phases is preserved end-to-end.
+
+On platforms that can not fork, the evaluation falls back to a serial call.
+"""
+import ctypes
+import multiprocessing
+import numpy as np
+from astropy import log
+from .phase import Phase
+
+# State inherited by the forked worker processes.  It is only populated for
+# the duration of one parallel evaluation.
+_shared = {}
+
+
+def chunk_bounds(ntoas, nchunks):
+    """Return a list of (start, stop) bounds that split ntoas rows into
+    at most nchunks contiguous chunks of nearly equal size.
+    """
+    nchunks = max(1, min(int(nchunks), ntoas))
+    edges = np.linspace(0, ntoas, nchunks + 1).astype(int)
+    return [(lo, hi) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+
+
+def toa_chunk(toas, start, stop):
+    """Return the rows [start, stop) of a TOA table as a stand-alone table.
+
+    The chunk gets its own 'index' column (0 ... len-1), since several
+    components use it to index arrays of the chunk length, and it is
+    grouped by observatory again, which the delay functions expect.
+
+    Returns
+    -------
+    chunk : astropy.table.Table
+    rows : numpy.ndarray
+        The row number in the input table of every row of the chunk.
+    """
+    chunk = toas[start:stop]
+    chunk['_chunk_row'] = np.arange(start, stop)
+    if 'obs' in chunk.colnames:
+        chunk = chunk.group_by('obs')
+    rows = np.array(chunk['_chunk_row'])
+    chunk.remove_column('_chunk_row')
+    if 'index' in chunk.colnames:
+        chunk.remove_column('index')
+    chunk['index'] = np.arange(len(chunk))
+    return chunk, rows
+
+
+def shared_array(shape, dtype):
+    """Allocate a numpy array backed by process-shared memory."""
+    dtype = np.dtype(dtype)
+    nitems = int(np.prod(shape))
+    buf = multiprocessing.RawArray(ctypes.c_char, max(nitems, 1) * dtype.itemsize)
+    return np.frombuffer(buf, dtype=dtype, count=nitems).reshape(shape)
+
+
+def _fork_pool(workers, initializer=None):
+    """Return a pool of forked worker processes, or None if the platform
+    can not fork.  initializer is called in every worker when it starts.
+    """
+    try:
+        ctx = multiprocessing.get_context('fork')
+    except AttributeError:
+        # Python 2 always forks on POSIX systems
+        ctx = multiprocessing
+    except ValueError:
+        return None
+    return ctx.Pool(processes=workers, initializer=initializer)
+
+
+def _default_nchunks(ntoas, workers, chunk_size):
+    if chunk_size is None:
+        # A few chunks per worker keeps the pool balanced
+        return workers * 4
+    return int(np.ceil(float(ntoas) / chunk_size))
+
+
+def _prepare_model(model, toas):
+    """Return the model to evaluate in chunks of toas.
+
+    Any state the model would otherwise derive from the first TOA of
+    whatever table it is given is fixed, so that every chunk uses the same
+    reference.  This is done on a copy of the model; the model itself is
+    returned if there is nothing to fix.
+    """
+    if hasattr(model, 'TZRMJD') and model.TZRMJD.value is None:
+        first, _ = toa_chunk(toas, 0, 1)
+        model = model.clone()
+        model.cache = None
+        model.phase(first)
+    return model
+
+
+def _run(model, toas, target, workers, chunk_size, **state):
+    bounds = chunk_bounds(len(toas), _default_nchunks(len(toas), workers,
+                                                      chunk_size))
+    _shared.update(state)
+    _shared['model'] = model
+    _shared['toas'] = toas
+    try:
+        pool = _fork_pool(workers)
+        if pool is None:
+            log.warn("Can not fork worker processes, evaluating serially.")
+            return [target(b) for b in bounds]
+        try:
+            return pool.map(target, bounds)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _shared.clear()
+
+
+def _phase_chunk(bounds):
+    model = _shared['model']
+    # Do not reuse results cached for the full table
+    model.cache = None
+    chunk, rows = toa_chunk(_shared['toas'], bounds[0], bounds[1])
+    ph = model.phase(chunk)
+    _shared['int'][rows] = ph.int
+    _shared['frac'][rows] = ph.frac
+
+
+def _designmatrix_chunk(bounds):
+    model = _shared['model']
+    model.cache = None
+    chunk, rows = toa_chunk(_shared['toas'], bounds[0], bounds[1])
+    M, params, units = model.designmatrix(chunk,
+                                          incfrozen=_shared['incfrozen'],
+                                          incoffset=_shared['incoffset'],
+                                          method=_shared['method'],
+                                          params=_shared['params'])
+    _shared['M'][rows] = M
+    return units
+
+
+def parallel_phase(model, toas, workers, chunk_size=None):
+    """Return the model phase for a TOA table, computed by workers processes.
+
+    Parameters
+    ----------
+    model : TimingModel
+    toas : astropy.table.Table
+        The TOA table, e.g. TOAs.table
+    workers : int
+        Number of worker processes.
+    chunk_size : int, optional
+        Number of TOAs per chunk.  By default the TOAs are split in four
+        chunks per worker.
+
+    Returns
+    -------
+    Phase with long double int and frac arrays.
+    """
+    model = _prepare_model(model, toas)
+    ntoas = len(toas)
+    ph_int = shared_array((ntoas,), np.longdouble)
+    ph_frac = shared_array((ntoas,), np.longdouble)
+    _run(model, toas, _phase_chunk, workers, chunk_size,
+         int=ph_int, frac=ph_frac)
+    return Phase(np.array(ph_int), np.array(ph_frac))
+
+
+def parallel_designmatrix(model, toas, workers, incfrozen=False,
+                          incoffset=True, chunk_size=None, method=None,
+                          params=None):
+    """Return the design matrix (M, params, units), computed by workers
+    processes.  See TimingModel.designmatrix for the meaning of the arguments.
+    """
+    model = _prepare_model(model, toas)
+    params = model.designmatrix_params(incfrozen, params)
+    columns = (['Offset', ] if incoffset else []) + list(params)
+    M = shared_array((len(toas), len(columns)), np.float64)
+    units = _run(model, toas, _designmatrix_chunk, workers, chunk_size,
+                 M=M, incfrozen=incfrozen, incoffset=incoffset,
+                 method=method, params=list(params))
+    return np.array(M), columns, units[0]
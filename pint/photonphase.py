@@ -0,0 +1,288 @@
+# photonphase.py
+# Pulse phases and barycentric times of the events of large event files
+"""Tag the events of a FITS event file with pulse phases and barycentric
+times, with bounded memory.
+
+The events table is read in chunks of rows from the memory mapped file.  For
+every chunk the event times become a TOAs table (see TOAs.from_times), and
+the model gives the pulse phases and the barycentric (TDB) times.  The
+output file is a copy of the event file whose events table has the new
+columns (by default PULSE_PHASE and BARY_TIME, or existing columns of these
+names are overwritten); it is written chunk by chunk, by copying the raw
+rows of the input and appending the new values, so the events are never
+all in memory.  With workers > 1, the chunks are processed by forked worker
+processes (see pint.parallel) while the main process writes the finished
+chunks in order.  The observatory vectors of the events go through the
+cache of pint.toa.epoch_posvels, which keeps at most
+pint.toa.posvel_cache_size epochs, so its memory stays bounded over the
+chunks too.
+
+Barycentric times are written as TDB seconds since the MJDREF of the file,
+like the TIME column of barycentered files.  Raw (TIMEREF LOCAL) event times
+need the orbit of the spacecraft, see pint.spacecraft.
+"""
+import numpy as np
+import astropy.units as u
+from astropy import log
+from astropy.time import Time
+try:
+    from astropy.erfa import DAYSEC as SECS_PER_DAY
+except ImportError:
+    from astropy._erfa import DAYSEC as SECS_PER_DAY
+from . import toa
+from . import parallel
+from .spacecraft import SpacecraftOrbit, fits_time_reference, \
+    event_observatory
+
+# State inherited by the forked worker processes
+_shared = {}
+
+# FITS format and unit of the columns that can be computed
+column_formats = {'PULSE_PHASE': ('D', None),
+                  'BARY_TIME': ('D', 's')}
+
+
+def row_chunks(nrows, chunk_size):
+    """Return the (start, stop) bounds of chunks of chunk_size rows."""
+    return [(lo, min(lo + chunk_size, nrows))
+            for lo in range(0, nrows, chunk_size)]
+
+
+def _phase_chunk(bounds):
+    phaser = _shared['phaser']
+    # Do not reuse results cached in the parent process
+    phaser.model.cache = None
+    return phaser.process(bounds[0], bounds[1], _shared['columns'])
+
+
+class EventPhaser(object):
+    """Compute the pulse phases and barycentric times of the events of an
+    event file.
+
+    Parameters
+    ----------
+    eventfile : str
+        The FITS event file, e.g. a Fermi FT1 file.
+    model : TimingModel
+    ephem : str
+        The solar system ephemeris.
+    planets : bool
+        Whether to include the Shapiro delays of the planets.
+    orbit : pint.spacecraft.SpacecraftOrbit, optional
+        The orbit of the spacecraft, needed for raw (LOCAL) event times.
+    ext : int
+        The extension of the events table.
+    """
+    def __init__(self, eventfile, model, ephem="DE421", planets=False,
+                 orbit=None, ext=1):
+        import pyfits
+        self.eventfile = eventfile
+        self.ext = ext
+        self.ephem = ephem
+        self.planets = planets
+        self.orbit = orbit
+        hdulist = pyfits.open(eventfile, memmap=True)
+        try:
+            hdr = hdulist[ext].header
+            self.header = hdr.copy()
+            self.nrows = hdr['NAXIS2']
+            self.rowlen = hdr['NAXIS1']
+            if hdr.get('PCOUNT', 0):
+                raise ValueError("Event tables with variable length "
+                                 "columns are not supported")
+            self.data_offset = hdulist.fileinfo(ext)['datLoc']
+            # Byte offset and raw format of every column in a row
+            dtype = hdulist[ext].data.dtype
+            self.layout = dict((name.upper(), (dtype.fields[name][1],
+                                               dtype.fields[name][0]))
+                               for name in dtype.names)
+            self.MJDREFI, self.MJDREFF, self.TIMEZERO = \
+                fits_time_reference(hdr)
+            self.obs, self.scale = event_observatory(hdr['TIMESYS'],
+                                                     hdr['TIMEREF'])
+        finally:
+            hdulist.close()
+        if self.obs == 'Spacecraft' and orbit is None:
+            raise ValueError("Raw event times need the orbit of the "
+                             "spacecraft")
+        self.model = model.clone()
+        if self.obs == 'Barycenter':
+            # The times are barycentered already
+            self.model.delay_funcs['L1'] = [
+                df for df in self.model.delay_funcs['L1']
+                if df.__name__ not in ('solar_system_geometric_delay',
+                                       'solar_system_shapiro_delay')]
+        if hasattr(self.model, 'TZRMJD') and self.model.TZRMJD.value is None \
+                and self.nrows:
+            # Without TZRMJD the model takes the first time it is given as
+            # the phase reference; fix it at the first event here, like
+            # parallel._prepare_model, so every chunk and worker uses it
+            self.process(0, 1, columns=('PULSE_PHASE',))
+
+    def raw_rows(self):
+        """Return the rows of the events table as a memory mapped
+        (nrows, rowlen) array of bytes.
+        """
+        return np.memmap(self.eventfile, dtype=np.uint8, mode='r',
+                         offset=self.data_offset,
+                         shape=(self.nrows, self.rowlen))
+
+    def read_column(self, name, lo, hi, raw=None):
+        """Return the values of a column in the rows [lo, hi)."""
+        if raw is None:
+            raw = self.raw_rows()
+        offset, dtype = self.layout[name.upper()]
+        values = np.ascontiguousarray(raw[lo:hi, offset:offset+dtype.itemsize])
+        return values.view(dtype).ravel().astype(dtype.newbyteorder('='))
+
+    def times(self, lo, hi):
+        """Return the times of the events [lo, hi) as astropy Time."""
+        met = np.asarray(self.read_column('TIME', lo, hi), dtype=np.float64)
+        # Whole days since MJDREF and the remaining seconds
+        days = np.floor(met / SECS_PER_DAY)
+        mjd_int = float(self.MJDREFI) + days
+        mjd_frac = float(self.MJDREFF) + np.asarray(
+            (self.TIMEZERO + met - days * SECS_PER_DAY) / SECS_PER_DAY,
+            dtype=np.float64)
+        return Time(mjd_int, mjd_frac, format='mjd', scale=self.scale,
+                    precision=9)
+
+    def process(self, lo, hi, columns=('PULSE_PHASE', 'BARY_TIME')):
+        """Return a dict of column name -> values for the events [lo, hi)."""
+        ts = toa.TOAs.from_times(self.times(lo, hi), self.obs)
+        ts.compute_posvels(ephem=self.ephem, planets=self.planets,
+                           orbit=self.orbit)
+        result = {}
+        if 'PULSE_PHASE' in columns:
+            frac = np.asarray(self.model.phase(ts.table).frac,
+                              dtype=np.float64)
+            result['PULSE_PHASE'] = np.where(frac < 0.0, frac + 1.0, frac)
+        if 'BARY_TIME' in columns:
+            if self.obs == 'Barycenter':
+                bary = ts.table['tdbld']
+            else:
+                bary = self.model.get_barycentric_toas(ts.table).to(u.day)
+            bary = np.asarray(bary, dtype=np.longdouble)
+            result['BARY_TIME'] = np.asarray(
+                (bary - self.MJDREFI - self.MJDREFF) * SECS_PER_DAY -
+                self.TIMEZERO, dtype=np.float64)
+        return result
+
+    def _output_header(self, columns):
+        """Return the header of the output events table, and the byte
+        offset and format of every column in the output rows.
+        """
+        hdr = self.header.copy()
+        for key in ('CHECKSUM', 'DATASUM'):
+            if key in hdr:
+                del hdr[key]
+        layout = {}
+        rowlen = self.rowlen
+        nfields = hdr['TFIELDS']
+        for name in columns:
+            if name in self.layout:
+                layout[name] = self.layout[name]
+                continue
+            fmt, unit = column_formats[name]
+            nfields += 1
+            hdr.append(('TTYPE%d' % nfields, name))
+            hdr.append(('TFORM%d' % nfields, fmt))
+            if unit is not None:
+                hdr.append(('TUNIT%d' % nfields, unit))
+            layout[name] = (rowlen, np.dtype('>f8'))
+            rowlen += 8
+        hdr['TFIELDS'] = nfields
+        hdr['NAXIS1'] = rowlen
+        return hdr, layout, rowlen
+
+    def write(self, outfile, columns=('PULSE_PHASE', 'BARY_TIME'),
+              chunk_size=100000, workers=None, clobber=False):
+        """Write a copy of the event file with the columns computed for all
+        events to outfile, processing chunk_size events at a time.
+        """
+        import pyfits
+        columns = [name.upper() for name in columns]
+        for name in columns:
+            if name not in column_formats:
+                raise ValueError("Unknown column %s" % name)
+        hdr, layout, rowlen = self._output_header(columns)
+        chunks = row_chunks(self.nrows, chunk_size)
+
+        hdulist = pyfits.open(self.eventfile, memmap=True)
+        try:
+            # The HDUs before the events table
+            pyfits.HDUList([hdu for hdu in hdulist[:self.ext]]).writeto(
+                outfile, clobber=clobber)
+            raw = self.raw_rows()
+            with open(outfile, 'ab') as fout:
+                fout.write(hdr.tostring())
+                for (lo, hi), values in zip(chunks,
+                                            self._results(chunks, columns,
+                                                          workers)):
+                    out = np.zeros((hi - lo, rowlen), dtype=np.uint8)
+                    out[:,:self.rowlen] = raw[lo:hi]
+                    for name in columns:
+                        offset, dtype = layout[name]
+                        v = np.asarray(values[name]).astype(dtype)
+                        out[:,offset:offset+dtype.itemsize] = \
+                            v.view(np.uint8).reshape(hi - lo, dtype.itemsize)
+                    fout.write(out.data)
+                nbytes = self.nrows * rowlen
+                fout.write(b'\0' * (-nbytes % 2880))
+            del raw
+            # The HDUs after the events table
+            if len(hdulist) > self.ext + 1:
+                out = pyfits.open(outfile, mode='append')
+                try:
+                    for hdu in hdulist[self.ext+1:]:
+                        out.append(hdu)
+                finally:
+                    out.close()
+        finally:
+            hdulist.close()
+
+    def _results(self, chunks, columns, workers):
+        """Yield the computed columns of the chunks, in order."""
+        pool = None
+        if workers is not None and workers > 1 and len(chunks) > 1:
+            _shared['phaser'] = self
+            _shared['columns'] = columns
+            pool = parallel._fork_pool(workers)
+            if pool is None:
+                log.warn("Can not fork worker processes, processing the "
+                         "events serially.")
+        if pool is None:
+            for lo, hi in chunks:
+                yield self.process(lo, hi, columns)
+            return
+        try:
+            for values in pool.imap(_phase_chunk, chunks):
+                yield values
+        finally:
+            pool.close()
+            pool.join()
+            _shared.clear()
+
+
+def phase_events(eventfile, model, outfile, ft2name=None, orbfile=None,
+                 columns=('PULSE_PHASE', 'BARY_TIME'), chunk_size=100000,
+                 workers=None, ephem="DE421", planets=False, clobber=False):
+    """Write a copy of eventfile with the pulse phases and barycentric times
+    of the events to outfile (see EventPhaser).
+
+    Raw event times need the orbit of the spacecraft, from a Fermi FT2 file
+    (ft2name) or a NICER/RXTE-style orbit file (orbfile).
+    """
+    orbit = None
+    if ft2name is not None:
+        orbit = SpacecraftOrbit.from_FT2(ft2name)
+    elif orbfile is not None:
+        orbit = SpacecraftOrbit.from_orbit_file(orbfile)
+    phaser = EventPhaser(eventfile, model, ephem=ephem, planets=planets,
+                         orbit=orbit)
+    log.info("Processing %d events of %s in %d chunks" %
+             (phaser.nrows, eventfile,
+              len(row_chunks(phaser.nrows, chunk_size))))
+    phaser.write(outfile, columns=columns, chunk_size=chunk_size,
+                 workers=workers, clobber=clobber)
+    return phaser
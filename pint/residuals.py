@@ -1,35 +1,166 @@
 import astropy.units as u
 import numpy as np
+import weakref
+
+# TOAs -> (TOA table, errors in us), the errors are only read once per TOA set
+_errors_cache = weakref.WeakKeyDictionary()
+
+
+def get_errors_us(toas):
+    """Return the TOA errors in us as a float array, cached for the TOAs.
+
+    toas is a TOAs object or a TOA table.  The cache is keyed by the TOAs
+    object and checked against its table, so a new table (e.g. after adding
+    TOAs) reads the errors again.  Errors changed in place in the table are
+    not noticed.
+    """
+    table = getattr(toas, 'table', None)
+    try:
+        cached = _errors_cache.get(toas)
+    except TypeError:
+        # Not weakly referenceable
+        cached = None
+    if cached is not None and cached[0] is table:
+        return cached[1]
+    if hasattr(toas, 'get_errors'):
+        errors = toas.get_errors()
+    else:
+        errors = toas['error'].quantity
+    errors = np.array(errors.to(u.us).value, dtype=np.float64)
+    try:
+        _errors_cache[toas] = (table, errors)
+    except TypeError:
+        pass
+    return errors
+
 
 class resids(object):
-    """resids(toa=None, model=None)"""
+    """resids(toa=None, model=None)
+
+    The residuals, chi2 and dof are computed when they are first accessed,
+    but they describe the model as it was when the resids were made: the
+    numeric parameter values and the free parameters are recorded then,
+    and if the model has changed by the time the results are computed,
+    they are computed for the recorded values.  free_params, the names of
+    the free model parameters, can be given to avoid looking them up.  If
+    linearized, a pint.linearized.LinearizedModel of the model, is given,
+    the phases are taken from it.
+    """
 
-    def __init__(self, toas=None, model=None):
+    def __init__(self, toas=None, model=None, free_params=None,
+                 linearized=None):
         self.toas = toas
         self.model = model
-        if toas is not None and model is not None:
-            self.phase_resids = self.calc_phase_resids()
-            self.time_resids = self.calc_time_resids()
-            self.chi2 = self.calc_chi2()
-            self.dof = self.get_dof()
-            self.chi2_reduced = self.chi2 / self.dof
-        else:
-            self.phase_resids = None
-            self.time_resids = None
+        if free_params is None and model is not None:
+            free_params = model.get_free_params()
+        self.free_params = None if free_params is None else \
+            tuple(free_params)
+        self.linearized = linearized
+        self._phase_resids = None
+        self._time_resids = None
+        self._chi2 = None
+        self._dof = None
+        self._params = self._param_state()
+
+    def _param_state(self):
+        """Return a copy of the numeric parameter values of the model."""
+        vec = getattr(self.model, 'param_vector', None)
+        if vec is None:
+            return None
+        n = len(vec)
+        return vec.values[:n].copy(), vec.isset[:n].copy()
+
+    def _ready(self):
+        return self.toas is not None and self.model is not None
+
+    def _at_snapshot(self, func):
+        """Return func() evaluated with the parameter values of the model
+        recorded when the resids were made.
+        """
+        state = self._param_state()
+        if state is None or (np.array_equal(state[0], self._params[0]) and
+                             np.array_equal(state[1], self._params[1])):
+            return func()
+        vec = self.model.param_vector
+        n = len(self._params[0])
+        if len(vec) != n:
+            raise ValueError("The parameters of the model changed since "
+                             "the residuals were made")
+        vec.values[:n], vec.isset[:n] = self._params
+        try:
+            return func()
+        finally:
+            vec.values[:n], vec.isset[:n] = state
+
+    @property
+    def phase_resids(self):
+        if self._phase_resids is None and self._ready():
+            self._phase_resids = self._at_snapshot(self.calc_phase_resids)
+        return self._phase_resids
+
+    @phase_resids.setter
+    def phase_resids(self, val):
+        self._phase_resids = val
+
+    @property
+    def time_resids(self):
+        if self._time_resids is None and self._ready():
+            self._time_resids = self._at_snapshot(self.calc_time_resids)
+        return self._time_resids
+
+    @time_resids.setter
+    def time_resids(self, val):
+        self._time_resids = val
+
+    @property
+    def chi2(self):
+        if self._chi2 is None and self._ready():
+            self._chi2 = self.calc_chi2()
+        return self._chi2
+
+    @property
+    def dof(self):
+        if self._dof is None and self._ready():
+            self._dof = self.get_dof()
+        return self._dof
+
+    @property
+    def chi2_reduced(self):
+        if not self._ready():
+            return None
+        return self.chi2 / self.dof
 
     def calc_phase_resids(self):
         """Return timing model residuals in pulse phase."""
-        rs = self.model.phase(self.toas.table).frac
+        if self.linearized is not None:
+            rs = self.linearized.phase().frac
+        else:
+            rs = self.model.phase(self.toas.table).frac
         return rs - rs.mean()
 
-    def calc_time_resids(self):
-        """Return timing model residuals in time (seconds)."""
-        if self.phase_resids==None:
+    def calc_time_resids(self, calctype='modelF0'):
+        """Return timing model residuals in time (seconds).
+
+        calctype selects the frequency used to convert the phase residuals,
+        see get_PSR_freq.
+        """
+        if self.phase_resids is None:
             self.phase_resids = self.calc_phase_resids()
-        return (self.phase_resids / self.get_PSR_freq()).to(u.s)
+        return (self.phase_resids / self.get_PSR_freq(calctype)).to(u.s)
+
+    def get_PSR_freq(self, calctype='modelF0'):
+        """Return pulsar rotational frequency in Hz.
 
-    def get_PSR_freq(self):
-        """Return pulsar rotational frequency in Hz. model.F0 must be defined."""
+        calctype 'modelF0' returns the model F0, which must be defined.
+        calctype 'topocentric' returns the apparent pulse frequency at every
+        TOA, d_phase_d_toa of the model, which includes the spin-down and the
+        Doppler shifts of the observatory and binary motion.
+        """
+        if calctype == 'topocentric':
+            return self.model.d_phase_d_toa(self.toas.table) * u.Hz
+        if calctype != 'modelF0':
+            raise ValueError("Unknown calctype '%s', use 'modelF0' or "
+                             "'topocentric'" % calctype)
         if self.model.F0.units != 'Hz':
             ValueError('F0 units must be Hz')
         # All residuals require the model pulsar frequency to be defined
@@ -50,25 +181,23 @@ class resids(object):
     def calc_chi2(self):
         """Return the weighted chi-squared for the model and toas."""
         # Residual units are in seconds. Error units are in microseconds.
-        if (self.toas.get_errors()==0.0).any():
+        errors = get_errors_us(self.toas)
+        if (errors == 0.0).any():
             return np.inf
         else:
             # The self.time_resids is in the unit of "s", the error "us".
             # This is more correct way, but it is the slowest.
             #return (((self.time_resids / self.toas.get_errors()).decompose()**2.0).sum()).value
 
-            # This method is faster then the method above but not the most correct way
-            #return ((self.time_resids.to(u.s) / self.toas.get_errors().to(u.s)).value**2.0).sum()
-
             # This the fastest way, but highly depend on the assumption of time_resids and
             # error units.
-            return ((self.time_resids.value * 1e6 / self.toas.get_errors())**2.0).sum()
+            return ((self.time_resids.value * 1e6 / errors)**2.0).sum()
+
     def get_dof(self):
-        """Return number of degrees of freedom for the model."""
-        dof = self.toas.ntoas
-        for p in self.model.params:
-            dof -= bool(not getattr(self.model, p).frozen)
-        return dof
+        """Return number of degrees of freedom for the model, with the free
+        parameters of the time the resids were made.
+        """
+        return self.toas.ntoas - len(self.free_params)
 
     def get_reduced_chi2(self):
         """Return the weighted reduced chi-squared for the model and toas."""
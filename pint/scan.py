@@ -0,0 +1,259 @@
+# scan.py
+# chi^2 surfaces over grids of timing model parameters
+"""Scan chi^2 over a grid of parameter values.
+
+At every grid point the scanned parameters are fixed and the other free
+parameters (the nuisance parameters) are fitted again.  The nuisance fit
+reuses one factorization of the design matrix of the nuisance parameters,
+computed for the starting model (see pint.fitter.WhitenedQR), so each point
+costs a few model evaluations and no design matrix.  Where a step of the
+fit makes chi^2 worse, the design matrix is computed and factored again at
+that point.  Whether the fit of every point converged is kept with the
+chi^2.
+
+The grid is traversed in stripes along its last axis, alternately forth and
+back, and every nuisance fit starts from the result at the previous,
+neighbouring point.  With workers > 1, blocks of stripes are scanned by
+forked worker processes (see pint.parallel).  The chi^2, the nuisance
+parameters, the convergence and the mask of the finished points can be kept
+in .npy files, which are written as the points are done, so an interrupted
+scan is resumed by running it again with the same file name.  The grids are
+kept in a .npz file, and a scan is only resumed for the same grids.
+"""
+import os
+import numpy as np
+import astropy.units as u
+from astropy import log
+from .fitter import WhitenedQR
+from .residuals import resids, get_errors_us
+from . import derivatives
+from . import parallel
+
+# State inherited by the forked worker processes
+_shared = {}
+
+
+def serpentine_stripes(shape):
+    """Return the indices of a grid of the given shape as a list of stripes
+    along the last axis, traversed alternately forth and back.
+    """
+    stripes = []
+    for k, lead in enumerate(np.ndindex(*shape[:-1])):
+        js = range(shape[-1])
+        if k % 2:
+            js = reversed(js)
+        stripes.append([tuple(lead) + (j,) for j in js])
+    return stripes
+
+
+def _open_array(filename, shape, dtype, fill):
+    """Open an .npy file as a memory map, creating it if needed."""
+    if filename is None:
+        a = parallel.shared_array(shape, dtype)
+        a[...] = fill
+        return a
+    if os.path.exists(filename):
+        a = np.load(filename, mmap_mode='r+')
+        if a.shape != shape:
+            raise ValueError("%s has shape %s, expected %s" %
+                             (filename, a.shape, shape))
+        return a
+    a = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype,
+                                  shape=shape)
+    a[...] = fill
+    return a
+
+
+def _check_grid(filename, params, grids, nuisance_params):
+    """Write the scanned and nuisance parameters and the grids of a scan to
+    an .npz file, or check them against the file of the scan resumed.
+    """
+    names = {'params': params, 'nuisance_params': nuisance_params}
+    if not os.path.exists(filename):
+        arrays = dict(('grid%d' % k, g) for k, g in enumerate(grids))
+        arrays.update((key, np.array(value, dtype=str))
+                      for key, value in names.items())
+        with open(filename, 'wb') as f:
+            np.savez(f, **arrays)
+        return
+    with np.load(filename) as stored:
+        same = all([str(v) for v in stored[key]] == list(value)
+                   for key, value in names.items())
+        same = same and len(stored.files) == len(grids) + len(names) and \
+            all(np.array_equal(stored['grid%d' % k], g)
+                for k, g in enumerate(grids))
+    if not same:
+        raise ValueError("%s is a scan of other parameters or grids" %
+                         filename)
+
+
+def _scan_stripes(bounds):
+    scan = _shared['scan']
+    # Do not reuse results cached for the starting model
+    scan.model.cache = None
+    scan.scan_stripes(_shared['stripes'][bounds[0]:bounds[1]])
+
+
+class GridScan(object):
+    """chi^2 of a fitter's TOAs over a grid of values of some parameters.
+
+    Parameters
+    ----------
+    fitter : pint.fitter.fitter
+        The TOAs and the model, usually after a fit.  The free parameters
+        that are not scanned are fitted at every point.
+    params : list of str
+        The scanned parameters.
+    grids : list of array_like
+        The values of every scanned parameter, in the units of the
+        parameter values (see pint.derivatives.param_unit).
+    filename : str, optional
+        .npy file of the chi^2.  The nuisance parameters, the convergence
+        and the mask of the finished points go to files with '_nuisance',
+        '_converged' and '_done' appended to the name, the grids to a file
+        with '_grid.npz'.  Existing files are resumed if their grids are
+        the same.
+    iterations : int
+        Maximum number of linearized nuisance fit iterations per point.
+    threshold : float
+        The nuisance fit has converged once a step changes chi^2 by less.
+    """
+    def __init__(self, fitter, params, grids, filename=None, iterations=2,
+                 threshold=1e-3):
+        self.model = fitter.model.clone()
+        self.toas = fitter.toas
+        self.params = list(params)
+        self.grids = [np.asarray(g) for g in grids]
+        self.shape = tuple(len(g) for g in self.grids)
+        self.iterations = iterations
+        self.threshold = threshold
+        self.nuisance_params = [p for p in self.model.get_free_params()
+                                if p not in self.params]
+        self.x_ref = self.model.get_param_vector(self.nuisance_params)
+        self.linearize()
+
+        nn = len(self.nuisance_params)
+        files = [None] * 4
+        if filename is not None:
+            base = os.path.splitext(filename)[0]
+            gridfile = base + '_grid.npz'
+            if os.path.exists(filename) and not os.path.exists(gridfile):
+                raise ValueError("Can not resume %s without its grids in %s"
+                                 % (filename, gridfile))
+            _check_grid(gridfile, self.params, self.grids,
+                        self.nuisance_params)
+            files = [filename, base + '_nuisance.npy',
+                     base + '_converged.npy', base + '_done.npy']
+        self.chi2 = _open_array(files[0], self.shape, np.float64, np.nan)
+        self.nuisance = _open_array(files[1], self.shape + (nn,),
+                                    np.float64, np.nan)
+        self.converged = _open_array(files[2], self.shape, bool, False)
+        self.done = _open_array(files[3], self.shape, bool, False)
+
+    def linearize(self):
+        """Factor the design matrix of the nuisance parameters for the
+        current model.
+        """
+        for par in self.params:
+            getattr(self.model, par).frozen = True
+        M, params, units = self.model.designmatrix(toas=self.toas.table,
+                incfrozen=False, incoffset=True)
+        self.sigma = get_errors_us(self.toas) * 1e-6
+        self.qr = WhitenedQR(M, self.sigma**2)
+        self.columns = [params.index(pn) for pn in self.nuisance_params]
+        # Conversion of the fit offsets to the units of the parameter values
+        self.factors = np.array([(1.0 / (units[ii] / u.s)).to(
+            derivatives.param_unit(getattr(self.model, params[ii]))).value
+            for ii in self.columns])
+
+    def fit_nuisance(self, x):
+        """Fit the nuisance parameters, starting from the values x, for the
+        current values of the scanned parameters.
+
+        A step that makes chi^2 worse is undone and the design matrix
+        factored again at the current point; a step of a new factorization
+        that makes chi^2 worse ends the fit.
+
+        Returns the chi^2, the fitted values and whether the fit converged.
+        """
+        names = self.nuisance_params
+        if not names:
+            return resids(self.toas, self.model, free_params=names).chi2, \
+                x, True
+        self.model.set_param_vector(x, names)
+        r = resids(self.toas, self.model, free_params=names)
+        chi2 = r.chi2
+        converged = False
+        fresh = False
+        for ii in range(self.iterations):
+            dpars = self.qr.solve(r.time_resids.to(u.s).value)[0]
+            x_new = x + dpars[self.columns] * self.factors
+            self.model.set_param_vector(x_new, names)
+            r_new = resids(self.toas, self.model, free_params=names)
+            if r_new.chi2 > chi2:
+                # Undo the step
+                self.model.set_param_vector(x, names)
+                converged = r_new.chi2 - chi2 < self.threshold
+                if converged or fresh:
+                    break
+                # The linearization of the starting model is off here
+                self.linearize()
+                fresh = True
+                continue
+            converged = chi2 - r_new.chi2 < self.threshold
+            x, chi2, r = x_new, r_new.chi2, r_new
+            fresh = False
+            if converged:
+                break
+        return chi2, x, converged
+
+    def scan_stripes(self, stripes):
+        """Compute the chi^2 of the grid points of stripes that are not
+        done yet.
+        """
+        x = self.x_ref.copy()
+        for stripe in stripes:
+            for idx in stripe:
+                if self.done[idx]:
+                    # Warm start from the stored result
+                    x = self.x_ref + self.nuisance[idx]
+                    continue
+                values = [g[i] for g, i in zip(self.grids, idx)]
+                self.model.set_param_vector(values, self.params)
+                chi2, x, converged = self.fit_nuisance(x)
+                self.chi2[idx] = chi2
+                self.nuisance[idx] = np.asarray(x - self.x_ref,
+                                                dtype=np.float64)
+                self.converged[idx] = converged
+                self.done[idx] = True
+                for a in (self.chi2, self.nuisance, self.converged,
+                          self.done):
+                    if hasattr(a, 'flush'):
+                        a.flush()
+
+    def run(self, workers=None):
+        """Scan the grid points that are not done yet.
+
+        Returns the chi^2 array of the grid shape.
+        """
+        stripes = serpentine_stripes(self.shape)
+        if workers is None or workers <= 1:
+            self.scan_stripes(stripes)
+            return self.chi2
+        bounds = parallel.chunk_bounds(len(stripes), workers)
+        _shared['scan'] = self
+        _shared['stripes'] = stripes
+        try:
+            pool = parallel._fork_pool(workers)
+            if pool is None:
+                log.warn("Can not fork worker processes, scanning serially.")
+                self.scan_stripes(stripes)
+                return self.chi2
+            try:
+                pool.map(_scan_stripes, bounds)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            _shared.clear()
+        return self.chi2
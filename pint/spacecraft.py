@@ -0,0 +1,247 @@
+# spacecraft.py
+# Positions and velocities of spacecraft from orbit files
+"""Spacecraft orbits for TOAs recorded on a spacecraft.
+
+Photon times recorded by Fermi, NICER or RXTE are times at the spacecraft,
+so the observatory vectors of these TOAs need the geocentric position of
+the spacecraft at every photon.  `SpacecraftOrbit` keeps the samples of an
+orbit file (a Fermi FT2 file, or a NICER/RXTE-style orbit file with the
+positions and velocities) and interpolates them to the TOAs as arrays,
+in chunks of TOAs for long event lists.
+
+The positions are interpolated with cubic Hermite polynomials through the
+positions and velocities of the samples.  For a low Earth orbit sampled
+every 30 s (FT2 files) the error of the positions is a few cm.  Files
+without velocities get the velocities of the samples from the derivative of
+the Lagrange polynomial through 5 neighbouring samples.
+"""
+import numpy as np
+from astropy import log
+try:
+    from astropy.erfa import DAYSEC as SECS_PER_DAY
+except ImportError:
+    from astropy._erfa import DAYSEC as SECS_PER_DAY
+
+
+def fits_time_reference(hdr):
+    """Return MJDREFI, MJDREFF (days) and TIMEZERO (s) of the header of a
+    FITS file of a high energy mission, as long doubles.
+    """
+    try:
+        TIMEZERO = np.longdouble(hdr['TIMEZERO'])
+    except KeyError:
+        try:
+            TIMEZERO = np.longdouble(hdr['TIMEZERI']) + \
+                np.longdouble(hdr['TIMEZERF'])
+        except KeyError:
+            TIMEZERO = np.longdouble(0.0)
+    try:
+        MJDREF = np.longdouble(hdr['MJDREF'])
+        MJDREFI = np.floor(MJDREF)
+        MJDREFF = MJDREF - MJDREFI
+    except KeyError:
+        # The MJDREFF key can be stored as a string with the "1.234D-5"
+        # syntax for floats, which is not supported by Python
+        MJDREFI = np.longdouble(hdr['MJDREFI'])
+        if isinstance(hdr['MJDREFF'], basestring):
+            MJDREFF = np.longdouble(hdr['MJDREFF'].replace('D', 'E'))
+        else:
+            MJDREFF = np.longdouble(hdr['MJDREFF'])
+    return MJDREFI, MJDREFF, TIMEZERO
+
+
+def event_observatory(timesys, timeref):
+    """Return the observatory and the time scale of the event times of a
+    FITS file with the TIMESYS and TIMEREF keywords.
+
+    TIMESYS is 'TT' for raw or geocentered events and 'TDB' for
+    barycentered ones, TIMEREF is 'LOCAL' for raw events.
+    """
+    if timesys == 'TDB':
+        return 'Barycenter', 'tdb'
+    elif timeref == 'LOCAL':
+        return 'Spacecraft', 'tt'
+    else:
+        return 'Geocenter', 'tt'
+
+
+def _lagrange_derivative(t, x, npoints=5):
+    """Return the derivative of x(t) at the samples, from the Lagrange
+    polynomial through npoints neighbouring samples.
+    """
+    n = len(t)
+    npoints = min(npoints, n)
+    # First sample of the window of every sample, and the position of the
+    # sample in its window
+    first = np.clip(np.arange(n) - npoints // 2, 0, n - npoints)
+    m = np.arange(n) - first
+    nodes = first[:,None] + np.arange(npoints)
+    tw = t[nodes]
+    tm = t[:,None]
+    deriv = np.zeros(x.shape)
+    for k in range(npoints):
+        # Weight of node k: L_k'(t_m)
+        dk = tw[:,k:k+1] - tw
+        dk[:,k] = 1.0
+        dm = tm - tw
+        dm[:,k] = 1.0
+        is_m = (m == k)
+        # For k != m: prod_{l != k, m} (t_m - t_l) / prod_{l != k} (t_k - t_l)
+        num = dm.copy()
+        num[np.arange(n), m] = 1.0
+        w = np.prod(num, axis=1) / np.prod(dk, axis=1)
+        # For k == m: sum_{l != m} 1 / (t_m - t_l)
+        inv = 1.0 / dk
+        inv[:,k] = 0.0
+        w = np.where(is_m, np.sum(inv, axis=1), w)
+        deriv += w[:,None] * x[nodes[:,k]]
+    return deriv
+
+
+class SpacecraftOrbit(object):
+    """The geocentric orbit of a spacecraft, sampled at TT times.
+
+    Parameters
+    ----------
+    mjds : array_like
+        The TT MJDs of the samples, preferably as long doubles.
+    pos : array_like, (nsamples, 3)
+        The GCRS (J2000) positions in km.
+    vel : array_like, (nsamples, 3), optional
+        The velocities in km/s.  By default they are computed from the
+        positions.
+    """
+    def __init__(self, mjds, pos, vel=None):
+        mjds = np.asarray(mjds, dtype=np.longdouble)
+        order = np.argsort(mjds, kind='mergesort')
+        # Drop repeated samples, e.g. where two files overlap
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = np.diff(mjds[order]) > 0
+        order = order[keep]
+        if len(order) < 2:
+            raise ValueError("A spacecraft orbit needs at least 2 samples")
+        self.mjdref = mjds[order[0]]
+        self.t = np.asarray((mjds[order] - self.mjdref) * SECS_PER_DAY,
+                            dtype=np.float64)
+        self.pos = np.asarray(pos, dtype=np.float64)[order]
+        if vel is None:
+            self.vel = _lagrange_derivative(self.t, self.pos)
+        else:
+            self.vel = np.asarray(vel, dtype=np.float64)[order]
+        # Sample spacings much longer than usual are gaps of the orbit file
+        self.max_step = 5.0 * np.median(np.diff(self.t))
+
+    @classmethod
+    def from_FT2(cls, ft2name, minmjd=None, maxmjd=None):
+        """Read the orbit of Fermi from an FT2 file.
+
+        Only the samples between the TT MJDs minmjd and maxmjd (and a few
+        samples around them) are kept.
+        """
+        import pyfits
+        hdulist = pyfits.open(ft2name, memmap=True)
+        try:
+            hdr = hdulist[1].header
+            dat = hdulist[1].data
+            MJDREFI, MJDREFF, TIMEZERO = fits_time_reference(hdr)
+            met = np.asarray(dat.field('START'), dtype=np.float64)
+            mjds = MJDREFI + MJDREFF + (TIMEZERO + met) / SECS_PER_DAY
+            rows = cls._rows_in_range(mjds, minmjd, maxmjd)
+            pos = np.asarray(dat.field('SC_POSITION')[rows],
+                             dtype=np.float64) / 1000.0
+            mjds = mjds[rows]
+        finally:
+            hdulist.close()
+        return cls(mjds, pos)
+
+    @classmethod
+    def from_orbit_file(cls, orbfile, minmjd=None, maxmjd=None):
+        """Read a NICER or RXTE-style orbit file, with TIME, X, Y, Z and
+        Vx, Vy, Vz columns (in m and m/s, unless the units are km).
+
+        Only the samples between the TT MJDs minmjd and maxmjd (and a few
+        samples around them) are kept.
+        """
+        import pyfits
+        hdulist = pyfits.open(orbfile, memmap=True)
+        try:
+            for hdu in hdulist[1:]:
+                names = [n.upper() for n in hdu.columns.names]
+                if 'TIME' in names and 'X' in names:
+                    break
+            else:
+                raise ValueError("No orbit table in %s" % orbfile)
+            MJDREFI, MJDREFF, TIMEZERO = fits_time_reference(hdu.header)
+            dat = hdu.data
+            met = np.asarray(dat.field('TIME'), dtype=np.float64)
+            mjds = MJDREFI + MJDREFF + (TIMEZERO + met) / SECS_PER_DAY
+            rows = cls._rows_in_range(mjds, minmjd, maxmjd)
+            units = dict((c.name.upper(), c.unit) for c in hdu.columns)
+            scale = 1.0 if (units['X'] or '').strip().lower() == 'km' \
+                else 1e-3
+            pos = np.column_stack([dat.field(c)[rows] for c in 'XYZ']) * scale
+            vel = None
+            if 'VX' in names:
+                vel = np.column_stack([dat.field(c)[rows] for c in
+                                       ('VX', 'VY', 'VZ')]) * scale
+            mjds = mjds[rows]
+        finally:
+            hdulist.close()
+        return cls(mjds, pos, vel)
+
+    @staticmethod
+    def _rows_in_range(mjds, minmjd, maxmjd, pad=3):
+        """Return the rows of the samples in [minmjd, maxmjd], padded with
+        pad samples on both sides.
+        """
+        order = np.argsort(mjds, kind='mergesort')
+        lo, hi = 0, len(mjds)
+        if minmjd is not None:
+            lo = max(np.searchsorted(mjds[order], minmjd) - pad, 0)
+        if maxmjd is not None:
+            hi = min(np.searchsorted(mjds[order], maxmjd, side='right') + pad,
+                     len(mjds))
+        return np.sort(order[lo:hi])
+
+    @property
+    def first_MJD(self):
+        return self.mjdref
+
+    @property
+    def last_MJD(self):
+        return self.mjdref + np.longdouble(self.t[-1]) / SECS_PER_DAY
+
+    def posvel(self, mjds, chunk=1000000):
+        """Return the positions (km) and velocities (km/s) of the spacecraft
+        at the TT MJDs mjds, interpolated in chunks of chunk times.
+        """
+        t = np.asarray((np.asarray(mjds, dtype=np.longdouble) - self.mjdref)
+                       * SECS_PER_DAY, dtype=np.float64)
+        if len(t) and (t.min() < self.t[0] or t.max() > self.t[-1]):
+            raise ValueError("TOAs outside of the spacecraft orbit (MJD %s "
+                             "to %s)" % (self.first_MJD, self.last_MJD))
+        pos = np.empty((len(t), 3))
+        vel = np.empty((len(t), 3))
+        ngap = 0
+        for lo in range(0, len(t), chunk):
+            tc = t[lo:lo+chunk]
+            ii = np.clip(np.searchsorted(self.t, tc, side='right') - 1, 0,
+                         len(self.t) - 2)
+            h = self.t[ii+1] - self.t[ii]
+            ngap += np.sum(h > self.max_step)
+            s = ((tc - self.t[ii]) / h)[:,None]
+            h = h[:,None]
+            p0, p1 = self.pos[ii], self.pos[ii+1]
+            v0, v1 = self.vel[ii] * h, self.vel[ii+1] * h
+            # Cubic Hermite basis functions and their derivatives
+            s2 = s * s
+            s3 = s2 * s
+            pos[lo:lo+chunk] = (2*s3 - 3*s2 + 1) * p0 + (s3 - 2*s2 + s) * v0 \
+                + (3*s2 - 2*s3) * p1 + (s3 - s2) * v1
+            vel[lo:lo+chunk] = ((6*s2 - 6*s) * (p0 - p1)
+                                + (3*s2 - 4*s + 1) * v0
+                                + (3*s2 - 2*s) * v1) / h
+        if ngap:
+            log.warn("%d TOAs are in gaps of the spacecraft orbit, their "
+                     "positions are less accurate" % ngap)
+        return pos, vel
@@ -8,6 +8,8 @@ import os, sys
 from .config import datapath
 
 kernels_loaded = False
+# The ephemeris kernel that was loaded last, and so takes precedence
+ephem_loaded = None
 def load_kernels(ephem="DE421"):
     """Ensure all kernels are loaded.
 
@@ -15,7 +17,7 @@ def load_kernels(ephem="DE421"):
     function can (should!) be called any time the user anticipates needing
     SPICE kernels.
     """
-    global kernels_loaded
+    global kernels_loaded, ephem_loaded
     if not kernels_loaded:
         spice.furnsh(datapath("pck00010.tpc"))
         log.info("SPICE loaded planetary constants.")
@@ -30,8 +32,36 @@ def load_kernels(ephem="DE421"):
         log.info("SPICE loaded Earth rotation parameters.")
         spice.furnsh(datapath("%s.bsp" % ephem.lower()))
         log.info("SPICE loaded DE%s Planetary Ephemeris." % ephem[2:])
+        ephem_loaded = ephem.lower()
         kernels_loaded = True
 
+def load_ephemeris(ephem="DE421"):
+    """Ensure the kernels are loaded and the ephemeris ephem is the one in
+    use.  The ephemeris file is only loaded again if another one was loaded
+    after it.
+    """
+    global ephem_loaded
+    load_kernels(ephem)
+    if ephem_loaded != ephem.lower():
+        ephem_file = datapath("%s.bsp" % ephem.lower())
+        log.info("Loading %s ephemeris." % ephem_file)
+        spice.furnsh(ephem_file)
+        ephem_loaded = ephem.lower()
+
+def reload_kernels():
+    """Unload all the SPICE kernels and load them again.
+
+    A forked process should call this before using SPICE, so it does not
+    read the kernel files through the file handles of its parent.
+    """
+    global kernels_loaded, ephem_loaded
+    ephem = ephem_loaded
+    spice.kclear()
+    kernels_loaded = False
+    ephem_loaded = None
+    if ephem is not None:
+        load_ephemeris(ephem)
+
 def objPosVel(obj1, obj2, et):
     """Returns PosVel instance from obj1 to obj2 at et (TDB sec past J2000)"""
     pv, _ = spice.spkezr(obj2, float(et), "J2000", "NONE", obj1)
@@ -1,4 +1,5 @@
 import re, sys, os, cPickle, numpy, gzip
+from collections import OrderedDict
 from . import utils
 from . import observatories as obsmod
 from . import erfautils
@@ -11,7 +12,7 @@ try:
     from astropy.erfa import DAYSEC as SECS_PER_DAY
 except ImportError:
     from astropy._erfa import DAYSEC as SECS_PER_DAY
-from spiceutils import objPosVel, load_kernels
+from spiceutils import objPosVel, load_ephemeris
 from pint import ls, J2000, J2000ld
 from .config import datapath
 from astropy import log
@@ -24,6 +25,8 @@ toa_commands = ("DITHER", "EFAC", "EMAX", "EMAP", "EMIN", "EQUAD", "FMAX",
 observatories = obsmod.read_observatories()
 iers_a_file = None
 iers_a = None
+# MJD of the download of the IERS A file
+iers_a_mjd = None
 
 
 def get_TOAs(timfile, ephem="DE421", planets=False, usepickle=True):
@@ -51,6 +54,170 @@ def get_TOAs(timfile, ephem="DE421", planets=False, usepickle=True):
         t.pickle()
     return t
 
+def get_iers_a(last_mjd=None):
+    """Return the IERS A table for the UT1 corrections.
+
+    The table is read once per process and only downloaded again if the
+    file is older than last_mjd, the MJD of the last TOA.
+    """
+    from astropy.utils.iers import IERS_A, IERS_A_URL
+    from astropy.utils.data import download_file, clear_download_cache
+    global iers_a_file, iers_a, iers_a_mjd
+    if iers_a is not None and (last_mjd is None or iers_a_mjd >= last_mjd):
+        return iers_a
+    iers_a_file = download_file(IERS_A_URL, cache=True)
+    # Check to see if the cached file is older than any of the TOAs
+    iers_file_time = time.Time(os.path.getctime(iers_a_file), format="unix")
+    if last_mjd is not None and iers_file_time.mjd < last_mjd:
+        clear_download_cache(iers_a_file)
+        try:
+            log.warn("Cached IERS A file is out-of-date.  Re-downloading.")
+            iers_a_file = download_file(IERS_A_URL, cache=True)
+        except:
+            pass
+        iers_file_time = time.Time(os.path.getctime(iers_a_file),
+                                   format="unix")
+    iers_a = IERS_A.open(iers_a_file)
+    iers_a_mjd = iers_file_time.mjd
+    return iers_a
+
+# Vectors of the observatories at the epochs already evaluated, least
+# recently used first, (obs, ephem, planets, epoch_bucket, bucket number) ->
+# (et, (nnames, 2, 3) array of the positions and velocities, see
+# _posvel_names)
+_posvel_cache = OrderedDict()
+# Largest number of buckets kept in _posvel_cache (about 0.5 kB each)
+posvel_cache_size = 100000
+
+def clear_posvel_cache():
+    """Forget the observatory vectors computed by epoch_posvels."""
+    _posvel_cache.clear()
+
+def _posvel_names(planets):
+    names = ['ssb_obs', 'obs_sun']
+    if planets:
+        names += ['obs_'+p+'_pos' for p in ('jupiter', 'saturn', 'venus',
+                                             'uranus')]
+    return names
+
+def _exact_posvels(obs, toas, ets, planets):
+    """Return the observatory vectors at the TOAs of an observatory group,
+    as a dict of name -> (position (km), velocity (km/s)) arrays, for the
+    names ssb_obs, obs_sun and, if planets, obs_<planet>_pos.
+    """
+    names = _posvel_names(planets)
+    vecs = dict((name, (numpy.zeros((len(ets), 3)),
+                        numpy.zeros((len(ets), 3)))) for name in names)
+    topo = obs not in ('Barycenter', 'Geocenter')
+    if topo:
+        earth_obss = erfautils.topo_posvels(obs, toas)
+
+    def store(name, jj, pv):
+        vecs[name][0][jj] = pv.pos.to(u.km).value
+        vecs[name][1][jj] = pv.vel.to(u.km/u.s).value
+
+    for jj, et in enumerate(ets):
+        if obs == 'Barycenter':
+            store('obs_sun', jj, objPosVel("SSB", "SUN", et))
+            continue
+        ssb_obs = objPosVel("SSB", "EARTH", et)
+        obs_sun = objPosVel("EARTH", "SUN", et)
+        if topo:
+            ssb_obs = ssb_obs + earth_obss[jj]
+            obs_sun = obs_sun - earth_obss[jj]
+        store('ssb_obs', jj, ssb_obs)
+        store('obs_sun', jj, obs_sun)
+        if planets:
+            for p in ('jupiter', 'saturn', 'venus', 'uranus'):
+                dest = p.upper()+" BARYCENTER"
+                pv = objPosVel("EARTH", dest, et)
+                if topo:
+                    pv = pv - earth_obss[jj]
+                store('obs_'+p+'_pos', jj, pv)
+    return vecs
+
+def epoch_posvels(obs, toas, ephem="DE421", planets=False, epoch_bucket=1.0):
+    """Return the observatory vectors at the TOAs of an observatory group,
+    as a dict of name -> (position (km), velocity (km/s)) arrays (see
+    _exact_posvels).
+
+    Subbanded TOAs, and the TOAs of pulsars observed in the same session,
+    are at nearly the same times.  The TOAs are put in buckets of
+    epoch_bucket seconds of TDB, and the ephemeris and the Earth rotation
+    are only evaluated at the first TOA of a bucket.  The vectors are
+    kept, for the TOAs of other datasets in the same bucket, until
+    clear_posvel_cache() is called.  The positions at the other TOAs of a
+    bucket are corrected to first order with the velocity, p + v dt, and
+    the velocities are used as they are.  At most posvel_cache_size
+    buckets are kept, the least recently used are dropped first.
+
+    The error of this is the acceleration term a dt^2 / 2, dominated by
+    the rotation of the Earth (a = 0.034 m/s^2 at the equator): for
+    |dt| < 1 s (the default bucket) at most 17 mm of position, or 0.06 ns
+    of light travel time, and 0.034 m/s of velocity.  The orbital
+    acceleration of the Earth (0.006 m/s^2) adds less.  epoch_bucket=None
+    evaluates every TOA exactly.
+    """
+    ets = numpy.asarray((toas['tdbld'] - J2000ld) * SECS_PER_DAY,
+                        dtype=numpy.float64)
+    if not epoch_bucket:
+        return _exact_posvels(obs, toas, ets, planets)
+    buckets = numpy.floor(ets / epoch_bucket).astype(numpy.int64)
+    ubuckets, first, inverse = numpy.unique(buckets, return_index=True,
+                                            return_inverse=True)
+    keys = [(obs, ephem.lower(), planets, epoch_bucket, b) for b in ubuckets]
+    names = _posvel_names(planets)
+    cached = [None] * len(keys)
+    missing = []
+    for jj, key in enumerate(keys):
+        if key in _posvel_cache:
+            # Most recently used now
+            cached[jj] = _posvel_cache.pop(key)
+            _posvel_cache[key] = cached[jj]
+        else:
+            missing.append(jj)
+    if missing:
+        rows = first[missing]
+        vecs = _exact_posvels(obs, toas[rows], ets[rows], planets)
+        # Copies, not views of the arrays of all the missing buckets
+        pv = numpy.array([[vecs[name][0], vecs[name][1]] for name in names])
+        for kk, jj in enumerate(missing):
+            cached[jj] = (ets[rows[kk]], pv[:,:,kk].copy())
+            _posvel_cache[keys[jj]] = cached[jj]
+        while len(_posvel_cache) > posvel_cache_size:
+            _posvel_cache.popitem(last=False)
+    dt = ets - numpy.array([c[0] for c in cached])[inverse]
+    pv = numpy.array([c[1] for c in cached])[inverse]
+    result = {}
+    for ii, name in enumerate(names):
+        pos, vel = pv[:,ii,0], pv[:,ii,1]
+        result[name] = (pos + vel * dt[:,None], vel)
+    return result
+
+def spacecraft_posvels(toas, orbit, ephem="DE421", planets=False,
+                       epoch_bucket=1.0):
+    """Return the observatory vectors at the TOAs of a Spacecraft group,
+    as epoch_posvels does for other observatories.
+
+    The vectors of the Geocenter (see epoch_posvels) are shifted by the
+    geocentric positions and velocities of the spacecraft at the TT times
+    of the TOAs, interpolated from orbit, a pint.spacecraft.SpacecraftOrbit.
+    """
+    vecs = epoch_posvels('Geocenter', toas, ephem, planets, epoch_bucket)
+    mjds = toas['mjd']
+    if isinstance(mjds, time.Time):
+        tts = utils.time_to_longdouble(mjds.tt)
+    else:
+        tts = numpy.array([utils.time_to_longdouble(t.tt) for t in mjds])
+    sc_pos, sc_vel = orbit.posvel(tts)
+    result = {}
+    for name, (pos, vel) in vecs.items():
+        if name == 'ssb_obs':
+            result[name] = (pos + sc_pos, vel + sc_vel)
+        else:
+            result[name] = (pos - sc_pos, vel - sc_vel)
+    return result
+
 def get_TOAs_list(toa_list,ephem="DE421", planets=False):
     """Load TOAs from a list of TOA objects.
 
@@ -406,6 +573,70 @@ class TOAs(object):
         # We don't need this now that we have a table
         del(self.toas)
 
+    @classmethod
+    def from_times(cls, mjds, obs, error=0.0, freq=float("inf"), columns=None,
+                   filename=None):
+        """Make TOAs from a vector of times at one special location
+        ('Barycenter', 'Geocenter' or 'Spacecraft'), e.g. photon events.
+
+        The table is built in one step from the arrays, without TOA objects:
+        the 'mjd' and 'tdb' columns are astropy Time vectors, and the TDBs
+        are computed here, so compute_TDBs is not needed.  The flags are
+        empty.  adjust_TOAs, apply_clock_corrections and compute_TDBs
+        replace the Time vector columns as a whole.
+
+        The TDBs are computed at the geocenter, also for 'Spacecraft'
+        TOAs: the topocentric term of TT - TDB at the position of the
+        spacecraft (up to about 2 ns in a low Earth orbit) is omitted.
+
+        Parameters
+        ----------
+        mjds : astropy.time.Time
+            The times, in the tdb scale for the Barycenter and usually tt
+            otherwise.
+        obs : str
+        error : float or array
+            TOA errors in us.
+        freq : float or array
+            Frequencies in MHz.
+        columns : dict, optional
+            Additional table columns, name -> array (e.g. energies and
+            weights of photons).
+        """
+        if obs not in ("Barycenter", "Geocenter", "Spacecraft"):
+            raise ValueError("TOAs.from_times does not support observatory "
+                             "%s" % obs)
+        n = len(mjds)
+        flags = numpy.empty(n, dtype=object)
+        for ii in range(n):
+            flags[ii] = {}
+        cols = [numpy.arange(n), mjds,
+                numpy.zeros(n) + error, numpy.zeros(n) + freq,
+                numpy.array([obs] * n), flags]
+        names = ["index", "mjd", "error", "freq", "obs", "flags"]
+        tdbs = mjds.tdb
+        cols += [tdbs, utils.time_to_longdouble(tdbs)]
+        names += ["tdb", "tdbld"]
+        if columns is not None:
+            for name in sorted(columns):
+                cols.append(columns[name])
+                names.append(name)
+        tab = table.Table(cols, names=names, meta={'filename': filename})
+        tab['error'].unit = u.us
+        tab['freq'].unit = u.MHz
+
+        self = cls.__new__(cls)
+        self.commands = []
+        self.observatories = set([obs])
+        self.filename = filename
+        self.planets = False
+        self.ntoas = n
+        mjd = numpy.asarray(mjds.mjd)
+        self.first_MJD = mjds[int(numpy.argmin(mjd))]
+        self.last_MJD = mjds[int(numpy.argmax(mjd))]
+        self.table = tab.group_by("obs")
+        return self
+
     def __add__(self, x):
         if type(x) in [int, float]:
             if not x:
@@ -446,6 +677,8 @@ class TOAs(object):
         else:
             if hasattr(self, "toas"):
                 return numpy.array([t.mjd.value for t in self.toas])
+            elif isinstance(self.table['mjd'], time.Time):
+                return numpy.asarray(self.table['mjd'].mjd)
             else:
                 return numpy.array([t.mjd for t in self.table['mjd']])
 
@@ -518,8 +751,12 @@ class TOAs(object):
             raise ValueError('Type of argument must be TimeDelta')
         if delta.shape != col.shape:
             raise ValueError('Shape of mjd column and delta must be compatible')
-        for ii in range(len(col)):
-            col[ii] += delta[ii]
+        if isinstance(col, time.Time):
+            # Time vector, see from_times; its elements are copies
+            self.table['mjd'] = col + delta
+        else:
+            for ii in range(len(col)):
+                col[ii] += delta[ii]
 
         # This adjustment invalidates the derived columns in the table, so delete
         # and recompute them
@@ -572,6 +809,9 @@ class TOAs(object):
         # An array of all the time corrections, one for each TOA
         corr = numpy.zeros(self.ntoas) * u.s
         times = self.table['mjd']
+        # The elements of a Time vector (see from_times) are copies, it is
+        # corrected at the end
+        vector = isinstance(times, time.Time)
         for ii, key in enumerate(self.table.groups.keys):
             grp = self.table.groups[ii]
             obs = self.table.groups.keys[ii]['obs']
@@ -584,7 +824,8 @@ class TOAs(object):
                     # be applied in the parser, not here. In the table the time
                     # correction should have units.
                     corr[jj] = flags[jj]['time'] * u.s
-                    times[jj] += time.TimeDelta(corr[jj])
+                    if not vector:
+                        times[jj] += time.TimeDelta(corr[jj])
             # These are observatory clock corrections.  Do in groups.
             if (key['obs'] in observatories and key['obs'] != "Geocenter"):
                 mjds, ccorr = obsmod.get_clock_corr_vals(key['obs'])
@@ -596,13 +837,16 @@ class TOAs(object):
                         +" file, treating clock corrections as constant"
                         +" past the ends.")
                 gcorr = numpy.interp(tvals, mjds, ccorr) * u.us
-                for jj, cc in enumerate(gcorr):
-                    grp['mjd'][jj] += time.TimeDelta(cc)
+                if not vector:
+                    for jj, cc in enumerate(gcorr):
+                        grp['mjd'][jj] += time.TimeDelta(cc)
                 corr[loind:hiind] += gcorr
             # Now update the flags with the clock correction used
             for jj in range(loind, hiind):
                 if corr[jj]:
                     flags[jj]['clkcorr'] = corr[jj]
+        if vector and numpy.any(corr != 0):
+            self.table['mjd'] = times + time.TimeDelta(corr)
 
     def compute_TDBs(self):
         """Compute and add TDB and TDB long double columns to the TOA table.
@@ -611,9 +855,6 @@ class TOAs(object):
         for TDB times, using the Observatory locations and IERS A Earth
         rotation corrections for UT1.
         """
-        from astropy.utils.iers import IERS_A, IERS_A_URL
-        from astropy.utils.data import download_file, clear_download_cache
-        global iers_a_file, iers_a
         # If previous columns exist, delete them
         if 'tdb' in self.table.colnames:
             log.info('tdb column already exists. Deleting...')
@@ -622,6 +863,15 @@ class TOAs(object):
             log.info('tdbld column already exists. Deleting...')
             self.table.remove_column('tdbld')
 
+        mjds = self.table['mjd']
+        if isinstance(mjds, time.Time):
+            # A Time vector at the special locations (see from_times), which
+            # need no clock corrections
+            mjds.precision = 9
+            tdbs = mjds.tdb
+            self.table['tdb'] = tdbs
+            self.table['tdbld'] = utils.time_to_longdouble(tdbs)
+            return
         # First make sure that we have already applied clock corrections
         ccs = False
         for tfs in self.table['flags']:
@@ -632,17 +882,7 @@ class TOAs(object):
         col_tdb = numpy.zeros_like(self.table['mjd'])
         col_tdbld = numpy.zeros(self.ntoas, dtype=numpy.longdouble)
         # Read the IERS for ut1_utc corrections, if needed
-        iers_a_file = download_file(IERS_A_URL, cache=True)
-        # Check to see if the cached file is older than any of the TOAs
-        iers_file_time = time.Time(os.path.getctime(iers_a_file), format="unix")
-        if (iers_file_time.mjd < self.last_MJD.mjd):
-            clear_download_cache(iers_a_file)
-            try:
-                log.warn("Cached IERS A file is out-of-date.  Re-downloading.")
-                iers_a_file = download_file(IERS_A_URL, cache=True)
-            except:
-                pass
-        iers_a = IERS_A.open(iers_a_file)
+        iers_a = get_iers_a(self.last_MJD.mjd)
         # Now step through in observatory groups to compute TDBs
         for ii, key in enumerate(self.table.groups.keys):
             grp = self.table.groups[ii]
@@ -682,7 +922,8 @@ class TOAs(object):
         col_tdbld = table.Column(name='tdbld', data=col_tdbld)
         self.table.add_columns([col_tdb, col_tdbld])
 
-    def compute_posvels(self, ephem="DE421", planets=False):
+    def compute_posvels(self, ephem="DE421", planets=False, epoch_bucket=1.0,
+                        orbit=None):
         """Compute positions and velocities of the observatories and Earth.
 
         Compute the positions and velocities of the observatory (wrt
@@ -690,6 +931,12 @@ class TOAs(object):
         SSB) for each TOA.  The JPL solar system ephemeris can be set
         using the 'ephem' parameter.  The positions and velocities are
         set with PosVel class instances which have astropy units.
+
+        The ephemeris and the Earth rotation are only evaluated once per
+        observatory and epoch_bucket seconds, see epoch_posvels.
+
+        The vectors of Spacecraft TOAs need the orbit of the spacecraft, a
+        pint.spacecraft.SpacecraftOrbit (see spacecraft_posvels).
         """
         # Record the planets choice for this instance
         self.planets = planets
@@ -706,10 +953,7 @@ class TOAs(object):
                 log.info('Column {0} already exists. Removing...'.format(name))
                 self.table.remove_column(name)
 
-        load_kernels(ephem)
-        ephem_file = datapath("%s.bsp"%ephem.lower())
-        log.info("Loading %s ephemeris." % ephem_file)
-        spice.furnsh(ephem_file)
+        load_ephemeris(ephem)
         self.table.meta['ephem'] = ephem
         ssb_obs_pos = table.Column(name='ssb_obs_pos',
                                     data=numpy.zeros((self.ntoas, 3), dtype=numpy.float64),
@@ -732,52 +976,28 @@ class TOAs(object):
             grp = self.table.groups[ii]
             obs = self.table.groups.keys[ii]['obs']
             loind, hiind = self.table.groups.indices[ii:ii+2]
-            if (key['obs'] == 'Barycenter'):
-                for jj, grprow in enumerate(grp):
-                    ind = jj+loind
-                    et = float((grprow['tdbld'] - J2000ld) * SECS_PER_DAY)
-                    obs_sun = objPosVel("SSB", "SUN", et)
-                    obs_sun_pos[ind,:] = obs_sun.pos
-            elif (key['obs'] == 'Spacecraft'):
-                # For a time recorded at a spacecraft, use the position of
-                # the spacecraft recorded in the TOA to compute the needed
-                # vectors.
-                pass
-            elif (key['obs'] == 'Geocenter'):
-                for jj, grprow in enumerate(grp):
-                    ind = jj+loind
-                    et = float((grprow['tdbld'] - J2000ld) * SECS_PER_DAY)
-                    ssb_earth = objPosVel("SSB", "EARTH", et)
-                    obs_sun = objPosVel("EARTH", "SUN", et)
-                    obs_sun_pos[ind,:] = obs_sun.pos
-                    ssb_obs = ssb_earth
-                    ssb_obs_pos[ind,:] = ssb_obs.pos
-                    ssb_obs_vel[ind,:] = ssb_obs.vel
-                    if planets:
-                        for p in ('jupiter', 'saturn', 'venus', 'uranus'):
-                            name = 'obs_'+p+'_pos'
-                            dest = p.upper()+" BARYCENTER"
-                            pv = objPosVel("EARTH", dest, et)
-                            plan_poss[name][ind,:] = pv.pos
-            elif (key['obs'] in observatories):
-                earth_obss = erfautils.topo_posvels(obs, grp)
-                for jj, grprow in enumerate(grp):
-                    ind = jj+loind
-                    et = float((grprow['tdbld'] - J2000ld) * SECS_PER_DAY)
-                    ssb_earth = objPosVel("SSB", "EARTH", et)
-                    obs_sun = objPosVel("EARTH", "SUN", et) - earth_obss[jj]
-                    obs_sun_pos[ind,:] = obs_sun.pos
-                    ssb_obs = ssb_earth + earth_obss[jj]
-                    ssb_obs_pos[ind,:] = ssb_obs.pos
-                    ssb_obs_vel[ind,:] = ssb_obs.vel
-                    if planets:
-                        for p in ('jupiter', 'saturn', 'venus', 'uranus'):
-                            name = 'obs_'+p+'_pos'
-                            dest = p.upper()+" BARYCENTER"
-                            pv = objPosVel("EARTH", dest, et) - earth_obss[jj]
-                            plan_poss[name][ind,:] = pv.pos
-            else:
+            if (key['obs'] == 'Spacecraft'):
+                # For a time recorded at a spacecraft, add the position of
+                # the spacecraft interpolated from its orbit
+                if orbit is None:
+                    log.error("Spacecraft TOAs need the orbit of the "
+                              "spacecraft to compute positions.")
+                    continue
+                vecs = spacecraft_posvels(grp, orbit, ephem, planets,
+                                          epoch_bucket)
+            elif not (key['obs'] in ('Barycenter', 'Geocenter') or
+                      key['obs'] in observatories):
                 log.error("Unknown observatory {0}".format(key['obs']))
+                continue
+            else:
+                vecs = epoch_posvels(obs, grp, ephem, planets, epoch_bucket)
+            ssb_obs_pos[loind:hiind] = vecs['ssb_obs'][0]
+            ssb_obs_vel[loind:hiind] = vecs['ssb_obs'][1]
+            obs_sun_pos[loind:hiind] = vecs['obs_sun'][0]
+            if planets and key['obs'] != 'Barycenter':
+                for p in ('jupiter', 'saturn', 'venus', 'uranus'):
+                    name = 'obs_'+p+'_pos'
+                    plan_poss[name][loind:hiind] = vecs[name][0]
         cols_to_add = [ssb_obs_pos, ssb_obs_vel, obs_sun_pos]
         if planets:
             cols_to_add += plan_poss.values()
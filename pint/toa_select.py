@@ -36,17 +36,18 @@ class TOASelect(object):
             raise ValueError("Key %s is not a flag or toas table key." % self.key)
 
     def get_toa_key_mask(self, toas):
-        """This is a function to return toas mask depend on key word and key value. 
+        """Return the row numbers of the selected TOAs in the table.
+
+        These are positions in toas, not the values of its 'index' column,
+        which differ once the table is grouped by observatory.
         """
         if self.key_section not in toas.keys():
             self.get_key_section(toas)
         if not self.range_select:
-            group = toas.group_by(self.key_section)
-            mask = group.groups.keys[self.key_section] == self.key_value[0]
-            return group.groups[mask]['index']
+            mask = np.asarray(toas[self.key_section]) == self.key_value[0]
         else:
             r1 = self.key_value[0]
             r2 = self.key_value[1]
             mask = np.logical_and(toas[self.key_section] >= r1,
                                  toas[self.key_section] <= r2)
-            return toas[mask]['index']
+        return np.nonzero(mask)[0]
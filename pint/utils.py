@@ -11,6 +11,7 @@ import astropy.units as u
 from astropy import log
 from spice_util import str2ldarr1
 import re
+import types
 
 # Define prefix parameter pattern
 pp1 = re.compile(r'([a-zA-Z0-9]+_*)(\d+)')  # For the prefix like DMXR1_3
@@ -398,6 +399,44 @@ def is_number(s):
         pass
     return False
 
+
+def _make_cell(value):
+    """Return a closure cell holding value."""
+    return (lambda: value).__closure__[0]
+
+
+def rebind_callable(func, old, new):
+    """Return func rebound from the object old to the object new.
+
+    Bound methods of old become bound methods of new, and functions (e.g.
+    lambdas) whose closure refers to old get a closure that refers to new.
+    Anything else is returned unchanged.  This is used to copy objects that
+    store their own methods or lambdas as attributes.
+    """
+    if getattr(func, '__self__', None) is old and hasattr(func, '__func__'):
+        return types.MethodType(func.__func__, new)
+    closure = getattr(func, '__closure__', None)
+    if isinstance(func, types.FunctionType) and closure:
+        cells = []
+        changed = False
+        for cell in closure:
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                # Empty cell
+                cells.append(cell)
+                continue
+            if contents is old:
+                cells.append(_make_cell(new))
+                changed = True
+            else:
+                cells.append(cell)
+        if changed:
+            return types.FunctionType(func.__code__, func.__globals__,
+                                      func.__name__, func.__defaults__,
+                                      tuple(cells))
+    return func
+
 if __name__ == "__main__":
     assert taylor_horner(2.0, [10]) == 10
     assert taylor_horner(2.0, [10, 3]) == 10 + 3*2.0
@@ -0,0 +1,41 @@
+"""Test timing a batch of pulsars."""
+from pint import batch
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.outdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(self):
+        shutil.rmtree(self.outdir)
+
+    def test_run_batch(self):
+        pairs = [(self.parf, self.timf),
+                 (self.parf, os.path.join(datadir, 'missing.tim'))]
+        reports = batch.run_batch(pairs, outdir=self.outdir, workers=2,
+                                  ephem='DE405')
+        assert reports[0]['error'] is None
+        assert reports[1]['error'] is not None
+        psr = reports[0]['psr']
+        assert os.path.exists(os.path.join(self.outdir, psr + '.par'))
+        res = np.loadtxt(os.path.join(self.outdir, psr + '.res'))
+        assert len(res) == reports[0]['ntoas']
+        assert reports[0]['chi2'] <= reports[0]['prefit_chi2']
+        report_file = os.path.join(self.outdir, 'report.txt')
+        with open(report_file, 'w') as fout:
+            batch.write_report(reports, fout, wall_time=10.0)
+        assert '1 failed' in open(report_file).read()
+
+if __name__ == '__main__':
+    pass
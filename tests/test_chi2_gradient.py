@@ -0,0 +1,47 @@
+"""Test the analytic chi^2 gradient used by the scipy based fitter."""
+from pint.models import model_builder as mb
+from pint.fitter import fitter, wls_fitter
+import pint.toa as toa
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestChi2Gradient(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        for par in self.model.get_free_params():
+            getattr(self.model, par).frozen = par not in ('F1', 'DM')
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_gradient(self):
+        f = fitter(self.toas, self.model)
+        names = ('F1', 'DM')
+        x0 = f.model.get_param_vector(names)
+        chi2, grad = f.chi2_gradient(names)
+        steps = np.array([1e-21, 1e-5])
+        for ii in range(2):
+            dx = np.zeros(2, dtype=np.longdouble)
+            dx[ii] = steps[ii]
+            up = f.minimize_func(x0 + dx, *names)
+            down = f.minimize_func(x0 - dx, *names)
+            num = float((up - down) / (2 * steps[ii]))
+            assert np.isclose(grad[ii], num, rtol=1e-3)
+
+    def test_bfgs(self):
+        f = wls_fitter(self.toas, self.model)
+        chi2_wls = f.call_minimize()
+        f = fitter(self.toas, self.model)
+        f.call_minimize(method='BFGS')
+        assert np.isclose(f.resids.chi2, chi2_wls, rtol=1e-4)
+        f = fitter(self.toas, self.model)
+        f.call_minimize(method='trust-ncg')
+        assert np.isclose(f.resids.chi2, chi2_wls, rtol=1e-4)
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,40 @@
+"""Test the vectorized topocentric pulse frequency."""
+from pint.models import model_builder as mb
+import pint.toa as toa
+from pint.parallel import toa_chunk
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestDphaseDtoa(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_doppler(self):
+        tdbld = np.array(self.toas.table['tdbld'])
+        pos = np.array(self.toas.table['ssb_obs_pos'])
+        f = self.model.d_phase_d_toa(self.toas.table)
+        assert f.shape == (self.toas.ntoas,)
+        # Earth and binary Doppler shifts are well below 1e-3
+        f0 = self.model.F0.value
+        assert np.all(np.abs(f / f0 - 1.0) < 1e-3)
+        assert np.std(f) > 0
+        # The table is left untouched
+        assert np.all(np.array(self.toas.table['tdbld']) == tdbld)
+        assert np.all(np.array(self.toas.table['ssb_obs_pos']) == pos)
+
+    def test_against_fdm(self):
+        sub, rows = toa_chunk(self.toas.table, 0, 3)
+        f = self.model.d_phase_d_toa(sub)
+        f_fdm = self.model.d_phase_d_toa(sub, method='FDM')
+        assert np.allclose(f, f_fdm, rtol=1e-8, atol=0)
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,57 @@
+"""Test the numerical derivatives against the analytic ones."""
+from pint.models import model_builder as mb
+import pint.toa as toa
+import pint.derivatives as derivatives
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestDerivatives(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_F1(self):
+        an = np.array(self.model.d_phase_d_F1(self.toas.table))
+        num = np.array(self.model.d_phase_d_param_num(self.toas.table, 'F1'))
+        # The phase reference epochs differ, which only changes the mean
+        an -= an.mean()
+        num -= num.mean()
+        assert np.allclose(num, an, rtol=0, atol=1e-6 * np.abs(an).max())
+
+    def test_richardson(self):
+        d = derivatives.d_phase_d_params(self.model, self.toas.table,
+                                         ['F1', 'DM'])
+        d_r = derivatives.d_phase_d_params(self.model, self.toas.table,
+                                           ['F1', 'DM'], method='richardson')
+        assert np.allclose(d, d_r, rtol=1e-6, atol=0)
+
+    def test_pools(self):
+        params = ['F0', 'F1', 'DM']
+        d = derivatives.d_phase_d_params(self.model, self.toas.table, params)
+        for pool in ('thread', 'process'):
+            d_pool = derivatives.d_phase_d_params(self.model, self.toas.table,
+                                                  params, workers=2, pool=pool)
+            assert np.all(d_pool == d)
+
+    def test_nondiff_params(self):
+        M, params, units = self.model.designmatrix(self.toas.table,
+                                                   incfrozen=True)
+        for pn in ('PEPOCH', 'POSEPOCH', 'TZRMJD', 'DMXR1_0001',
+                   'DMXR2_0001'):
+            assert pn not in params
+        assert 'DMX_0001' in params
+        # Every column is a derivative
+        assert np.all(np.any(M != 0, axis=0))
+        model = self.model.clone()
+        model.DMXR1_0001.frozen = False
+        self.assertRaises(ValueError, model.designmatrix, self.toas.table)
+
+if __name__ == '__main__':
+    pass
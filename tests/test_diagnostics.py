@@ -0,0 +1,69 @@
+"""Test the leave-one-out, jackknife and bootstrap fit diagnostics."""
+from pint.models import model_builder as mb
+from pint.fitter import wls_fitter
+from pint import diagnostics
+import pint.toa as toa
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestDiagnostics(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        model = mb.get_model(self.parf)
+        for par in model.get_free_params():
+            getattr(model, par).frozen = par not in ('F0', 'F1', 'DM')
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+        self.fitter = wls_fitter(self.toas, model)
+        self.fitter.call_minimize()
+        self.diag = diagnostics.FitDiagnostics.from_fitter(self.fitter)
+        self.M, params, units = self.fitter.model.designmatrix(
+            self.toas.table)
+        self.A = self.M / self.diag.sigma[:,None]
+        self.b = self.diag.r / self.diag.sigma
+
+    def refit(self, keep):
+        return np.linalg.lstsq(self.A[keep], self.b[keep])[0]
+
+    def test_groups(self):
+        table = self.toas.table
+        for groups in (diagnostics.group_by_flag(table, 'f'),
+                       diagnostics.group_by_obs(table),
+                       diagnostics.group_by_time(table, window=365.25)):
+            rows = np.sort(np.concatenate(list(groups.values())))
+            assert np.all(rows == np.arange(len(table)))
+
+    def test_group_shift(self):
+        groups = diagnostics.group_by_time(self.toas.table, window=365.25)
+        label = sorted(groups.keys())[1]
+        rows = groups[label]
+        keep = np.setdiff1d(np.arange(self.diag.ntoas), rows)
+        dpars, dSigma = self.diag.group_shift(rows)
+        expected = self.refit(keep) - self.refit(np.arange(self.diag.ntoas))
+        assert np.allclose(dpars, expected, rtol=1e-5,
+                           atol=1e-5 * np.abs(expected).max())
+
+    def test_loo_residuals(self):
+        ii = 10
+        keep = np.setdiff1d(np.arange(self.diag.ntoas), [ii])
+        beta = self.refit(keep)
+        expected = self.diag.r[ii] - np.dot(self.M[ii], beta)
+        assert np.isclose(self.diag.loo_residuals()[ii], expected,
+                          rtol=1e-5)
+        h = self.diag.hat_diagonal()
+        assert np.isclose(h.sum(), self.M.shape[1])
+
+    def test_bootstrap(self):
+        C = self.diag.bootstrap_covariance(nboot=500, seed=0)
+        ratio = np.diag(C) / np.diag(self.diag.Sigma)
+        chi2_reduced = np.sum(self.diag.e**2) / (self.diag.ntoas -
+                                                self.M.shape[1])
+        assert np.all(np.abs(ratio / chi2_reduced - 1) < 0.3)
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,54 @@
+"""Test the chunked H-test and Z^2_m statistics."""
+import unittest
+import numpy as np
+from pint import eventstats
+
+
+class TestEventStats(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        rng = np.random.RandomState(0)
+        self.phases = np.mod(rng.uniform(0, 1, 20000) +
+                             0.05 * rng.randn(20000) *
+                             (rng.uniform(0, 1, 20000) < 0.1), 1.0)
+        self.weights = rng.uniform(0, 1, 20000)
+        self.m = 20
+        p = self.phases * 2 * np.pi
+        k = np.arange(1, self.m + 1)
+        self.c = np.array([np.cos(kk * p) for kk in k])
+        self.s = np.array([np.sin(kk * p) for kk in k])
+
+    def test_trig_sums(self):
+        for weights in (None, self.weights):
+            w = 1.0 if weights is None else weights
+            ref = (self.c * w).sum(axis=1) + 1j * (self.s * w).sum(axis=1)
+            for chunk_size, workers in ((100000, None), (777, None),
+                                        (777, 3)):
+                sums = eventstats.trig_sums(self.phases, m=self.m,
+                                            weights=weights,
+                                            chunk_size=chunk_size,
+                                            workers=workers)
+                assert np.allclose(sums, ref, rtol=0, atol=1e-9)
+
+    def test_statistics(self):
+        n = len(self.phases)
+        z = 2. / n * np.cumsum(self.c.sum(axis=1)**2 + self.s.sum(axis=1)**2)
+        assert np.allclose(eventstats.z2m(self.phases, m=self.m), z,
+                           rtol=1e-12)
+        h = (z - 4 * np.arange(self.m)).max()
+        assert np.isclose(eventstats.hm(self.phases, m=self.m, workers=2), h,
+                          rtol=1e-12)
+        w = self.weights
+        zw = 2. / (w**2).sum() * np.cumsum((self.c * w).sum(axis=1)**2 +
+                                           (self.s * w).sum(axis=1)**2)
+        assert np.allclose(eventstats.z2mw(self.phases, w, m=self.m,
+                                           chunk_size=1000), zw, rtol=1e-12)
+        hw = (zw - 4 * np.arange(self.m)).max()
+        assert np.isclose(eventstats.hmw(self.phases, w, m=self.m), hw,
+                          rtol=1e-12)
+        aks, bks = eventstats.em_four(self.phases, m=self.m, weights=w)
+        assert np.allclose(aks, (self.c * w).sum(axis=1) / w.sum())
+        assert np.allclose(bks, (self.s * w).sum(axis=1) / w.sum())
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,73 @@
+"""Test the vectorized Fermi FT1 loader against the TOA list loader."""
+import os
+import unittest
+import numpy as np
+import astropy.time as time
+import astropy.units as u
+import pint.toa as toa
+from pint.fermi_toas import load_Fermi_TOAs, get_Fermi_TOAs
+
+from pinttestdata import testdir, datadir
+
+
+class TestFermiTOAs(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.eventfile = os.path.join(testdir, '..', 'examples',
+            'J0030+0451_P8_15.0deg_239557517_458611204_ft1weights_GEO_wt.gt.0.4.fits')
+        self.weightcol = 'PSRJ0030+0451'
+        tl = load_Fermi_TOAs(self.eventfile, weightcolumn=self.weightcol,
+                             minweight=0.5)
+        self.ts = toa.TOAs(toalist=tl)
+        self.ts.compute_TDBs()
+        self.ts.compute_posvels(ephem='DE405', planets=False)
+
+    def test_table(self):
+        ts = get_Fermi_TOAs(self.eventfile, weightcolumn=self.weightcol,
+                            minweight=0.5, ephem='DE405')
+        assert ts.ntoas == self.ts.ntoas
+        assert ts.observatories == set(['Geocenter'])
+        # The TOA list loader keeps the order of the events
+        weights = np.array([f['weight'] for f in self.ts.table['flags']])
+        assert np.all(ts.table['weight'] == weights)
+        assert np.all(ts.table['weight'] > 0.5)
+        energies = np.array([f['energy'].value for f in self.ts.table['flags']])
+        assert np.allclose(ts.table['energy'], energies)
+        dt = (ts.table['tdbld'] - self.ts.table['tdbld']) * 86400.0
+        assert np.all(np.abs(dt) < 1e-8)
+        dpos = ts.table['ssb_obs_pos'] - self.ts.table['ssb_obs_pos']
+        assert np.all(np.abs(dpos) < 1e-3)
+        assert np.allclose(ts.get_mjds(), self.ts.get_mjds(), rtol=0,
+                           atol=1e-9)
+
+    def test_mjd_cut_and_files(self):
+        mjds = self.ts.get_mjds()
+        cut = np.median(mjds)
+        ts = get_Fermi_TOAs(self.eventfile, weightcolumn=self.weightcol,
+                            minweight=0.5, maxmjd=cut, ephem='DE405')
+        assert ts.ntoas == np.sum(mjds <= cut)
+        # The same file twice, read by two worker processes
+        ts2 = get_Fermi_TOAs([self.eventfile, self.eventfile],
+                             weightcolumn=self.weightcol, minweight=0.5,
+                             maxmjd=cut, ephem='DE405', workers=2)
+        assert ts2.ntoas == 2 * ts.ntoas
+        n = ts.ntoas
+        assert np.all(ts2.table['tdbld'][:n] == ts.table['tdbld'])
+        assert np.all(ts2.table['tdbld'][n:] == ts.table['tdbld'])
+
+    def test_time_vector_columns(self):
+        mjds = time.Time(np.zeros(5) + 55000.0, np.linspace(0.1, 0.5, 5),
+                         format='mjd', scale='tt')
+        ts = toa.TOAs.from_times(mjds, 'Geocenter')
+        tdbld = np.array(ts.table['tdbld'])
+        ts.table['flags'][2]['time'] = 1.0
+        ts.apply_clock_corrections()
+        ts.compute_TDBs()
+        assert isinstance(ts.table['mjd'], time.Time)
+        assert ts.table['flags'][2]['clkcorr'] == 1.0 * u.s
+        dt = np.asarray(np.array(ts.table['tdbld']) - tdbld,
+                        dtype=np.float64) * 86400.0
+        assert np.allclose(dt, [0, 0, 1, 0, 0], rtol=0, atol=1e-6)
+
+if __name__ == '__main__':
+    pass
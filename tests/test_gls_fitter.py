@@ -0,0 +1,131 @@
+"""Test the noise model and the GLS fitter."""
+from pint.models import model_builder as mb
+from pint.fitter import NoiseCovariance, gls_fitter, wls_fitter
+from pint.residuals import resids
+import pint.toa as toa
+import astropy.units as u
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestGLSFitter(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+        self.outdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(self):
+        shutil.rmtree(self.outdir)
+
+    def noise_model(self):
+        """The model with white and red noise for the -fe backends."""
+        parfile = os.path.join(self.outdir, 'noise.par')
+        with open(parfile, 'w') as f:
+            f.write(open(self.parf).read())
+            f.write("EFAC -fe 430G 1.2\n"
+                    "T2EFAC -fe L_wide 1.1\n"
+                    "EQUAD -fe 430G 0.3\n"
+                    "T2EQUAD -fe L_wide 0.2\n"
+                    "ECORR -fe 430G 0.5\n"
+                    "ECORR -fe L_wide 0.4\n"
+                    "RNAMP 0.02\n"
+                    "RNIDX -3.5\n")
+        model = mb.get_model(parfile)
+        for par in model.get_free_params():
+            getattr(model, par).frozen = par not in ('F0', 'F1')
+        return model
+
+    def test_noise_params(self):
+        m = mb.get_model(os.path.join(datadir,
+                                      'B1855+09_NANOGrav_9yv1.gls.par'))
+        efac = sorted(getattr(m, 'EFAC%d' % ii).value for ii in range(1, 5))
+        assert np.allclose(efac, [1.117, 1.147, 1.150, 1.507])
+        assert m.EQUAD4.key == 'f'
+        assert m.ECORR2.key_value == ['L-wide_PUPPI']
+        assert np.isclose(m.ECORR2.value, 0.31843)
+        assert np.isclose(m.RNAMP.value, 0.017173)
+
+    def test_covariance(self):
+        rng = np.random.RandomState(0)
+        n = 200
+        Nvec = rng.uniform(0.5, 2.0, n)
+        epochs = np.zeros(n, dtype=int) - 1
+        epochs[:150] = np.arange(150) // 5
+        ecorr = rng.uniform(0.1, 1.0, 30)
+        F = rng.randn(n, 6)
+        phi = rng.uniform(1.0, 5.0, 6)
+        C = np.diag(Nvec) + np.dot(F * phi, F.T)
+        for k in range(30):
+            ii = np.nonzero(epochs == k)[0]
+            C[np.ix_(ii, ii)] += ecorr[k]
+        cov = NoiseCovariance(Nvec, epochs, ecorr, F, phi)
+        X = rng.randn(n, 3)
+        assert np.allclose(cov.solve(X), np.linalg.solve(C, X))
+        assert np.isclose(cov.logdet(), np.linalg.slogdet(C)[1])
+
+    def test_white_noise(self):
+        # Without noise parameters the GLS and WLS fits agree
+        chi2 = []
+        for fitter_class in (wls_fitter, gls_fitter):
+            model = self.model.clone()
+            for par in model.get_free_params():
+                getattr(model, par).frozen = par not in ('F0', 'F1')
+            f = fitter_class(self.toas, model)
+            chi2.append(f.call_minimize())
+        assert np.isclose(chi2[0], chi2[1], rtol=1e-6)
+
+    def test_noise_fit(self):
+        model = self.noise_model()
+        # Lines with different aliases are numbered together
+        assert model.EFAC1.key_value == ['430G']
+        assert model.EFAC2.key_value == ['L_wide']
+        assert model.EQUAD2.key_value == ['L_wide']
+        table = self.toas.table
+        fe = np.array([f['fe'] for f in table['flags']])
+        sigma = model.scaled_sigma(table).to(u.s).value
+        toa_err = np.array(table['error'], dtype=np.float64) * 1e-6
+        assert np.allclose(sigma[fe == '430G'], 1.2 * np.sqrt(
+            toa_err[fe == '430G']**2 + 0.3e-6**2))
+        epochs, ecorr = model.ecorr_epochs(table)
+        # Every epoch has at least 2 TOAs
+        assert np.all(np.bincount(epochs[epochs >= 0]) > 1)
+        F, phi = model.red_noise_basis_weights(table)
+        C = np.diag(sigma**2) + np.dot(F * phi, F.T)
+        for k in range(len(ecorr)):
+            ii = np.nonzero(epochs == k)[0]
+            C[np.ix_(ii, ii)] += ecorr[k]
+
+        # One dense GLS step from the initial model, F0 and F1 are linear
+        r = resids(self.toas, model).time_resids.to(u.s).value
+        M, params, units = model.designmatrix(table, incfrozen=False,
+                                              incoffset=True)
+        CiM = np.linalg.solve(C, M)
+        Sigma = np.linalg.inv(np.dot(M.T, CiM))
+        dpars = np.dot(Sigma, np.dot(CiM.T, r))
+
+        f = gls_fitter(self.toas, model)
+        chi2 = f.call_minimize()
+        for pn in ('F0', 'F1'):
+            ii = params.index(pn)
+            un = 1.0 / (units[ii] / u.s)
+            err = np.sqrt(Sigma[ii,ii])
+            par = getattr(f.model, pn)
+            assert np.isclose(par.uncertainty_value, (err * un).to(
+                par.units).value, rtol=1e-6)
+            shift = (par.value - getattr(model, pn).value) / \
+                (err * un).to(par.units).value
+            assert abs(shift - dpars[ii] / err) < 1e-3
+        r = f.resids.time_resids.to(u.s).value
+        assert np.isclose(chi2, np.dot(r, np.linalg.solve(C, r)), rtol=1e-6)
+
+if __name__ == '__main__':
+    pass
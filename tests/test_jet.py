@@ -0,0 +1,54 @@
+"""Test the jets and the design matrix computed with them."""
+from pint.models import model_builder as mb
+import pint.toa as toa
+import pint.jet as jet
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+def check_close(column, reference, tol):
+    assert np.allclose(column, reference, rtol=0,
+                       atol=tol * np.abs(reference).max())
+
+
+class TestJet(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_arithmetic(self):
+        t = np.linspace(0.0, 1.0, 7)
+        def f(a, b):
+            return (t * a**3 / (1.0 + b) + jet.sin(b * t) - 3.0 * a +
+                    jet.sqrt(a) * jet.arctan2(b, a))
+        j = f(jet.Jet.variable(2.0, 0, 2), jet.Jet.variable(0.3, 1, 2))
+        assert np.allclose(j.value, f(2.0, 0.3))
+        h = 1e-6
+        assert np.allclose(j.derivs[0], (f(2.0 + h, 0.3) - f(2.0 - h, 0.3))
+                           / (2 * h), atol=1e-7)
+        assert np.allclose(j.derivs[1], (f(2.0, 0.3 + h) - f(2.0, 0.3 - h))
+                           / (2 * h), atol=1e-7)
+
+    def test_designmatrix(self):
+        M, params, units = self.model.designmatrix(self.toas.table)
+        M_jet, params_jet, units_jet = self.model.designmatrix(
+            self.toas.table, method='jet')
+        assert params_jet == params
+        for par in ('RAJ', 'DECJ', 'PX', 'DMX_0001', 'DM'):
+            if par not in params:
+                continue
+            ii = params.index(par)
+            check_close(M_jet[:,ii], M[:,ii], 1e-4)
+        # The spin columns differ by the phase reference epoch, a constant
+        ii = params.index('F1')
+        check_close(M_jet[:,ii] - M_jet[:,ii].mean(),
+                    M[:,ii] - M[:,ii].mean(), 1e-4)
+
+if __name__ == '__main__':
+    pass
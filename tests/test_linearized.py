@@ -0,0 +1,88 @@
+"""Test the timing model phases linearized in the parameters."""
+from pint.models import model_builder as mb
+from pint.linearized import LinearizedModel
+from pint.fitter import fitter
+import pint.toa as toa
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestLinearized(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+        self.params = ['F0', 'F1', 'DM']
+        self.scales = np.array([1e-11, 1e-19, 1e-4])
+
+    def test_small_step(self):
+        model = self.model.clone()
+        lin = LinearizedModel(model, self.toas.table, params=self.params,
+                              trust_radius=2.0, scales=self.scales)
+        x = model.get_param_vector(self.params) + self.scales
+        model.set_param_vector(x, self.params)
+        phase = lin.phase()
+        assert lin.nexact == 1 and lin.nlinear == 1
+        exact = model.phase(self.toas.table)
+        diff = (phase.int - exact.int) + (phase.frac - exact.frac)
+        assert np.abs(diff).max() < 1e-6
+
+    def test_wrap(self):
+        # A step of up to a turn over the TOAs, exact for F0
+        model = self.model.clone()
+        lin = LinearizedModel(model, self.toas.table, params=self.params,
+                              trust_radius=2000.0, scales=self.scales)
+        x = model.get_param_vector(self.params)
+        x[0] += 1000 * self.scales[0]
+        model.set_param_vector(x, self.params)
+        phase = lin.phase()
+        assert lin.nlinear == 1
+        assert np.all(np.abs(phase.frac) <= 0.5)
+        exact = model.phase(self.toas.table)
+        assert np.all(phase.int == exact.int)
+        assert np.abs(phase.frac - exact.frac).max() < 1e-6
+
+    def test_relinearize(self):
+        model = self.model.clone()
+        lin = LinearizedModel(model, self.toas.table, params=self.params,
+                              trust_radius=2.0, scales=self.scales)
+        x = model.get_param_vector(self.params) + 3 * self.scales
+        model.set_param_vector(x, self.params)
+        phase = lin.phase()
+        assert lin.nexact == 2 and lin.nlinear == 0
+        assert np.all(lin.x0 == x)
+        exact = model.phase(self.toas.table)
+        assert np.all(phase.frac == exact.frac)
+
+    def test_designmatrix_params(self):
+        model = self.model.clone()
+        model.DM.frozen = False
+        params = ['DM', 'F1']
+        M, names, units = model.designmatrix(self.toas.table,
+                                             incoffset=False, params=params)
+        assert names == params
+        Mall, names_all, units_all = model.designmatrix(
+            self.toas.table, incoffset=False,
+            params=model.get_free_params())
+        for jj, pn in enumerate(params):
+            ii = names_all.index(pn)
+            assert np.all(M[:,jj] == Mall[:,ii])
+            assert units[jj] == units_all[ii]
+
+    def test_fitter_chi2(self):
+        f = fitter(self.toas, self.model)
+        f.set_linearized(trust_radius=2.0, params=self.params,
+                         scales=self.scales)
+        x = f.model.get_param_vector(self.params) + self.scales
+        chi2 = f.minimize_func(x, *self.params)
+        f.set_linearized(None)
+        chi2_exact = f.minimize_func(x, *self.params)
+        assert np.isclose(chi2, chi2_exact, rtol=1e-6)
+
+if __name__ == '__main__':
+    pass
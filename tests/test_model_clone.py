@@ -0,0 +1,40 @@
+"""Test the cheap model copies used by the fitters."""
+from pint.models import model_builder as mb
+import pint.toa as toa
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestModelClone(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_independent(self):
+        m = self.model.clone()
+        assert m.as_parfile() == self.model.as_parfile()
+        f0 = self.model.F0.value
+        m.F0.value = f0 + 1e-9
+        m.DM.frozen = not self.model.DM.frozen
+        assert self.model.F0.value == f0
+        assert m.DM.frozen != self.model.DM.frozen
+        m.set_param_vector([12.0], ['DM'])
+        assert self.model.DM.value != 12.0
+        assert m.F0.set_quantity.__self__ is m.F0
+        assert m.delay_funcs['L1'][0].__self__ is m
+
+    def test_phase(self):
+        m = self.model.clone()
+        ph = self.model.phase(self.toas.table)
+        ph_clone = m.phase(self.toas.table)
+        assert np.all(ph_clone.int == ph.int)
+        assert np.all(ph_clone.frac == ph.frac)
+
+if __name__ == '__main__':
+    pass
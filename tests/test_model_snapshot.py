@@ -0,0 +1,45 @@
+"""Test the picklable model snapshots."""
+from pint.models import model_builder as mb
+import pint.toa as toa
+import numpy as np
+import pickle
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestModelSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_roundtrip(self):
+        snap = pickle.loads(pickle.dumps(self.model.snapshot(), protocol=2))
+        model = snap.restore()
+        assert model.params == self.model.params
+        assert model.as_parfile() == self.model.as_parfile()
+        for p in self.model.params:
+            assert getattr(model, p).frozen == getattr(self.model, p).frozen
+
+    def test_phase(self):
+        model = self.model.snapshot().restore()
+        ph = self.model.phase(self.toas.table)
+        ph_snap = model.phase(self.toas.table)
+        assert np.all(ph_snap.int == ph.int)
+        assert np.all(ph_snap.frac == ph.frac)
+
+    def test_new_values(self):
+        snap = self.model.snapshot()
+        values = snap.values.copy()
+        ii = snap.names.index('F0')
+        values[ii] += np.longdouble('1e-10')
+        model = snap.restore(values)
+        assert model.F0.value == values[ii]
+        assert model.F0.value != self.model.F0.value
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,122 @@
+"""Test the normal equations accumulated over blocks of TOAs."""
+from pint.models import model_builder as mb
+from pint.fitter import NormalEquations, WhitenedQR, wls_fitter
+from pint.residuals import get_errors_us
+from pint import derivatives
+import astropy.units as u
+import pint.toa as toa
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestNormalEquations(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_chunks(self):
+        M, params, units = self.model.designmatrix(self.toas.table)
+        rows_seen = np.zeros(self.toas.ntoas, dtype=int)
+        for rows, M_chunk, params_chunk, units_chunk in \
+                self.model.designmatrix_chunks(self.toas.table, chunk_size=100):
+            assert params_chunk == params
+            assert len(rows) <= 100
+            assert np.allclose(M_chunk, M[rows], rtol=1e-10, atol=0)
+            rows_seen[rows] += 1
+        assert np.all(rows_seen == 1)
+
+    def test_accumulate(self):
+        rng = np.random.RandomState(0)
+        M = rng.randn(1000, 5)
+        r = rng.randn(1000)
+        Nvec = rng.uniform(0.5, 2.0, 1000)
+        full = NormalEquations(5)
+        # Whitened in sub-blocks of 300 rows
+        full.block_rows = 300
+        full.add(M, r, Nvec)
+        blocks = NormalEquations(5)
+        for lo in range(0, 1000, 128):
+            blocks.add(M[lo:lo+128], r[lo:lo+128], Nvec[lo:lo+128])
+        assert blocks.nrows == 1000
+        assert np.allclose(blocks.MtWM, full.MtWM)
+        assert np.allclose(blocks.MtWr, full.MtWr)
+        assert np.allclose(full.MtWM, np.dot((M / Nvec[:,None]).T, M))
+        assert np.isclose(full.rtWr, np.dot(r / Nvec, r))
+        dpars, Sigma = full.solve()
+        expected = np.linalg.lstsq(M / np.sqrt(Nvec)[:,None],
+                                   r / np.sqrt(Nvec), rcond=-1)[0]
+        assert np.allclose(dpars, expected)
+
+    def test_qr(self):
+        rng = np.random.RandomState(1)
+        # Columns of very different scales, as for timing parameters
+        M = rng.randn(1000, 4) * np.array([1e-6, 1.0, 1e4, 1e9])
+        r = rng.randn(1000)
+        Nvec = rng.uniform(0.5, 2.0, 1000)
+        dpars, Sigma = WhitenedQR(M, Nvec).solve(r)
+        normal = NormalEquations(4)
+        normal.add(M, r, Nvec)
+        dpars_normal, Sigma_normal = normal.solve()
+        assert np.allclose(dpars, dpars_normal)
+        assert np.allclose(Sigma, Sigma_normal)
+
+    def test_wls_fit(self):
+        model = self.model.clone()
+        for par in model.get_free_params():
+            getattr(model, par).frozen = par not in ('F0', 'F1', 'DM')
+        f = wls_fitter(self.toas, model)
+        chi2 = f.call_minimize()
+        f0 = f.model.F0.value
+        # Start from a perturbed F0, the fit should find the same minimum
+        f.model.F0.value = f0 + 10 * f.model.F0.uncertainty_value
+        f.update_resids()
+        assert f.resids.chi2 > chi2
+        chi2_perturbed = f.call_minimize()
+        assert np.isclose(chi2_perturbed, chi2, rtol=1e-3)
+        assert abs(f.model.F0.value - f0) < f.model.F0.uncertainty_value
+
+    def test_angle_uncertainty(self):
+        model = self.model.clone()
+        for par in model.get_free_params():
+            getattr(model, par).frozen = par not in ('F0', 'F1', 'RAJ',
+                                                     'DECJ')
+        f = wls_fitter(self.toas, model)
+        chi2 = f.call_minimize()
+        # The model is left at the parameters of the returned chi^2
+        f.update_resids()
+        assert np.isclose(f.resids.chi2, chi2, rtol=1e-10)
+        M, params, units = f.model.designmatrix(self.toas.table,
+                                                incfrozen=False,
+                                                incoffset=True)
+        Nvec = (get_errors_us(self.toas) * 1e-6)**2
+        Sigma = WhitenedQR(M, Nvec).Sigma
+        for pn, unit in (('RAJ', u.hourangle), ('DECJ', u.deg)):
+            ii = params.index(pn)
+            expected = (np.sqrt(Sigma[ii,ii]) / (units[ii] / u.s)).to(unit)
+            unc = getattr(f.model, pn).uncertainty.to(unit)
+            assert np.isclose(unc.value, expected.value, rtol=1e-2)
+        # Against the covariance of a numerical design matrix, in the units
+        # of the parameter values (seconds of hour angle and arcseconds)
+        fit = ['F0', 'F1', 'RAJ', 'DECJ']
+        F0 = f.model.F0.value
+        dphase = derivatives.d_phase_d_params(f.model, self.toas.table, fit)
+        Mnum = np.column_stack([np.ones(self.toas.ntoas)] +
+                               [-np.asarray(d, dtype=np.float64) / F0
+                                for d in dphase])
+        errs = np.sqrt(np.diag(WhitenedQR(Mnum, Nvec).Sigma))
+        for pn, unit, scale in (('RAJ', u.hourangle, 3600.0),
+                                ('DECJ', u.deg, 3600.0)):
+            par = getattr(f.model, pn)
+            assert derivatives.param_unit(par) == unit
+            unc = par.uncertainty.to(unit).value * scale
+            assert np.isclose(unc, errs[1 + fit.index(pn)] * scale,
+                              rtol=3e-2)
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,63 @@
+"""Test the fit updated with batches of TOAs."""
+from pint.models import model_builder as mb
+from pint.fitter import online_fitter, wls_fitter
+from pint.parallel import toa_chunk
+import pint.toa as toa
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestOnlineFitter(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        for par in self.model.get_free_params():
+            getattr(self.model, par).frozen = par not in ('F0', 'F1')
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_batches(self):
+        f = wls_fitter(self.toas, self.model)
+        chi2 = f.call_minimize()
+        # Add the TOAs in time order, in four batches
+        table = self.toas.table[np.argsort(self.toas.table['tdbld'])]
+        edges = np.linspace(0, len(table), 5).astype(int)
+        online = online_fitter(self.model, threshold=1.0)
+        for start, stop in zip(edges[:-1], edges[1:]):
+            online.add_toas(toa_chunk(table, start, stop)[0])
+        assert np.isclose(online.chi2, chi2, rtol=1e-3)
+        for par in ('F0', 'F1'):
+            fitted = getattr(f.model, par)
+            diff = getattr(online.model, par).value - fitted.value
+            assert abs(diff) < 1e-2 * fitted.uncertainty_value
+
+    def test_relinearize(self):
+        # Start away from the solution so that the parameters drift
+        model = self.model.clone()
+        for par in ('RAJ', 'DECJ'):
+            getattr(model, par).frozen = False
+        model.F0.value += 5 * model.F0.uncertainty_value
+        f = wls_fitter(self.toas, model)
+        chi2 = f.call_minimize()
+        table = self.toas.table[np.argsort(self.toas.table['tdbld'])]
+        edges = np.linspace(0, len(table), 5).astype(int)
+        online = online_fitter(model, threshold=0.1)
+        for start, stop in zip(edges[:-1], edges[1:]):
+            online.add_toas(toa_chunk(table, start, stop)[0])
+        assert online.nrelinearize > 0
+        assert np.isclose(online.chi2, chi2, rtol=1e-3)
+        for par in ('F0', 'F1', 'RAJ', 'DECJ'):
+            fitted = getattr(f.model, par)
+            unit = fitted.uncertainty.unit
+            online_par = getattr(online.model, par)
+            diff = (online_par.quantity - fitted.quantity).to(unit).value
+            assert abs(diff) < 1e-2 * fitted.uncertainty.value
+            assert np.isclose(online_par.uncertainty.to(unit).value,
+                              fitted.uncertainty.value, rtol=1e-2)
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,59 @@
+"""Test the process-parallel model evaluation against the serial one."""
+from pint.models import model_builder as mb
+import pint.toa as toa
+import numpy as np
+import os
+import tempfile
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestParallel(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_phase(self):
+        ph = self.model.phase(self.toas.table)
+        ph_par = self.model.phase(self.toas.table, workers=3)
+        assert ph_par.int.dtype == ph.int.dtype
+        assert np.all(ph_par.int == ph.int)
+        assert np.all(np.abs(ph_par.frac - ph.frac) < 1e-12)
+
+    def test_designmatrix(self):
+        M, params, units = self.model.designmatrix(self.toas.table)
+        M_par, params_par, units_par = self.model.designmatrix(
+            self.toas.table, workers=3)
+        assert params == params_par
+        assert units == units_par
+        assert np.allclose(M_par, M, rtol=1e-12, atol=0)
+
+    def test_phase_reference(self):
+        # Without TZRMJD the first TOA is the phase reference, which is
+        # fixed on a copy of the model, not on the model itself
+        fd, parf = tempfile.mkstemp(suffix='.par')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.writelines(line for line in open(self.parf)
+                             if not line.startswith('TZR'))
+            model = mb.get_model(parf)
+        finally:
+            os.remove(parf)
+        assert model.TZRMJD.value is None
+        ph_par = model.phase(self.toas.table, workers=3)
+        M_par, params, units = model.designmatrix(self.toas.table, workers=3)
+        for rows, M, params, units in model.designmatrix_chunks(
+                self.toas.table, chunk_size=1000):
+            pass
+        assert model.TZRMJD.value is None
+        assert not hasattr(model, 'TZRMJDld')
+        ph = model.phase(self.toas.table)
+        assert np.all(ph_par.int == ph.int)
+        assert np.all(np.abs(ph_par.frac - ph.frac) < 1e-12)
+
+if __name__ == '__main__':
+    pass
@@ -223,6 +223,22 @@ class TestParameters(unittest.TestCase):
         self.mp.GLF0_2.value = 50 * u.Hz
         assert self.mp.GLF0_2.quantity == 50 * u.Hz
 
+    def test_param_vector(self):
+        """Check that the value vector and the parameters agree"""
+        m = mb.get_model('B1855+09_NANOGrav_dfg+12_modified.par')
+        names = ['F0', 'RAJ', 'DM']
+        vals = m.get_param_vector(names)
+        self.assertEqual(vals[0], m.F0.value)
+        self.assertEqual(vals[1], m.RAJ.value)
+        vals[0] += str2longdouble('1e-12')
+        vals[2] = 13.5
+        m.set_param_vector(vals, names)
+        self.assertEqual(m.F0.value, vals[0])
+        self.assertEqual(m.F0.quantity, vals[0] * u.Hz)
+        self.assertEqual(m.DM.quantity, 13.5 * m.DM.units)
+        m.DM.value = 14.0
+        self.assertEqual(m.get_param_vector(['DM'])[0], 14.0)
+
     def set_prefix_value1(self):
         self.mp.GLF0_2.value = 100 * u.s
     def test_prefix_value1(self):
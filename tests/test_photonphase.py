@@ -0,0 +1,75 @@
+"""Test the chunked pulse phase and barycentric time tagging of events."""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pyfits
+from pint.models import model_builder as mb
+from pint.fermi_toas import get_Fermi_TOAs
+from pint.photonphase import phase_events
+
+from pinttestdata import testdir, datadir
+
+
+class TestPhotonPhase(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        exdir = os.path.join(testdir, '..', 'examples')
+        self.eventfile = os.path.join(exdir,
+            'J0030+0451_P8_15.0deg_239557517_458611204_ft1weights_GEO_wt.gt.0.4.fits')
+        self.model = mb.get_model(os.path.join(exdir,
+                                               'PSRJ0030+0451_psrcat.par'))
+        self.outdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(self):
+        shutil.rmtree(self.outdir)
+
+    def test_phase_events(self):
+        ts = get_Fermi_TOAs(self.eventfile, ephem='DE405')
+        phss = np.asarray(self.model.phase(ts.table).frac, dtype=np.float64)
+        phases = np.where(phss < 0.0, phss + 1.0, phss)
+        bary = self.model.get_barycentric_toas(ts.table).value
+        outfiles = []
+        for workers in (None, 3):
+            outfile = os.path.join(self.outdir, 'events%s.fits' % workers)
+            phase_events(self.eventfile, self.model, outfile,
+                         chunk_size=1000, workers=workers, ephem='DE405')
+            outfiles.append(outfile)
+        inp = pyfits.open(self.eventfile)
+        out = [pyfits.open(f) for f in outfiles]
+        assert len(out[0]) == len(inp)
+        assert np.all(out[0][1].data.field('PULSE_PHASE') ==
+                      out[1][1].data.field('PULSE_PHASE'))
+        assert np.all(out[0][1].data.field('ENERGY') ==
+                      inp[1].data.field('ENERGY'))
+        dphase = out[0][1].data.field('PULSE_PHASE') - phases
+        dphase -= np.round(dphase)
+        assert np.all(np.abs(dphase) < 1e-9)
+        hdr = inp[1].header
+        mjdref = hdr['MJDREFI'] + float(hdr['MJDREFF'])
+        dt = out[0][1].data.field('BARY_TIME') - (bary - mjdref) * 86400.0
+        assert np.all(np.abs(dt) < 1e-6)
+
+    def test_no_tzrmjd(self):
+        parfile = os.path.join(self.outdir, 'notzr.par')
+        with open(parfile, 'w') as f:
+            f.writelines(l for l in open(os.path.join(testdir, '..',
+                                     'examples', 'PSRJ0030+0451_psrcat.par'))
+                         if not l.startswith('TZR'))
+        model = mb.get_model(parfile)
+        assert model.TZRMJD.value is None
+        phases = []
+        for workers in (None, 3):
+            outfile = os.path.join(self.outdir, 'notzr%s.fits' % workers)
+            phase_events(self.eventfile, model, outfile, chunk_size=1000,
+                         workers=workers, columns=('PULSE_PHASE',),
+                         ephem='DE405')
+            phases.append(pyfits.open(outfile)[1].data.field('PULSE_PHASE'))
+        assert np.all(phases[0] == phases[1])
+        # The first event is the phase reference
+        assert abs(phases[0][0] - np.round(phases[0][0])) < 1e-6
+
+if __name__ == '__main__':
+    pass
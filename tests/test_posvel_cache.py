@@ -0,0 +1,60 @@
+"""Test the observatory vectors shared by TOAs at nearby epochs."""
+import pint.toa as toa
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestPosvelCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def columns(self, **kwargs):
+        self.toas.compute_posvels(ephem='DE405', planets=True, **kwargs)
+        return dict((name, np.array(self.toas.table[name]))
+                    for name in self.toas.table.colnames
+                    if name.startswith('ssb_obs') or name.startswith('obs_'))
+
+    def test_buckets(self):
+        exact = self.columns(epoch_bucket=None)
+        toa.clear_posvel_cache()
+        bucketed = self.columns(epoch_bucket=1.0)
+        # Subbanded TOAs share their vectors
+        assert len(toa._posvel_cache) < self.toas.ntoas
+        for name in exact:
+            if name == 'ssb_obs_vel':
+                # km/s, a dt < 0.034 m/s
+                assert np.abs(bucketed[name] - exact[name]).max() < 5e-5
+            else:
+                # km, a dt^2 / 2 < 2 cm
+                assert np.abs(bucketed[name] - exact[name]).max() < 2e-5
+
+    def test_reuse(self):
+        toa.clear_posvel_cache()
+        first = self.columns()
+        ncached = len(toa._posvel_cache)
+        second = self.columns()
+        assert len(toa._posvel_cache) == ncached
+        for name in first:
+            assert np.all(first[name] == second[name])
+
+    def test_size(self):
+        toa.clear_posvel_cache()
+        first = self.columns()
+        size = toa.posvel_cache_size
+        toa.posvel_cache_size = 10
+        try:
+            toa.clear_posvel_cache()
+            second = self.columns()
+            assert len(toa._posvel_cache) == 10
+        finally:
+            toa.posvel_cache_size = size
+        for name in first:
+            assert np.all(first[name] == second[name])
+
+if __name__ == '__main__':
+    pass
@@ -30,6 +30,17 @@ class TestPrefix(unittest.TestCase):
         emsg = "RMS of " + self.m.PSR.value + " is too big."
         assert f.resids.time_resids.std().to(u.us).value < 950.0, emsg
 
+    def test_prefix_index(self):
+        assert self.m.get_prefix_mapping('GLF0_') == \
+            {1: 'GLF0_1', 2: 'GLF0_2', 3: 'GLF0_3'}
+        assert self.m.get_prefix_mapping('F') == {1: 'F1', 2: 'F2'}
+        idx, values = self.m.get_prefix_values('F')
+        assert list(idx) == [1, 2]
+        assert values[0] == self.m.F1.value
+        assert values[1] == self.m.F2.value
+        assert self.m.get_spin_terms() == \
+            [self.m.F0.value, self.m.F1.value, self.m.F2.value]
+
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,63 @@
+"""Test the lazily computed residuals."""
+from pint.models import model_builder as mb
+from pint.residuals import resids, get_errors_us
+import pint.toa as toa
+import astropy.units as u
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestResiduals(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+
+    def test_lazy(self):
+        r = resids(self.toas, self.model)
+        assert r._phase_resids is None and r._time_resids is None
+        chi2 = r.chi2
+        errors = self.toas.get_errors().to(u.s).value
+        expected = np.sum((r.time_resids.to(u.s).value / errors)**2)
+        assert np.isclose(chi2, expected)
+        assert r.dof == self.toas.ntoas - len(self.model.get_free_params())
+        r_free = resids(self.toas, self.model, free_params=['F0'])
+        assert r_free.dof == self.toas.ntoas - 1
+
+    def test_snapshot(self):
+        model = self.model.clone()
+        f0 = model.F0.value
+        prefit = resids(self.toas, model)
+        reference = resids(self.toas, model)
+        chi2 = reference.chi2
+        # Changing the model after the resids were made does not change them
+        model.F0.value = f0 + 1e-9
+        postfit = resids(self.toas, model)
+        assert prefit.chi2 == chi2
+        assert np.all(prefit.time_resids == reference.time_resids)
+        assert postfit.chi2 != chi2
+        assert model.F0.value == f0 + 1e-9
+        # The dof are those of the free parameters at the time
+        nfree = len(model.get_free_params())
+        model.F1.frozen = not model.F1.frozen
+        changed = resids(self.toas, model)
+        assert postfit.dof == self.toas.ntoas - nfree
+        assert abs(changed.dof - postfit.dof) == 1
+
+    def test_errors_cached(self):
+        errors = get_errors_us(self.toas)
+        assert get_errors_us(self.toas) is errors
+        assert np.allclose(errors, self.toas.get_errors().to(u.us).value)
+
+    def test_no_model(self):
+        r = resids()
+        assert r.time_resids is None
+        assert r.chi2 is None
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,79 @@
+"""Test the chi^2 scan over a parameter grid."""
+from pint.models import model_builder as mb
+from pint.fitter import wls_fitter
+from pint.scan import GridScan, serpentine_stripes
+import pint.toa as toa
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestGridScan(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        model = mb.get_model(self.parf)
+        for par in model.get_free_params():
+            getattr(model, par).frozen = par not in ('F0', 'F1', 'DM')
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+        self.fitter = wls_fitter(self.toas, model)
+        self.chi2 = self.fitter.call_minimize()
+        self.grids = []
+        for par in ('F0', 'F1'):
+            p = getattr(self.fitter.model, par)
+            self.grids.append(p.value + np.array([-2, 0, 2]) *
+                              p.uncertainty_value)
+
+    def test_stripes(self):
+        stripes = serpentine_stripes((2, 3))
+        assert stripes == [[(0, 0), (0, 1), (0, 2)], [(1, 2), (1, 1), (1, 0)]]
+
+    def test_scan(self):
+        scan = GridScan(self.fitter, ['F0', 'F1'], self.grids)
+        chi2 = scan.run()
+        assert np.all(scan.done)
+        assert np.all(scan.converged)
+        assert np.isclose(chi2[1,1], self.chi2, rtol=1e-4)
+        assert np.argmin(chi2) == 4
+        # The DM is refitted, so chi^2 rises by about 4 per 2 sigma step
+        assert np.all(chi2[[0, 2],1] - chi2[1,1] > 1.0)
+        parallel = GridScan(self.fitter, ['F0', 'F1'], self.grids).run(
+            workers=2)
+        assert np.allclose(parallel, chi2, rtol=1e-6)
+
+    def test_resume(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'scan.npy')
+            scan = GridScan(self.fitter, ['F0', 'F1'], self.grids,
+                            filename=filename)
+            # Scan only the first stripe, as if interrupted
+            scan.scan_stripes(serpentine_stripes(scan.shape)[:1])
+            del scan
+            resumed = GridScan(self.fitter, ['F0', 'F1'], self.grids,
+                               filename=filename)
+            assert np.sum(resumed.done) == 3
+            chi2 = resumed.run()
+            assert np.all(resumed.done)
+            full = GridScan(self.fitter, ['F0', 'F1'], self.grids).run()
+            assert np.allclose(chi2, full, rtol=1e-6)
+            # Not over other grids or parameters
+            grids = [self.grids[0], self.grids[1][::-1]]
+            self.assertRaises(ValueError, GridScan, self.fitter,
+                              ['F0', 'F1'], grids, filename=filename)
+            self.assertRaises(ValueError, GridScan, self.fitter,
+                              ['F1', 'F0'], self.grids[::-1],
+                              filename=filename)
+            os.remove(os.path.join(tmpdir, 'scan_grid.npz'))
+            self.assertRaises(ValueError, GridScan, self.fitter,
+                              ['F0', 'F1'], self.grids, filename=filename)
+        finally:
+            shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,151 @@
+"""Test the spacecraft orbit interpolation and the Spacecraft TOA vectors."""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pyfits
+import astropy.time as time
+import pint.toa as toa
+from pint.spacecraft import SpacecraftOrbit
+
+
+def circular_orbit(t, R=7000.0, period=5760.0):
+    w = 2 * np.pi / period
+    pos = np.column_stack([R * np.cos(w * t), R * np.sin(w * t),
+                           0.3 * R * np.sin(w * t + 1.0)])
+    vel = np.column_stack([-R * w * np.sin(w * t), R * w * np.cos(w * t),
+                           0.3 * R * w * np.cos(w * t + 1.0)])
+    return pos, vel
+
+
+def write_table(filename, columns, header=(), extra=None):
+    """Write a FITS file with a table of columns (name, format, unit,
+    values) and the header keywords, after the table extra if given.
+    """
+    hdus = [pyfits.PrimaryHDU()]
+    if extra is not None:
+        hdus.append(extra)
+    table = pyfits.BinTableHDU.from_columns(
+        [pyfits.Column(name=name, format=fmt, unit=unit, array=values)
+         for name, fmt, unit, values in columns])
+    for key, value in header:
+        table.header[key] = value
+    hdus.append(table)
+    pyfits.HDUList(hdus).writeto(filename)
+
+
+class TestSpacecraft(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.mjd0 = np.longdouble(55000.0)
+        self.ts = np.arange(0.0, 86400.0, 30.0)
+        self.pos, self.vel = circular_orbit(self.ts)
+        self.orbit = SpacecraftOrbit(self.mjd0 + self.ts / np.longdouble(86400),
+                                     self.pos, self.vel)
+        self.tmpdir = tempfile.mkdtemp()
+        # Fermi mission times of the samples of the first two hours
+        self.MJDREFF = 7.428703703703703e-4
+        self.met = 3e8 + self.ts[:240]
+        self.mjds = np.longdouble(51910) + np.longdouble(self.MJDREFF) + \
+            (np.longdouble(2.5) + self.met) / np.longdouble(86400)
+
+    @classmethod
+    def tearDownClass(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assert_times(self, orbit, first=0):
+        # The sample times to 1 us
+        mjds = orbit.mjdref + orbit.t.astype(np.longdouble) / 86400
+        dt = (mjds - self.mjds[first:first+len(mjds)]) * 86400
+        assert np.all(np.abs(np.asarray(dt, dtype=np.float64)) < 1e-6)
+
+    def test_from_FT2(self):
+        filename = os.path.join(self.tmpdir, 'ft2.fits')
+        pos = np.asarray(self.pos[:240] * 1000.0, dtype=np.float32)
+        write_table(filename,
+                    [('START', 'D', 's', self.met),
+                     ('STOP', 'D', 's', self.met + 30.0),
+                     ('SC_POSITION', '3E', 'm', pos)],
+                    [('MJDREFI', 51910), ('MJDREFF', self.MJDREFF),
+                     ('TIMEZERO', 2.5)])
+        orbit = SpacecraftOrbit.from_FT2(filename)
+        # The times are START + TIMEZERO, SC_POSITION is in m
+        self.assert_times(orbit)
+        assert np.all(orbit.pos == pos.astype(np.float64) / 1000.0)
+        # The samples of the second hour, and 3 more before it
+        part = SpacecraftOrbit.from_FT2(
+            filename, minmjd=(self.mjds[119] + self.mjds[120]) / 2,
+            maxmjd=self.mjds[-1] + np.longdouble(1.0) / 86400)
+        assert len(part.t) == 123
+        self.assert_times(part, first=117)
+
+    def test_from_orbit_file(self):
+        pos, vel = self.pos[:240], self.vel[:240]
+        columns = [('X', 0), ('Y', 1), ('Z', 2), ('VX', 0), ('VY', 1),
+                   ('VZ', 2)]
+        files = [os.path.join(self.tmpdir, name)
+                 for name in ('orbit_m.fits', 'orbit_km.fits', 'gti.fits')]
+        # In m, with MJDREFF as a string in the "1.234D-5" syntax
+        write_table(files[0],
+                    [('TIME', 'D', 's', self.met + 2.5)] +
+                    [(c, 'D', 'm' if len(c) == 1 else 'm/s',
+                      (pos if len(c) == 1 else vel)[:,k] * 1000.0)
+                     for c, k in columns],
+                    [('MJDREFI', 51910),
+                     ('MJDREFF', ('%.15e' % self.MJDREFF).replace('e', 'D'))])
+        # In km, with a TIMEZERO, after a table without positions
+        gti = pyfits.BinTableHDU.from_columns(
+            [pyfits.Column(name='START', format='D', array=self.met[:1]),
+             pyfits.Column(name='STOP', format='D', array=self.met[-1:])])
+        write_table(files[1],
+                    [('TIME', 'D', 's', self.met)] +
+                    [(c, 'D', 'km' if len(c) == 1 else 'km/s',
+                      (pos if len(c) == 1 else vel)[:,k])
+                     for c, k in columns],
+                    [('MJDREFI', 51910), ('MJDREFF', self.MJDREFF),
+                     ('TIMEZERO', 2.5)], extra=gti)
+        for filename in files[:2]:
+            orbit = SpacecraftOrbit.from_orbit_file(filename)
+            self.assert_times(orbit)
+            assert np.allclose(orbit.pos, pos, rtol=1e-12)
+            assert np.allclose(orbit.vel, vel, rtol=1e-12)
+        pyfits.HDUList([pyfits.PrimaryHDU(), gti]).writeto(files[2])
+        self.assertRaises(ValueError, SpacecraftOrbit.from_orbit_file,
+                          files[2])
+
+    def test_interpolation(self):
+        t = np.random.RandomState(0).uniform(0.0, 86000.0, 10000)
+        pos, vel = circular_orbit(t)
+        for orbit in (self.orbit,
+                      SpacecraftOrbit(self.orbit.mjdref + self.ts /
+                                      np.longdouble(86400), self.pos)):
+            p, v = orbit.posvel(self.mjd0 + t / np.longdouble(86400),
+                                chunk=3000)
+            # 10 cm and 1 cm/s
+            assert np.all(np.abs(p - pos) < 1e-4)
+            assert np.all(np.abs(v - vel) < 1e-5)
+        self.assertRaises(ValueError, self.orbit.posvel,
+                          [self.mjd0 - np.longdouble(1.0)])
+
+    def test_posvels(self):
+        t = np.linspace(100.0, 86000.0, 50)
+        mjds = time.Time(np.zeros(50) + 55000.0, t / 86400.0, format='mjd',
+                         scale='tt', precision=9)
+        geo = toa.TOAs.from_times(mjds, 'Geocenter')
+        geo.compute_posvels(ephem='DE405', planets=True)
+        sc = toa.TOAs.from_times(mjds, 'Spacecraft')
+        sc.compute_posvels(ephem='DE405', planets=True, orbit=self.orbit)
+        pos, vel = circular_orbit(t)
+        assert np.allclose(sc.table['ssb_obs_pos'] - geo.table['ssb_obs_pos'],
+                           pos, rtol=0, atol=1e-4)
+        assert np.allclose(sc.table['ssb_obs_vel'] - geo.table['ssb_obs_vel'],
+                           vel, rtol=0, atol=1e-5)
+        assert np.allclose(geo.table['obs_sun_pos'] - sc.table['obs_sun_pos'],
+                           pos, rtol=0, atol=1e-4)
+        assert np.allclose(geo.table['obs_jupiter_pos'] -
+                           sc.table['obs_jupiter_pos'], pos, rtol=0,
+                           atol=1e-4)
+
+if __name__ == '__main__':
+    pass
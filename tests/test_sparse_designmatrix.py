@@ -0,0 +1,95 @@
+"""Test the design matrix with sparse columns for the DMX parameters."""
+from pint.models import model_builder as mb
+from pint.fitter import NormalEquations, normal_equations_for, wls_fitter
+from pint.toa_select import TOASelect
+import pint.toa as toa
+import astropy.table as table
+import numpy as np
+import os
+import unittest
+
+from pinttestdata import testdir, datadir
+
+
+class TestSparseDesignMatrix(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.parf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12_DMX.par')
+        self.timf = os.path.join(datadir, 'B1855+09_NANOGrav_dfg+12.tim')
+        self.model = mb.get_model(self.parf)
+        self.toas = toa.get_TOAs(self.timf, ephem='DE405', planets=False)
+        self.dmx = [par for par in self.model.params
+                    if par.startswith('DMX_')]
+        for par in self.dmx:
+            getattr(self.model, par).frozen = False
+
+    def test_columns(self):
+        M, params, units = self.model.designmatrix(self.toas.table)
+        B, params_sparse, units_sparse = self.model.designmatrix(
+            self.toas.table, sparse=True)
+        assert params_sparse == params
+        assert units_sparse == units
+        assert B.sparse.shape[1] == len(self.dmx)
+        assert B.nnz < M.size
+        assert np.all(B.toarray() == M)
+        # Every TOA is in at most one DMX range
+        ii = [params.index(par) for par in self.dmx]
+        assert np.all(np.sum(M[:,ii] != 0, axis=1) <= 1)
+        # Compare with the derivatives computed with jets
+        M_jet, params_jet, units_jet = self.model.designmatrix(
+            self.toas.table, method='jet')
+        assert np.allclose(M_jet[:,ii], M[:,ii], rtol=1e-4,
+                           atol=1e-4 * np.abs(M[:,ii]).max())
+
+    def test_solve(self):
+        rng = np.random.RandomState(0)
+        M, params, units = self.model.designmatrix(self.toas.table)
+        B, params, units = self.model.designmatrix(self.toas.table,
+                                                   sparse=True)
+        r = rng.randn(self.toas.ntoas) * 1e-6
+        Nvec = np.array(self.toas.get_errors().to('s'))**2
+        dense = NormalEquations(len(params))
+        dense.add(M, r, Nvec)
+        block = normal_equations_for(B)
+        block.add(B, r, Nvec)
+        dpars, Sigma = dense.solve()
+        dpars_sparse, Sigma_sparse = block.solve()
+        assert np.allclose(dpars_sparse, dpars, rtol=1e-6,
+                           atol=1e-6 * np.abs(dpars).max())
+        assert np.allclose(np.diag(Sigma_sparse), np.diag(Sigma), rtol=1e-6)
+
+    def test_fit(self):
+        # The default sparse solve fits as the dense one
+        results = []
+        for sparse in (False, True):
+            f = wls_fitter(self.toas, self.model)
+            chi2 = f.call_minimize(sparse=sparse)
+            results.append((chi2, f.model))
+        (chi2, dense), (chi2_sparse, model) = results
+        assert np.isclose(chi2_sparse, chi2, rtol=1e-8)
+        for par in ['F0', 'F1'] + self.dmx:
+            dense_par, sparse_par = getattr(dense, par), getattr(model, par)
+            assert abs(sparse_par.value - dense_par.value) < \
+                1e-3 * dense_par.uncertainty_value
+            assert np.isclose(sparse_par.uncertainty_value,
+                              dense_par.uncertainty_value, rtol=1e-6)
+
+    def test_select_rows(self):
+        # The 'index' column of a table grouped by observatory is not the
+        # row number
+        obs = np.array(['b', 'a', 'b', 'a', 'a', 'b'])
+        flags = [{'fe': fe} for fe in ('x', 'y', 'y', 'x', 'y', 'x')]
+        tab = table.Table([np.arange(6), obs, np.arange(6) * 10.0],
+                          names=['index', 'obs', 'freq'])
+        tab['flags'] = flags
+        tab = tab.group_by('obs')
+        assert np.any(np.array(tab['index']) != np.arange(6))
+        rows = TOASelect('fe', ['y']).get_toa_key_mask(tab)
+        assert np.all(rows == [ii for ii in range(6)
+                               if tab['flags'][ii]['fe'] == 'y'])
+        rows = TOASelect('freq', [15.0, 45.0]).get_toa_key_mask(tab)
+        assert np.all(np.sort(np.array(tab['freq'])[rows]) ==
+                      [20.0, 30.0, 40.0])
+
+if __name__ == '__main__':
+    pass